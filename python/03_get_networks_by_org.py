@@ -2,12 +2,12 @@
 """Retrieve networks from Cisco Business Dashboard belonging to an organization.
 
 Query the Cisco Business Dashboard API for a list of networks that belong
-to the specified organization ID.  The details of the Dashboard to query are
-contained in the environment.py file.
+to the specified organization ID or name.  The details of the Dashboard to
+query are contained in the environment.py file.
 
 Command line arguments:
   positional arguments:
-    orgid       The ID of the organization
+    orgid       The ID or name of the organization
 
   optional arguments:
     -h, --help  show this help message and exit
@@ -32,18 +32,33 @@ or implied.
 
 import requests
 import json
+import sys
 import argparse
 
 import environment
 import cbdauth
+import cbdcache
 
 # Get desired organization ID from command line argument
 parser = argparse.ArgumentParser(description='List all networks belong to the '
                                  'specified organization.')
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
-parser.add_argument('orgid',help='The ID of the organization')
+parser.add_argument('orgid',help='The ID or name of the organization')
 args = parser.parse_args()
 
+# Accept either the ID or the name of the organization.  Names are looked up
+# in the local cache maintained by cbdcache, which is refreshed from the
+# Dashboard only when it is out of date
+try:
+  cache = cbdcache.IdCache()
+  orgid = cache.resolve('org',args.orgid)
+except (KeyError,ValueError) as e:
+  print(e.args[0])
+  sys.exit(1)
+except requests.exceptions.RequestException as e:
+  print("Failed with exception:",e)
+  sys.exit(1)
+
 # Create a properly formatted JWT using environment data
 token = cbdauth.getToken(keyid=environment.keyid,
                          secret=environment.secret,
@@ -57,7 +72,7 @@ try:
   response=requests.get('https://%s:%s/api/v2/networks' % 
                        (environment.dashboard, environment.port),
                        headers={'Authorization':"Bearer %s" % token,
-                                'x-ctx-org-id':args.orgid },
+                                'x-ctx-org-id':orgid },
                        verify=environment.verify_cbd_cert)
 
 except requests.exceptions.RequestException as e:
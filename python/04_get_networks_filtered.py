@@ -29,12 +29,12 @@ or implied.
 """
 
 import requests
-import urllib.parse
 import json
+import sys
 import argparse
 
-import environment
-import cbdauth
+import cbdclient
+import cbdquery
 
 # Get details of network(s) to display from command line arguments
 #
@@ -47,43 +47,38 @@ parser.add_argument('-s','--search',default=None,help='Display only networks '
                     'that contain the search string.')
 args = parser.parse_args()
 
-# Create a properly formatted JWT using environment data
-token = cbdauth.getToken(keyid=environment.keyid,
-                    	 secret=environment.secret,
-                         clientid=environment.clientid,
-                         appname=environment.appname)
-
-# Build the API request URL.  The getNetworks API path is /api/v2/networks
-url = 'https://%s:%s/api/v2/networks' % (environment.dashboard, environment.port)
-
-# Specify the fields to be returned as query parameters
-url = url + '?fields=name,network-id'
-
-# Append the search string as a query parameter
+# Build the query.  The getNetworks API path is /api/v2/networks.  Only the
+# network name and ID are requested, and the query builder takes care of
+# encoding the search string
+query = cbdquery.NetworkQuery().fields('name','network-id')
 if args.search:
-  url = url + '&search=' + urllib.parse.quote(args.search)
-
-try:
-  # Build and send the API request.
-  response=requests.get(url,headers={'Authorization':"Bearer %s" % token},
-                        verify=environment.verify_cbd_cert)
-
-except requests.exceptions.RequestException as e:
-  # Generally this will be a connection error or timeout.  HTTP errors are
-  # handled in the else section below
-  print("Failed with exception:",e)
-  sys.exit(1)
-
-else:
-  if response.status_code == 200:
-    # Request succeeded
-    # The API response payload is a JSON object
-    print(json.dumps(response.json(),indent=2))
-  else:
-    # Some other error occurred.
+  query = query.search(args.search)
+
+# Create a client using the details in environment.py.  The client creates
+# a properly formatted JWT and adds it to the request
+with cbdclient.Client.fromEnvironment() as client:
+  try:
+    # Send the API request, retrieving every page of results.  The shared
+    # cache answers an identical query repeated within the next 30 seconds
+    # without contacting the Dashboard again
+    networks = query.fetch(client,cache=cbdquery.cache)
+
+  except requests.exceptions.HTTPError as e:
+    # Some error was returned by the Dashboard.
+    response = e.response
     print('HTTPError:',response.status_code,response.headers)
     
     # Most errors return additional information as a json payload
     if 'application/json' in response.headers['Content-Type']:
       print('Error payload:')
       print(json.dumps(response.json(),indent=2))
+    sys.exit(1)
+
+  except requests.exceptions.RequestException as e:
+    # Generally this will be a connection error or timeout.
+    print("Failed with exception:",e)
+    sys.exit(1)
+
+  # Request succeeded
+  # Output the list of networks as a JSON object
+  print(json.dumps({'data':networks},indent=2))
@@ -9,8 +9,8 @@ update are contained in the environment.py file.
 Command line arguments:
   positional arguments:
     name                  The name of the new network
-    orgid                 The ID of the organization the network should belong
-                          to
+    orgid                 The ID or name of the organization the network
+                          should belong to
 
   optional arguments:
     -h, --help            show this help message and exit
@@ -37,10 +37,12 @@ or implied.
 
 import requests
 import json
+import sys
 import argparse
 
 import environment
 import cbdauth
+import cbdcache
 
 # Get details of network to create from command line arguments
 #
@@ -50,17 +52,30 @@ parser = argparse.ArgumentParser(description='Create a new network with the '
                                  'specified characteristics.')
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
 parser.add_argument('name',help='The name of the new network')
-parser.add_argument('orgid',help='The ID of the organization the network '
-                    'should belong to')
+parser.add_argument('orgid',help='The ID or name of the organization the '
+                    'network should belong to')
 parser.add_argument('-d','--description',default=None,help='The network '
                     'description')
 args = parser.parse_args()
 
+# Accept either the ID or the name of the organization.  Names are looked up
+# in the local cache maintained by cbdcache, which is refreshed from the
+# Dashboard only when it is out of date
+try:
+  cache = cbdcache.IdCache()
+  orgid = cache.resolve('org',args.orgid)
+except (KeyError,ValueError) as e:
+  print(e.args[0])
+  sys.exit(1)
+except requests.exceptions.RequestException as e:
+  print("Failed with exception:",e)
+  sys.exit(1)
+
 # Create a dictionary of the new network's details, ready for conversion to
 # a JSON payload later
 network = {
   'name':args.name,
-  'org-id':args.orgid,
+  'org-id':orgid,
 }
 if args.description is not None:
   network['description'] = args.description
@@ -3,19 +3,38 @@
 
 Query the Cisco Business Dashboard API for a list of devices that match
 the supplied search string and device type(s).  Outputs a JSON object
-containing the hostname, device type, IP address and serial number.  The
-details of the Dashboard to query are contained in the environment.py file.
+containing the hostname, device type, IP address and serial number, or the
+same details as JSON Lines or CSV.  All pages of the device list are
+retrieved, several at a time, and each device is written out as soon as it
+is received rather than once the whole list is complete.  With a single
+worker each page is also decoded as it arrives, so very large lists can be
+retrieved in little memory.  The details of the Dashboard to query are
+contained in the environment.py file.
 
 Command line arguments:
   -h, --help            show this help message and exit
   --version             show program's version number and exit
   -s SEARCH, --search SEARCH
                         Display only devices that contain the search string.
-  -t TYPE, --type TYPE  Display only devices of the specified type(s). Should
+  -t {All,Device,Others,Router,Switch,WAP,IpPhone,IpCamera,NAS,VirtualDevice,WLC}, --type {All,Device,Others,Router,Switch,WAP,IpPhone,IpCamera,NAS,VirtualDevice,WLC}
+                        Display only devices of the specified type(s). Should
                         be one of the following: All, Device, Others, Router,
                         Switch, WAP, IpPhone, IpCamera, NAS, VirtualDevice, or
                         WLC. Defaults to Device. May be specified multiple
                         times.
+  -w WORKERS, --workers WORKERS
+                        The number of pages of results to request
+                        concurrently. Defaults to 4.
+  -r RATE, --rate RATE  The maximum number of requests per second to send to
+                        the Dashboard. Unlimited by default.
+  --limit-file FILE     Share the rate limit with other scripts on this host
+                        given the same file.
+  -f {json,jsonl,csv}, --format {json,jsonl,csv}
+                        The output format. Defaults to json.
+  --metrics FILE        Write the latency of each API endpoint to this file as
+                        JSON, every 10 seconds and on exit.
+  --metrics-port PORT   Serve the latency of each API endpoint in the
+                        OpenMetrics format on this local port while running.
 
 
 Copyright (c) 2020 Cisco and/or its affiliates.
@@ -35,12 +54,14 @@ or implied.
 """
 
 import requests
-import urllib.parse
 import json
+import sys
 import argparse
 
-import environment
-import cbdauth
+import cbdclient
+import cbdjson
+import cbdmetrics
+import cbdquery
 
 # Get details of network to create from command line arguments
 #
@@ -53,62 +74,89 @@ parser = argparse.ArgumentParser(description='Get a list of devices filtered '
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
 parser.add_argument('-s','--search',default=None,help='Display only devices '
                     'that contain the search string.')
-parser.add_argument('-t','--type',action='append',help='Display only devices '
+parser.add_argument('-t','--type',action='append',
+                    choices=cbdquery.NODE_TYPES,help='Display only devices '
                     'of the specified type(s).  Should be one of the following:'
                     ' All, Device, Others, Router, Switch, WAP, IpPhone, '
                     'IpCamera, NAS, VirtualDevice, or WLC.  Defaults to Device.'
                     '  May be specified multiple times.')
+parser.add_argument('-w','--workers',type=int,default=4,help='The number of '
+                    'pages of results to request concurrently.  Defaults to '
+                    '4.')
+parser.add_argument('-r','--rate',type=float,default=None,help='The maximum '
+                    'number of requests per second to send to the Dashboard.  '
+                    'Unlimited by default.')
+parser.add_argument('--limit-file',default=None,metavar='FILE',help='Share the '
+                    'rate limit with other scripts on this host given the same '
+                    'file.')
+parser.add_argument('-f','--format',choices=cbdjson.FORMATS,default='json',
+                    help='The output format.  Defaults to json.')
+parser.add_argument('--metrics',default=None,metavar='FILE',help='Write the '
+                    'latency of each API endpoint to this file as JSON, every '
+                    '10 seconds and on exit.')
+parser.add_argument('--metrics-port',type=int,default=None,metavar='PORT',
+                    help='Serve the latency of each API endpoint in the '
+                    'OpenMetrics format on this local port while running.')
 args = parser.parse_args()
 
-# Create a properly formatted JWT using environment data
-token = cbdauth.getToken(keyid=environment.keyid,
-                         secret=environment.secret,
-                         clientid=environment.clientid,
-                         appname=environment.appname)
-
-# Build the API request URL.  The getNodes API path is /api/v2/nodes
-url = 'https://%s:%s/api/v2/nodes' % (environment.dashboard, environment.port)
-
-# Specify the fields to be returned as query parameters
+# Build the query.  The getNodes API path is /api/v2/nodes.  Only the fields
+# needed are requested, which greatly reduces the size of the response from
+# a large Dashboard
 #
 # Note: some additional fields such as network and organization will always
 # be returned
-url += '?fields=/system-state/hostname,/system-state/type,'
-url += '/system-state/ip,/system-state/sn'
-
-# Append the list of types as a query parameter.
-# If not specified, use Device (Router+Switch+WAP)
-if args.type:
-  for type in args.type:
-    url += '&type=' + urllib.parse.quote(type)
-else:
-  url += '&type=Device'
-  
-# Append the search string as a query parameter
+query = cbdquery.NodeQuery().fields('/system-state/hostname',
+                                    '/system-state/type','/system-state/ip',
+                                    '/system-state/sn')
+
+# Add the list of types.  If not specified, use Device (Router+Switch+WAP)
+query = query.types(*(args.type or ['Device']))
+
+# Add the search string
 if args.search:
-  url += '&search-str=' + urllib.parse.quote(args.search)
-
-try:
-  # Build and send the API request.
-  response=requests.get(url,headers={'Authorization':"Bearer %s" % token},
-                       verify=environment.verify_cbd_cert)
-
-except requests.exceptions.RequestException as e:
-  # Generally this will be a connection error or timeout.  HTTP errors are
-  # handled in the else section below
-  print("Failed with exception:",e)
-  sys.exit(1)
-
-else:
-  if response.status_code == 200:
-    # Request succeeded
-    # The API response payload is a JSON object
-    print(json.dumps(response.json(),indent=2))
-  else:
-    # Some other error occurred.
+  query = query.search(args.search)
+
+# Only record metrics if they were asked for, as the client otherwise does
+# no timing at all
+metrics = None
+if args.metrics or args.metrics_port:
+  metrics = cbdmetrics.Metrics()
+
+# Create a client using the details in environment.py.  The client creates
+# a properly formatted JWT and shares a pool of connections between the
+# concurrent page requests
+with cbdmetrics.Exporter(metrics,args.metrics,args.metrics_port), \
+     cbdclient.Client.fromEnvironment(poolsize=args.workers,
+                                      ratelimit=args.rate,
+                                      limitfile=args.limit_file,
+                                      metrics=metrics) as client:
+  try:
+    # Build and send the API requests.  The first page reveals how many
+    # devices there are, then the remaining pages are requested concurrently
+    # and reassembled in order.  Each device is output as it is received, and
+    # the complete list is kept in the shared cache for an identical query
+    # repeated within the next 30 seconds
+    writer = cbdjson.makeWriter(args.format,sys.stdout)
+    for device in query.iterate(client,workers=args.workers,
+                                cache=cbdquery.cache):
+      writer.write(device)
+
+  except requests.exceptions.HTTPError as e:
+    # Some error was returned by the Dashboard.
+    response = e.response
     print('HTTPError:',response.status_code,response.headers)
     
     # Most errors return additional information as a json payload
     if 'application/json' in response.headers['Content-Type']:
       print('Error payload:')
       print(json.dumps(response.json(),indent=2))
+    sys.exit(1)
+
+  except requests.exceptions.RequestException as e:
+    # Generally this will be a connection error or timeout.
+    print("Failed with exception:",e)
+    sys.exit(1)
+
+  # Request succeeded
+  # Complete the output, closing the JSON object if needed
+  writer.close()
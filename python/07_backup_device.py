@@ -6,6 +6,11 @@ using the Cisco Business Dashboard API.  The device/network(s) to be
 backed up are passed as command line options.  The details of the Dashboard
 are contained in the environment.py file.
 
+Alternatively, the --all option backs up every network in every organization.
+The networks are split into batches which are submitted concurrently, and the
+resulting jobs are followed until they complete with a progress report
+displayed after each check.
+
 Command line arguments:
   -h, --help            show this help message and exit
   --version             show program's version number and exit
@@ -17,6 +22,19 @@ Command line arguments:
                         may be specified.
   -c COMMENT, --comment COMMENT
                         A note to be applied to the backup.
+  -a, --all             Back up every network in every organization.
+  -b BATCH, --batch BATCH
+                        The number of networks to include in each backup
+                        request when using --all. Defaults to 10.
+  -w WORKERS, --workers WORKERS
+                        The number of backup requests to submit concurrently
+                        when using --all. Defaults to 4.
+  -i INTERVAL, --interval INTERVAL
+                        The number of seconds between checks of the backup
+                        job status when using --all. Defaults to 10.
+  -t TIMEOUT, --timeout TIMEOUT
+                        The maximum number of seconds to wait for the backup
+                        jobs when using --all. Defaults to 3600.
 
 
 Copyright (c) 2020 Cisco and/or its affiliates.
@@ -37,10 +55,84 @@ or implied.
 
 import requests
 import json
+import sys
 import argparse
 
 import environment
 import cbdauth
+import cbdclient
+import cbdbulk
+
+def backupAll(args):
+  """
+  Back up every network in every organization.  The networks are gathered
+  from each organization, split into batches of args.batch networks and
+  submitted as concurrent backup requests.  The resulting jobs are then
+  tracked until they finish.
+  """
+  with cbdclient.Client.fromEnvironment(poolsize=args.workers) as client:
+    try:
+      # Collect the networks for each organization.  The organization is
+      # selected using the x-ctx-org-id header
+      networkids = []
+      for org in client.iterate('/api/v2/orgs'):
+        for network in client.iterate('/api/v2/networks',
+                                      headers={'x-ctx-org-id':org['id']}):
+          networkids.append(network['id'])
+
+    except requests.exceptions.RequestException as e:
+      print("Failed to list networks with exception:",e)
+      sys.exit(1)
+
+    print('Backing up {} network(s) in batches of {}'.format(len(networkids),
+                                                             args.batch))
+
+    # Build one backup request per batch of networks
+    actions = []
+    for batch in cbdbulk.batches(networkids,args.batch):
+      action = {'network-ids':batch}
+      if args.comment is not None:
+        action['comment'] = args.comment
+      actions.append(action)
+
+    # Submit the batches concurrently, reporting each one as it completes
+    def submitted(action,result,error):
+      if error is None:
+        print('Submitted backup of {} network(s) with job ID(s): {}'.format(
+              len(action['network-ids']),', '.join(result['job-ids'])))
+      else:
+        print('Failed to submit backup of network(s) {}: {}'.format(
+              ', '.join(action['network-ids']),error))
+
+    outcomes = cbdbulk.submitAll(client,
+                                 '/api/v2/nodes/operations/backup-config',
+                                 actions,workers=args.workers,
+                                 callback=submitted)
+    jobids = [jobid for action, result, error in outcomes if error is None
+              for jobid in result['job-ids']]
+    failures = sum(1 for action, result, error in outcomes
+                   if error is not None)
+
+    # Follow the jobs to completion
+    tracker = cbdbulk.JobTracker(client,jobids,interval=args.interval,
+                                 workers=args.workers)
+    summary = tracker.wait(timeout=args.timeout,report=lambda summary:
+                           print(cbdbulk.formatSummary(summary)))
+
+    # Report each job that did not succeed, and why if known
+    for jobid, job in tracker.jobs.items():
+      if jobid in tracker.errors:
+        print('Job {}: status could not be checked: {}'.format(
+              jobid,tracker.errors[jobid]))
+      elif job is None or cbdbulk.jobState(job) not in cbdbulk.JOB_FINISHED:
+        print('Job {}: did not finish within {} seconds'.format(jobid,
+                                                                 args.timeout))
+      elif cbdbulk.jobState(job) not in cbdbulk.JOB_SUCCEEDED:
+        print('Job {}: {}'.format(jobid,cbdbulk.jobState(job)))
+    if failures:
+      print('{} backup request(s) could not be submitted'.format(failures))
+    if failures or summary['failed'] or summary['pending']:
+      sys.exit(1)
 
 # Get details of device(s) and/or network(s) to back up from command line
 # arguments
@@ -55,9 +147,26 @@ parser.add_argument('-n','--network',default=None,action='append',
                     'IDs may be specified.')
 parser.add_argument('-c','--comment',default=None,
                     help='A note to be applied to the backup.')
+parser.add_argument('-a','--all',action='store_true',help='Back up every '
+                    'network in every organization.')
+parser.add_argument('-b','--batch',type=int,default=10,help='The number of '
+                    'networks to include in each backup request when using '
+                    '--all.  Defaults to 10.')
+parser.add_argument('-w','--workers',type=int,default=4,help='The number of '
+                    'backup requests to submit concurrently when using --all.'
+                    '  Defaults to 4.')
+parser.add_argument('-i','--interval',type=int,default=10,help='The number of '
+                    'seconds between checks of the backup job status when '
+                    'using --all.  Defaults to 10.')
+parser.add_argument('-t','--timeout',type=int,default=cbdbulk.JOB_TIMEOUT,
+                    help='The maximum number of seconds to wait for the backup '
+                    'jobs when using --all.  Defaults to 3600.')
 args = parser.parse_args()
 
-if (args.device is None) and (args.network is None):
+if args.all:
+  backupAll(args)
+
+elif (args.device is None) and (args.network is None):
   print("At least one device or network must be specified.")
 
 else:
@@ -2,13 +2,23 @@
 """Receive a stream of events from Cisco Business Dashboard.
 
 Use the Cisco Business Dashboard API to subscribe to the event stream.
-Display a message for each event as it is received.  The details of the
-Dashboard to receive events from are contained in the environment.py file.
+Display a message for each event as it is received.  If the connection is
+lost, the stream reconnects automatically and resumes from the last event
+received.  The details of the Dashboard to receive events from are contained
+in the environment.py file.  Alternatively, events may be received from a
+local broker started with 18_event_broker.py, which shares one Dashboard
+connection between many consumers.
 
 Command line arguments:
   optional arguments:
-    -h, --help  show this help message and exit
-    --version   show program's version number and exit
+    -h, --help            show this help message and exit
+    --version             show program's version number and exit
+    -b BROKER, --broker BROKER
+                          Receive events from the event broker at this URL,
+                          for example http://localhost:8765, instead of
+                          connecting to the Dashboard.
+    --json                Output each event as a line of JSON holding its
+                          type, message and parameters.
 
 
 Copyright (c) 2020 Cisco and/or its affiliates.
@@ -31,54 +41,56 @@ import json
 import requests
 import argparse
 
-# SSE Client library (https://github.com/btubbs/sseclient)
-#
-# Use v0.0.22 as 0.0.23-0.0.24 have a bug handling large events
-import sseclient
+import cbdclient
+import cbdevents
+import cbdbroker
+import cbdformat
 
-import environment
-import cbdauth
-
-# Simple command line arguments for help and version
+# Simple command line arguments for help, version and the broker to use
 parser = argparse.ArgumentParser(description='Receive an event stream from '
                                  'Cisco Business Dashboard.')
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+parser.add_argument('-b','--broker',default=None,help='Receive events from '
+                    'the event broker at this URL, for example '
+                    'http://localhost:8765, instead of connecting to the '
+                    'Dashboard.')
+parser.add_argument('--json',action='store_true',help='Output each event as a '
+                    'line of JSON holding its type, message and parameters.')
 args = parser.parse_args()
 
-try:
-  token = None
-  while True:
-    if not token:
-      # Create a properly formatted JWT using 
-      token = cbdauth.getToken(keyid=environment.keyid,
-                               secret=environment.secret,
-                               clientid=environment.clientid,
-                               appname=environment.appname,
-                               lifetime=14400)
-
+def disconnected(message,error):
+  # Report any interruption to the stream.  The stream reconnects by itself,
+  # backing off if the Dashboard is unavailable
+  if error is None:
+    print(message)
+  elif isinstance(error,requests.exceptions.HTTPError):
+    print(message,'HTTPError: {}'.format(error.response.status_code))
+  else:
+    print(message,error)
 
-    events = sseclient.SSEClient('https://%s:%s/api/v2/event-source?types=action,config_change,event,state_change&monitored-networks=all' % 
-                               (environment.dashboard, environment.port),
-                               headers={'Authorization':"Bearer %s" % token},
-                               verify=environment.verify_cbd_cert)
-    try:
-      for ev in events:
-        event = json.loads(ev.data)
-        if event['type'] == '/heart_beat':
+def receive(stream):
+  try:
+    for event in stream:
+      if event['type'] == cbdevents.HEARTBEAT:
+        if not args.json:
           print("Received heartbeat from Dashboard.")
-        else:
-          # Use the event content to generate a human readable english string
-          print("Received event: ",event['english-string'].format(**event['parameters']))
-    except requests.exceptions.HTTPError as e:
-      # HTTP error from the server
-      print('HTTPError: {}'.format(e.response.status_code))
-      if e.response.status_code == 401:
-        print("JWT Expired.  Create a new one.")
-        token = None
+      elif args.json:
+        print(json.dumps(cbdformat.record(event)))
       else:
-        print(vars(e.response))
-    except KeyboardInterrupt:
-      raise
+        # Use the event content to generate a human readable english string.
+        # The template is only parsed the first time it is seen
+        print("Received event: ",cbdformat.render(event))
+
+  except KeyboardInterrupt:
+    print("Exiting.  Goodbye!")
+    print("Received {events} event(s) and reconnected {reconnects} time(s), "
+          "with {totalgap:.1f}s without a connection.".format(**stream.metrics))
 
-except KeyboardInterrupt:
-  print("Exiting.  Goodbye!")  
+if args.broker is not None:
+  # The broker holds the connection to the Dashboard, so no JWT is needed
+  receive(cbdbroker.BrokerStream(args.broker,callback=disconnected))
+else:
+  # Create a client using the details in environment.py.  The client creates
+  # a properly formatted JWT and renews it before it expires
+  with cbdclient.Client.fromEnvironment() as client:
+    receive(cbdevents.EventStream(client,callback=disconnected))
@@ -4,8 +4,12 @@
 Use the Cisco Business Dashboard API to subscribe to the event stream.
 Display a message for each event as it is received.  The stream may be
 restricted using command line arguments to only events from specific networks
-and events of the specified types.  The details of the Dashboard to receive
-events from are contained in the environment.py file.
+and events of the specified types.  If the connection is lost, the stream
+reconnects automatically and resumes from the last event received.  Events
+are handed to a pool of worker threads through a bounded queue so that slow
+output never holds up the stream.  The
+details of the Dashboard to receive events from are contained in the
+environment.py file.
 
 Command line arguments:
   -h, --help            show this help message and exit
@@ -17,6 +21,47 @@ Command line arguments:
                         Event type to monitor. Valid options are action,
                         config_change, event and state_change. May be used
                         multiple times. Default is all.
+  -w WORKERS, --workers WORKERS
+                        The number of threads handling events. Events may be
+                        handled out of order if more than one is used.
+                        Defaults to 1.
+  -q QUEUE, --queue QUEUE
+                        The maximum number of events waiting to be handled.
+                        Defaults to 1000.
+  -p {block,drop-newest,drop-oldest}, --policy {block,drop-newest,drop-oldest}
+                        What to do with new events when the queue is full.
+                        Defaults to block.
+  -o OUTPUT, --output OUTPUT
+                        Also append each event to this file as JSON Lines.
+  --webhook WEBHOOK     Also post each event to this URL.
+  -r RULES, --rules RULES
+                        Route events to the sinks named in this JSON rules
+                        file instead of displaying every event. See
+                        cbdrouter.py for the file format.
+  -b BROKER, --broker BROKER
+                        Receive events from the event broker at this URL,
+                        for example http://localhost:8765, instead of
+                        connecting to the Dashboard. Cannot be used with
+                        --netid, as the broker holds the network
+                        subscription.
+  -j JOURNAL, --journal JOURNAL
+                        Also record each event in a journal in this
+                        directory, so that it can be replayed with
+                        19_replay_events.py.
+  --retention RETENTION
+                        Delete journal segments holding only events older
+                        than this many days. Default is to keep all events.
+  -a AGGREGATE, --aggregate AGGREGATE
+                        Instead of handling each event, group events over
+                        windows of this many seconds and handle a rollup of
+                        each group when its window ends.
+  --slide SLIDE         Use sliding windows starting every this many seconds
+                        rather than consecutive windows.
+  -k KEY, --key KEY     A field to group events by when aggregating. May be
+                        used multiple times. Defaults to type, network-id and
+                        node-id.
+  --json                Display each event as a line of JSON holding its
+                        type, message and parameters.
 
 
 Copyright (c) 2020 Cisco and/or its affiliates.
@@ -36,16 +81,17 @@ or implied.
 """
 
 import json
+import sys
 import requests
 import argparse
 
-# SSE Client library (https://github.com/btubbs/sseclient)
-#
-# Use v0.0.22 as 0.0.23-0.0.24 have a bug handling large events
-import sseclient
-
-import environment
-import cbdauth
+import cbdclient
+import cbdevents
+import cbdpipeline
+import cbdrouter
+import cbdbroker
+import cbdjournal
+import cbdrollup
 
 # Get details of event(s) to display from command line arguments
 #
@@ -63,19 +109,64 @@ parser.add_argument('-t','--type',
                     help='Event type to monitor.  Valid options are '
                     'action, config_change, event and state_change.  May be '
                     'used multiple times.  Default is all.')
+parser.add_argument('-w','--workers',type=int,default=1,help='The number of '
+                    'threads handling events.  Events may be handled out of '
+                    'order if more than one is used.  Defaults to 1.')
+parser.add_argument('-q','--queue',type=int,default=1000,help='The maximum '
+                    'number of events waiting to be handled.  Defaults to '
+                    '1000.')
+parser.add_argument('-p','--policy',choices=cbdpipeline.POLICIES,
+                    default=cbdpipeline.BLOCK,help='What to do with new events'
+                    ' when the queue is full.  Defaults to block.')
+parser.add_argument('-o','--output',default=None,help='Also append each event '
+                    'to this file as JSON Lines.')
+parser.add_argument('--webhook',default=None,help='Also post each event to '
+                    'this URL.')
+parser.add_argument('-r','--rules',default=None,help='Route events to the '
+                    'sinks named in this JSON rules file instead of displaying'
+                    ' every event.  See cbdrouter.py for the file format.')
+parser.add_argument('-b','--broker',default=None,help='Receive events from '
+                    'the event broker at this URL, for example '
+                    'http://localhost:8765, instead of connecting to the '
+                    'Dashboard.  Cannot be used with --netid, as the broker '
+                    'holds the network subscription.')
+parser.add_argument('-j','--journal',default=None,help='Also record each '
+                    'event in a journal in this directory, so that it can be '
+                    'replayed with 19_replay_events.py.')
+parser.add_argument('--retention',type=float,default=None,help='Delete '
+                    'journal segments holding only events older than this '
+                    'many days.  Default is to keep all events.')
+parser.add_argument('-a','--aggregate',type=float,default=None,
+                    help='Instead of handling each event, group events over '
+                    'windows of this many seconds and handle a rollup of each '
+                    'group when its window ends.')
+parser.add_argument('--slide',type=float,default=None,help='Use sliding '
+                    'windows starting every this many seconds rather than '
+                    'consecutive windows.')
+parser.add_argument('-k','--key',default=None,action='append',help='A field to'
+                    ' group events by when aggregating.  May be used multiple '
+                    'times.  Defaults to type, network-id and node-id.')
+parser.add_argument('--json',action='store_true',help='Display each event as '
+                    'a line of JSON holding its type, message and parameters.')
 args = parser.parse_args()
+if args.slide is not None and args.aggregate is None:
+  parser.error('--slide requires --aggregate')
+if args.broker is not None and args.netid is not None:
+  parser.error('--netid cannot be used with --broker')
 
-# Create a properly formatted JWT using environment data
-token = cbdauth.getToken(keyid=environment.keyid,
-                         secret=environment.secret,
-                         clientid=environment.clientid,
-                         appname=environment.appname,
-                         lifetime=3600)
-
-# First is to subscribe to the networks specified on the command line
-if args.netid is not None:
-  # Create a dictionary listing the desired networks, ready for conversion to
-  # a JSON payload later
+def disconnected(message,error):
+  # Report any interruption to the stream.  The stream reconnects by itself,
+  # backing off if the Dashboard is unavailable
+  if error is None:
+    print(message)
+  elif isinstance(error,requests.exceptions.HTTPError):
+    print(message,'HTTPError: {}'.format(error.response.status_code))
+  else:
+    print(message,error)
+
+def subscribe(client):
+  # Create a dictionary listing the desired networks, ready for conversion
+  # to a JSON payload later
   netids = {
     'network-ids':args.netid
   }
@@ -83,72 +174,102 @@ if args.netid is not None:
   try:
     # Build and send the API request.  The event subscription API path is
     # /api/v2/subscription.  Include the netids dictionary as a JSON
-    # payload
-    response=requests.post('https://%s:%s/api/v2/subscription' % 
-                         (environment.dashboard, environment.port),
-                         headers={'Authorization':"Bearer %s" % token},
-                         json=netids,verify=environment.verify_cbd_cert)
+    # payload.  Note that success is a 204 status with no payload.
+    client.post('/api/v2/subscription',netids)
+    print('Successfully subscribed to networks with ID(s) {}'.format(", ".join(args.netid)))
+
+  except requests.exceptions.HTTPError as e:
+    # Some error was returned by the Dashboard.
+    response = e.response
+    print('HTTPError:',response.status_code,response.headers)
+    
+    # Most errors return additional information as a json payload
+    if 'application/json' in response.headers['Content-Type']:
+      print('Error payload:')
+      print(json.dumps(response.json(),indent=2))
+    sys.exit(1)
 
   except requests.exceptions.RequestException as e:
-    # Generally this will be a connection error or timeout.  HTTP errors are
-    # handled in the else section below
+    # Generally this will be a connection error or timeout.
     print("Failed with exception:",e)
     sys.exit(1)
 
+def receive(stream):
+  # Build the list of handlers to pass each event to.  A rules file replaces
+  # the display of every event with routing of matching events to sinks
+  if args.rules is not None:
+    try:
+      handlers = [cbdrouter.Router.fromFile(args.rules)]
+    except (OSError,ValueError,KeyError) as e:
+      print('Unable to load rules from {}: {}'.format(args.rules,e))
+      sys.exit(1)
   else:
-    if response.status_code == 204:
-      # Request succeeded.  Note that success is a 204 staus with no payload.
-      print('Successfully subscribed to networks with ID(s) {}'.format(", ".join(args.netid)))
-    else:
-      # Some other error occurred.
-      print('HTTPError:',response.status_code,response.headers)
-      
-      # Most errors return additional information as a json payload
-      if 'application/json' in response.headers['Content-Type']:
-        print('Error payload:')
-        print(json.dumps(response.json(),indent=2))
+    handlers = [cbdpipeline.PrintHandler(json=args.json)]
+  if args.output is not None:
+    handlers.append(cbdpipeline.FileHandler(args.output))
+  if args.webhook is not None:
+    handlers.append(cbdpipeline.WebhookHandler(args.webhook))
+  if args.aggregate is not None:
+    # The handlers receive rollups rather than the events themselves
+    try:
+      handlers = [cbdrollup.Aggregator(handlers,window=args.aggregate,
+                                       slide=args.slide,keys=args.key)]
+    except ValueError as e:
+      print(e)
       sys.exit(1)
+  if args.journal is not None:
+    retention = args.retention * 86400 if args.retention is not None else None
+    handlers.append(cbdjournal.Journal(args.journal,retention=retention))
+  pipeline = cbdpipeline.Pipeline(handlers,workers=args.workers,
+                                  queuesize=args.queue,policy=args.policy)
 
-
-# Now that we have created our network subscription, 
-try:
-  while True:
-    url = 'https://%s:%s/api/v2/event-source' % (environment.dashboard,
-                                                 environment.port)
-    if args.type is not None:
-      url += "?types=" + ",".join(args.type)
-    else:
-      url += "?types=action,config_change,event,state_change"
-    if args.netid is not None:
-      url += "&monitored-networks=subscribed"
-    else:
-      url += "&monitored-networks=all"
-
-    events = sseclient.SSEClient(url,
-                                 headers={'Authorization':"Bearer %s" % token},
-                                 verify=environment.verify_cbd_cert)
-    try:
-      for ev in events:
-        event = json.loads(ev.data)
-        if event['type'] == '/heart_beat':
+  # Receive the events.  Each event is queued for the worker threads, so the
+  # stream is read without waiting for the output
+  try:
+    for event in stream:
+      if event['type'] == cbdevents.HEARTBEAT:
+        if not args.json:
           print("Received heartbeat from Dashboard.")
-        else:
-          # Use the event content to generate a human readable english string
-          print("Received event: ",event['english-string'].format(**event['parameters']))
-    except requests.exceptions.HTTPError as e:
-      # HTTP error from the server
-      print('HTTPError: {}'.format(e.response.status_code))
-      if e.response.status_code == 401:
-        print("JWT Expired.  Create a new one.")
-        token = cbdauth.getToken(keyid=environment.keyid,
-                                 secret=environment.secret,
-                                 clientid=environment.clientid,
-                                 appname=environment.appname,
-                                 lifetime=3600)
       else:
-        print(vars(e.response))
-    except KeyboardInterrupt:
-      raise
+        pipeline.submit(event)
+
+  except KeyboardInterrupt:
+    print("Exiting.  Goodbye!")
+
+  finally:
+    # Let the workers finish the events already queued, then close any
+    # handlers holding files open.  A router closes the sinks it routes to
+    pipeline.close()
+    for handler in handlers:
+      if hasattr(handler,'close'):
+        handler.close()
+    print("Received {events} event(s) and reconnected {reconnects} time(s), "
+          "with {totalgap:.1f}s without a connection.".format(**stream.metrics))
+    stats = pipeline.stats()
+    print("Dropped {dropped} event(s).  Peak queue depth {maxdepth}.  Average "
+          "queue wait {queue[avg]:.3f}s.".format(**stats))
+    for name, stage in stats['handlers'].items():
+      print("Handler {}: {count} event(s), {errors} error(s), average "
+            "{avg:.3f}s, maximum {max:.3f}s.".format(name,**stage))
+    if args.aggregate is not None:
+      print("Aggregated {received} event(s) into {emitted} rollup(s).".format(
+            **handlers[0].stats()))
+
+if args.broker is not None:
+  # The broker holds the connection to the Dashboard and the network
+  # subscription, so no JWT is needed
+  receive(cbdbroker.BrokerStream(args.broker,types=args.type,
+                                 callback=disconnected))
+else:
+  # Create a client using the details in environment.py.  The client creates
+  # a properly formatted JWT and renews it before it expires
+  with cbdclient.Client.fromEnvironment() as client:
+
+    # First is to subscribe to the networks specified on the command line
+    if args.netid is not None:
+      subscribe(client)
 
-except KeyboardInterrupt:
-  print("Exiting.  Goodbye!")  
+    # Now that we have created our network subscription, receive the events
+    receive(cbdevents.EventStream(client,types=args.type,
+                                  subscribed=args.netid is not None,
+                                  callback=disconnected))
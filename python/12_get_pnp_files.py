@@ -33,51 +33,40 @@ import json
 import sys
 import argparse
 
-import environment
-import cbdauth
+import cbdclient
 
-def doAPIQuery(url,jwt,v=True):
+def doAPIQuery(client,path):
   """
-  Query the Cisco Business Dashboard API using the provided path and token.
-  Returns a JSON object parsed from the response payload.  Exits in the event
-  of an error.
-  
-  Note there is no consideration given here to paging.  So if there are more
-  than 20 entries in a query for a list, only the first 20 entries will be
-  returned.  
+  Query the Cisco Business Dashboard API using the provided client and path.
+  Returns a list of every entry in the list, retrieving as many pages as
+  necessary.  Exits in the event of an error.
   
   Arguments:
-    url - The URL to be queried
-    jwt - A properly formatted JWT to use authenticating with the Dashboard
-    v   - Verify the certificate of the Dashboard.  Set to False for self-
-          signed certs
+    client - A cbdclient.Client connected to the Dashboard
+    path   - The API path to be queried
   """
   try:
-    # Build and send the API request
-    response=requests.get(url,headers={'Authorization':"Bearer %s" % jwt},
-                         verify=v)
+    # Build and send the API request(s).  The client reuses the same
+    # connection for each query and requests further pages until the whole
+    # list has been retrieved
+    return list(client.iterate(path))
+
+  except requests.exceptions.HTTPError as e:
+    # Some error was returned by the Dashboard.
+    response = e.response
+    print('HTTPError:',response.status_code,response.headers)
+  
+    # Most errors return additional information as a json payload
+    if 'application/json' in response.headers['Content-Type']:
+      print('Error payload:')
+      print(json.dumps(response.json(),indent=2))
+    sys.exit(1)
 
   except requests.exceptions.RequestException as e:
-    # Generally this will be a connection error or timeout.  HTTP errors are
-    # handled in the else section below
+    # Generally this will be a connection error or timeout.
     print("Failed with exception:",e)
     sys.exit(1)
 
-  else:
-    if response.status_code == 200:
-      # Request succeeded
-      # The API response payload is a JSON object
-      return(response.json())
-    else:
-      # Some other error occurred.
-      print('HTTPError:',response.status_code,response.headers)
-    
-      # Most errors return additional information as a json payload
-      if 'application/json' in response.headers['Content-Type']:
-        print('Error payload:')
-        print(json.dumps(response.json(),indent=2))
-      sys.exit(1)
-
 def main():
   # Simple command line arguments for help and version
   parser = argparse.ArgumentParser(description='Retrieve a list of PnP files '
@@ -85,37 +74,32 @@ def main():
   parser.add_argument('--version', action='version', version='%(prog)s 1.0')
   args = parser.parse_args()
 
-  # Create a properly formatted JWT using 
-  token = cbdauth.getToken(keyid=environment.keyid,
-                           secret=environment.secret,
-                           clientid=environment.clientid,
-                           appname=environment.appname)
-
-  # Get image list
-  imagedata = doAPIQuery('https://%s:%s/api/v2/pnp/images' % 
-                         (environment.dashboard, environment.port),
-                         token, environment.verify_cbd_cert)
-
-  # Iterate through the response and print in a nice-ish table
-  print('='*48,'PnP Images','='*49)
-  print("| {:25} | {:64} | {:10} |".format('File ID','Filename','Size'))
-  print('|','-'*25,'+','-'*64,'+','-'*10,'|')
-  for image in imagedata['data']:
-    print("| {id:25} | {file-name:64} | {file-size:10} |".format(**image))
-  print('+','-'*25,'+','-'*64,'+','-'*10,'+','\n')
-
-  # Get config list
-  configdata = doAPIQuery('https://%s:%s/api/v2/pnp/configs' % 
-                         (environment.dashboard, environment.port),
-                         token, environment.verify_cbd_cert)
-
-  # Iterate through the response and print in a nice-ish table
-  print('='*48,'PnP Configs','='*48)
-  print("| {:25} | {:64} | {:10} |".format('File ID','Filename','Size'))
-  print('|','-'*25,'+','-'*64,'+','-'*10,'|')
-  for config in configdata['data']:
-    print("| {id:25} | {file-name:64} | {file-size:10} |".format(**config))
-  print('+','-'*25,'+','-'*64,'+','-'*10,'+','\n')
+  # Create a client using the details in environment.py.  The client creates
+  # a properly formatted JWT and keeps the connection to the Dashboard open
+  # between queries
+  with cbdclient.Client.fromEnvironment() as client:
+
+    # Get image list
+    imagedata = doAPIQuery(client,'/api/v2/pnp/images')
+
+    # Iterate through the response and print in a nice-ish table
+    print('='*48,'PnP Images','='*49)
+    print("| {:25} | {:64} | {:10} |".format('File ID','Filename','Size'))
+    print('|','-'*25,'+','-'*64,'+','-'*10,'|')
+    for image in imagedata:
+      print("| {id:25} | {file-name:64} | {file-size:10} |".format(**image))
+    print('+','-'*25,'+','-'*64,'+','-'*10,'+','\n')
+
+    # Get config list
+    configdata = doAPIQuery(client,'/api/v2/pnp/configs')
+
+    # Iterate through the response and print in a nice-ish table
+    print('='*48,'PnP Configs','='*48)
+    print("| {:25} | {:64} | {:10} |".format('File ID','Filename','Size'))
+    print('|','-'*25,'+','-'*64,'+','-'*10,'|')
+    for config in configdata:
+      print("| {id:25} | {file-name:64} | {file-size:10} |".format(**config))
+    print('+','-'*25,'+','-'*64,'+','-'*10,'+','\n')
 
 if __name__== "__main__":
   main()
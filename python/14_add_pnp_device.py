@@ -38,10 +38,12 @@ or implied.
 
 import requests
 import json
+import sys
 import argparse
 
 import environment
 import cbdauth
+import cbdcache
 
 # Get details of network to create from command line arguments
 #
@@ -54,13 +56,32 @@ parser.add_argument('-t','--type',choices=['Router', 'Switch', 'WAP'],
                     required=True,help='The type of device')
 parser.add_argument('-p','--pid',required=True,help='The device product ID')
 parser.add_argument('-s','--sn',required=True,help='The device serial number')
-parser.add_argument('-g','--group',required=True,help='The device group ID for'
-                    ' the device.')
-parser.add_argument('--net',required=True,help='The network ID for the device.')
-parser.add_argument('-i','--image',default=None,help='The image file ID.')
-parser.add_argument('-c','--config',default=None,help='The config file ID.')
+parser.add_argument('-g','--group',required=True,help='The device group ID or'
+                    ' name for the device.')
+parser.add_argument('--net',required=True,help='The network ID or name for the '
+                    'device.')
+parser.add_argument('-i','--image',default=None,help='The image file ID or '
+                    'name.')
+parser.add_argument('-c','--config',default=None,help='The config file ID or '
+                    'name.')
 args = parser.parse_args()
 
+# Accept either the ID or the name of the group, network and files.  Names are
+# looked up in the local cache maintained by cbdcache, which is refreshed from
+# the Dashboard only when it is out of date
+try:
+  cache = cbdcache.IdCache()
+  groupid = cache.resolve('group',args.group)
+  networkid = cache.resolve('network',args.net)
+  imageid = cache.resolve('image',args.image) if args.image else None
+  configid = cache.resolve('config',args.config) if args.config else None
+except (KeyError,ValueError) as e:
+  print(e.args[0])
+  sys.exit(1)
+except requests.exceptions.RequestException as e:
+  print("Failed with exception:",e)
+  sys.exit(1)
+
 # Create a dictionary of the new device's details, ready for conversion to
 # a JSON payload later
 device = {
@@ -68,10 +89,10 @@ device = {
   'node-type':args.type,
   'pid':args.pid,
   'sn':args.sn,
-  'group-id':args.group,
-  'network-id':args.net,
-  'image-id':args.image,
-  'config-id':args.config
+  'group-id':groupid,
+  'network-id':networkid,
+  'image-id':imageid,
+  'config-id':configid
 }
 
 # Create a properly formatted JWT using environment data
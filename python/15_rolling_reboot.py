@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Reboot many devices in rolling waves using Cisco Business Dashboard.
+
+Reboot a set of devices selected by device ID, network ID, device group ID
+and/or device type without taking down a whole site at once.  The devices are
+grouped into waves by network, device type or device group, and no wave
+reboots more than a fixed number of devices from any one network.  After
+each wave is submitted, the Dashboard is polled until every device in the
+wave has gone down and is reachable again, or its reboot job has finished,
+before the next wave starts, and the time taken by each wave is reported.  The details of the Dashboard are contained in the
+environment.py file.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -d DEVICE, --device DEVICE
+                        The nodeId for a device to reboot. Multiple IDs may be
+                        specified.
+  -n NETWORK, --network NETWORK
+                        Reboot the devices in the network with this ID.
+                        Multiple IDs may be specified.
+  -g GROUP, --group GROUP
+                        Reboot the devices in the device group with this ID.
+                        Multiple IDs may be specified.
+  -t TYPE, --type TYPE  Reboot only devices of the specified type(s). Defaults
+                        to Device (routers, switches and WAPs). May be
+                        specified multiple times.
+  -b {network,type,group}, --by {network,type,group}
+                        How to group devices into waves. Defaults to network.
+  -p PERNETWORK, --pernetwork PERNETWORK
+                        The maximum number of devices in any one network to
+                        reboot at the same time. Defaults to 1.
+  -s SETTLE, --settle SETTLE
+                        An additional number of seconds to wait after
+                        submitting a wave before checking whether the devices
+                        are back online. Defaults to 0.
+  -w WAIT, --wait WAIT  The maximum number of seconds to wait for a wave to
+                        come back online. Defaults to 900.
+  -k, --keep-going      Continue with the next wave even if some devices in
+                        a wave do not come back online.
+  --dry-run             Display the planned waves without rebooting anything.
+  --rate RATE           The maximum number of requests per second that read
+                        from the Dashboard. Unlimited by default.
+  --write-rate RATE     The maximum number of requests per second that make
+                        changes on the Dashboard. Unlimited by default.
+  --limit-file FILE     Share the rate limits with other scripts on this host
+                        given the same file.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import requests
+import json
+import sys
+import time
+import argparse
+
+import cbdclient
+import cbdbulk
+
+def getArgs():
+  # Get details of the device(s) to reboot and how to schedule them from
+  # command line arguments
+  parser = argparse.ArgumentParser(description='Reboot the selected devices '
+                                   'in rolling waves, waiting for each wave to'
+                                   ' come back online before starting the '
+                                   'next.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-d','--device',default=[],action='append',
+                      help='The nodeId for a device to reboot.  Multiple IDs '
+                      'may be specified.')
+  parser.add_argument('-n','--network',default=[],action='append',
+                      help='Reboot the devices in the network with this ID.  '
+                      'Multiple IDs may be specified.')
+  parser.add_argument('-g','--group',default=[],action='append',
+                      help='Reboot the devices in the device group with this '
+                      'ID.  Multiple IDs may be specified.')
+  parser.add_argument('-t','--type',action='append',help='Reboot only devices '
+                      'of the specified type(s).  Defaults to Device (routers,'
+                      ' switches and WAPs).  May be specified multiple times.')
+  parser.add_argument('-b','--by',choices=['network','type','group'],
+                      default='network',help='How to group devices into '
+                      'waves.  Defaults to network.')
+  parser.add_argument('-p','--pernetwork',type=int,default=1,help='The maximum'
+                      ' number of devices in any one network to reboot at the '
+                      'same time.  Defaults to 1.')
+  parser.add_argument('-s','--settle',type=int,default=0,help='An additional '
+                      'number of seconds to wait after submitting a wave '
+                      'before checking whether the devices are back online.  '
+                      'Defaults to 0.')
+  parser.add_argument('-w','--wait',type=int,default=900,help='The maximum '
+                      'number of seconds to wait for a wave to come back '
+                      'online.  Defaults to 900.')
+  parser.add_argument('-k','--keep-going',action='store_true',help='Continue '
+                      'with the next wave even if some devices in a wave do '
+                      'not come back online.')
+  parser.add_argument('--dry-run',action='store_true',help='Display the '
+                      'planned waves without rebooting anything.')
+  parser.add_argument('--rate',type=float,default=None,help='The maximum '
+                      'number of requests per second that read from the '
+                      'Dashboard.  Unlimited by default.')
+  parser.add_argument('--write-rate',type=float,default=None,help='The '
+                      'maximum number of requests per second that make changes'
+                      ' on the Dashboard.  Unlimited by default.')
+  parser.add_argument('--limit-file',default=None,metavar='FILE',help='Share '
+                      'the rate limits with other scripts on this host given '
+                      'the same file.')
+  args = parser.parse_args()
+  if not (args.device or args.network or args.group):
+    parser.error('At least one device, network or group must be specified.')
+  return args
+
+def selectNodes(client,args):
+  """
+  Return the node records for every device selected on the command line.
+  Devices given by ID that are not found, or are not of the selected types,
+  are reported and skipped.
+  """
+  # The group ID is needed to select and label devices by group
+  params = [('fields','/system-state/hostname,/system-state/type,/group-id')]
+  for type in args.type or ['Device']:
+    params.append(('type',type))
+
+  selected = []
+  for node in client.iterate('/api/v2/nodes',params):
+    if (node.get('id') in args.device or
+        cbdbulk.nodeNetwork(node) in args.network or
+        node.get('group-id') in args.group):
+      selected.append(node)
+
+  found = {node['id'] for node in selected}
+  for nodeid in args.device:
+    if nodeid not in found:
+      print('Skipping device {}, which was not found or is not of the '
+            'selected type(s).'.format(nodeid))
+  return selected
+
+def waveKey(client,by):
+  """
+  Return a function giving the wave label for a node, according to the
+  grouping selected on the command line.
+  """
+  if by == 'network':
+    return cbdbulk.nodeNetwork
+  if by == 'type':
+    return lambda node: cbdbulk.field(node,'/system-state/type')
+
+  # Label device groups by name, using the list from /api/v2/groups
+  names = {group['id']:group.get('name',group['id'])
+           for group in client.iterate('/api/v2/groups')}
+  return lambda node: names.get(node.get('group-id'),node.get('group-id'))
+
+def main():
+  args = getArgs()
+
+  # Requests refused because the Dashboard is busy are retried after a delay
+  ratelimit = {'read':args.rate,'write':args.write_rate}
+  with cbdclient.Client.fromEnvironment(ratelimit=ratelimit,
+                                        limitfile=args.limit_file) as client:
+    try:
+      nodes = selectNodes(client,args)
+      waves = cbdbulk.planWaves(nodes,waveKey(client,args.by),
+                                args.pernetwork)
+    except requests.exceptions.RequestException as e:
+      print("Failed to list devices with exception:",e)
+      sys.exit(1)
+
+    print('Rebooting {} device(s) in {} wave(s)'.format(len(nodes),
+                                                        len(waves)))
+    for number, (label, wave) in enumerate(waves,1):
+      names = [cbdbulk.field(node,'/system-state/hostname') or node['id']
+               for node in wave]
+      print('Wave {} ({} {}): {}'.format(number,args.by,label,
+                                          ', '.join(names)))
+    if args.dry_run:
+      return
+
+    failed = False
+    for number, (label, wave) in enumerate(waves,1):
+      nodeids = [node['id'] for node in wave]
+      started = time.monotonic()
+      try:
+        # The reboot operation API path is /api/v2/nodes/operations/reboot
+        result = client.post('/api/v2/nodes/operations/reboot',
+                             {'node-ids':nodeids})
+      except requests.exceptions.HTTPError as e:
+        print('Wave {}: HTTPError:'.format(number),e.response.status_code)
+        if 'application/json' in e.response.headers.get('Content-Type',''):
+          print(json.dumps(e.response.json(),indent=2))
+        sys.exit(1)
+      except requests.exceptions.RequestException as e:
+        print('Wave {}: Failed with exception:'.format(number),e)
+        sys.exit(1)
+      print('Wave {}: submitted reboot with job ID(s) {}'.format(
+            number,', '.join(result['job-ids'])))
+
+      # A device only counts as back online once it has been seen to go
+      # down or its reboot job has finished, so no fixed delay is needed
+      time.sleep(args.settle)
+      offline = cbdbulk.waitForNodes(client,nodeids,
+                                     max(args.wait - args.settle,0),
+                                     jobids=result['job-ids'])
+      elapsed = time.monotonic() - started
+      if offline:
+        failed = True
+        print('Wave {}: {} of {} device(s) not back online after {:.0f}s: '
+              '{}'.format(number,len(offline),len(nodeids),elapsed,
+                          ', '.join(offline)))
+        if not args.keep_going:
+          print('Stopping.  Use --keep-going to continue regardless.')
+          sys.exit(1)
+      else:
+        print('Wave {}: all {} device(s) back online after {:.0f}s'.format(
+              number,len(nodeids),elapsed))
+
+    if failed:
+      sys.exit(1)
+
+if __name__== "__main__":
+  main()
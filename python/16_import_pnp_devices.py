@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Create many PnP-enabled devices in Cisco Business Dashboard from a file.
+
+Read a list of devices from a CSV or JSON Lines file and create a Network
+Plug and Play device for each one using the Cisco Business Dashboard API.
+Each row must provide the name, type, pid, sn, group and network of the
+device, and may optionally provide an image and config.  The group and
+network may be given either as an ID or as a name, and the image and config
+either as a file ID or as a file name.  They are resolved using a single
+query of each of the device group, network, PnP image and PnP config lists.
+
+Every row is checked before any device is created.  The devices are then
+created concurrently over a shared connection to the Dashboard, and the
+outcome for each row is recorded in a CSV report as it completes.  If the
+import is interrupted or some rows fail, running the same command with the
+--resume option skips the rows the report shows were already created.  The
+details of the Dashboard are contained in the environment.py file.
+
+Command line arguments:
+  positional arguments:
+    file                  A CSV file with a header row, or a JSON Lines file
+                          with one object per line, listing the devices.
+
+  optional arguments:
+    -h, --help            show this help message and exit
+    --version             show program's version number and exit
+    -f {csv,jsonl}, --format {csv,jsonl}
+                          The format of the file. By default this is taken
+                          from the file extension.
+    -r REPORT, --report REPORT
+                          The file to record the outcome for each row in.
+                          Defaults to the input file name with .report.csv
+                          appended.
+    --resume              Skip rows recorded as created in the report.
+    -w WORKERS, --workers WORKERS
+                          The number of devices to create concurrently.
+                          Defaults to 4.
+    --check               Check the file without creating any devices.
+    --rate RATE           The maximum number of requests per second that read
+                          from the Dashboard. Unlimited by default.
+    --write-rate RATE     The maximum number of requests per second that make
+                          changes on the Dashboard. Unlimited by default.
+    --limit-file FILE     Share the rate limits with other scripts on this
+                          host given the same file.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import requests
+import csv
+import json
+import os
+import sys
+import threading
+import argparse
+
+import cbdclient
+import cbdbulk
+
+# Columns of the input file
+REQUIRED = ('name','type','pid','sn','group','network')
+OPTIONAL = ('image','config')
+TYPES = ('Router','Switch','WAP')
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Create PnP-enabled devices '
+                                   'listed in a CSV or JSON Lines file.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('file',help='A CSV file with a header row, or a JSON '
+                      'Lines file with one object per line, listing the '
+                      'devices.')
+  parser.add_argument('-f','--format',choices=['csv','jsonl'],default=None,
+                      help='The format of the file.  By default this is taken'
+                      ' from the file extension.')
+  parser.add_argument('-r','--report',default=None,help='The file to record '
+                      'the outcome for each row in.  Defaults to the input '
+                      'file name with .report.csv appended.')
+  parser.add_argument('--resume',action='store_true',help='Skip rows recorded'
+                      ' as created in the report.')
+  parser.add_argument('-w','--workers',type=int,default=4,help='The number of '
+                      'devices to create concurrently.  Defaults to 4.')
+  parser.add_argument('--check',action='store_true',help='Check the file '
+                      'without creating any devices.')
+  parser.add_argument('--rate',type=float,default=None,help='The maximum '
+                      'number of requests per second that read from the '
+                      'Dashboard.  Unlimited by default.')
+  parser.add_argument('--write-rate',type=float,default=None,help='The '
+                      'maximum number of requests per second that make changes'
+                      ' on the Dashboard.  Unlimited by default.')
+  parser.add_argument('--limit-file',default=None,metavar='FILE',help='Share '
+                      'the rate limits with other scripts on this host given '
+                      'the same file.')
+  args = parser.parse_args()
+  if args.format is None:
+    ext = os.path.splitext(args.file)[1].lower()
+    args.format = 'jsonl' if ext in ('.jsonl','.json','.ndjson') else 'csv'
+  if args.report is None:
+    args.report = args.file + '.report.csv'
+  return args
+
+def readRows(filename,format):
+  """
+  Return a list of (line, row) tuples read from the input file, where row is
+  a dictionary of column values.
+  """
+  with open(filename,newline='') as f:
+    if format == 'csv':
+      # Line 1 is the header
+      return [(line,row) for line, row in enumerate(csv.DictReader(f),2)]
+    return [(line,json.loads(text)) for line, text in enumerate(f,1)
+            if text.strip()]
+
+def nameIndex(records,namefield='file-name'):
+  """
+  Index a list of records, such as PnP files, by both ID and name.  A name
+  shared by records with different IDs is indexed as None, as it cannot be
+  resolved.
+  """
+  index = {}
+  for record in records:
+    name = record.get(namefield)
+    if name in index and index[name] != record['id']:
+      index[name] = None
+    else:
+      index[name] = record['id']
+  for record in records:
+    index[record['id']] = record['id']
+  return index
+
+def listNetworks(client):
+  """
+  Return the networks of every organization.  The Dashboard only lists the
+  networks of the organization selected with the x-ctx-org-id header.
+  """
+  # The getNetworks API path is /api/v2/networks
+  return [network for org in client.iterate('/api/v2/orgs')
+          for network in client.iterate('/api/v2/networks',
+                                        headers={'x-ctx-org-id':org['id']})]
+
+def checkRows(rows,indexes):
+  """
+  Check every row and convert it to a createPnpDevice payload.  Returns a
+  list of (line, device) tuples and a list of error strings.
+
+  Arguments:
+    rows    - The (line, row) tuples returned by readRows
+    indexes - A dictionary holding the nameIndex of the groups, networks,
+              images and configs, keyed by column name
+  """
+  devices = []
+  errors = []
+  serials = {}
+  for line, row in rows:
+    # A line of a JSON Lines file may hold any JSON value, not just an object
+    if not isinstance(row,dict):
+      errors.append('Line {}: expected an object, not {}'.format(
+                    line,type(row).__name__))
+      continue
+    row = {key:(str(value).strip() if value is not None else '')
+           for key, value in row.items()}
+    problems = ['missing {}'.format(column) for column in REQUIRED
+                if not row.get(column)]
+    if row.get('type') and row['type'] not in TYPES:
+      problems.append('type must be one of {}'.format(', '.join(TYPES)))
+    if row.get('sn') in serials:
+      problems.append('serial number also used on line {}'.format(
+                      serials[row['sn']]))
+    elif row.get('sn'):
+      serials[row['sn']] = line
+
+    device = {
+      'device-name':row.get('name'),
+      'node-type':row.get('type'),
+      'pid':row.get('pid'),
+      'sn':row.get('sn'),
+      'group-id':None,
+      'network-id':None,
+      'image-id':None,
+      'config-id':None
+    }
+    for column, index in indexes.items():
+      if row.get(column):
+        if row[column] not in index:
+          problems.append('unknown {} {}'.format(column,row[column]))
+        elif index[row[column]] is None:
+          problems.append('{} name {} is used more than once.  Use the ID '
+                          'instead'.format(column,row[column]))
+        else:
+          device[column + '-id'] = index[row[column]]
+
+    if problems:
+      errors.append('Line {}: {}'.format(line,'; '.join(problems)))
+    else:
+      devices.append((line,device))
+  return devices, errors
+
+def readReport(filename):
+  """Return the set of serial numbers recorded as created in a report."""
+  created = set()
+  if os.path.exists(filename):
+    with open(filename,newline='') as f:
+      for row in csv.DictReader(f):
+        if row['status'] == 'created':
+          created.add(row['sn'])
+  return created
+
+def main():
+  args = getArgs()
+  try:
+    rows = readRows(args.file,args.format)
+  except (OSError,ValueError) as e:
+    print('Unable to read {}: {}'.format(args.file,e))
+    sys.exit(1)
+
+  ratelimit = {'read':args.rate,'write':args.write_rate}
+  with cbdclient.Client.fromEnvironment(poolsize=args.workers,
+                                        ratelimit=ratelimit,
+                                        limitfile=args.limit_file) as client:
+    try:
+      # Get the group, network, image and config lists once so that every
+      # row may be checked and resolved locally before any device is created
+      indexes = {
+        'group':nameIndex(list(client.iterate('/api/v2/groups')),'name'),
+        'network':nameIndex(listNetworks(client),'name'),
+        'image':nameIndex(list(client.iterate('/api/v2/pnp/images'))),
+        'config':nameIndex(list(client.iterate('/api/v2/pnp/configs')))
+      }
+    except requests.exceptions.RequestException as e:
+      print("Failed to list groups, networks and PnP files with exception:",e)
+      sys.exit(1)
+
+    devices, errors = checkRows(rows,indexes)
+    for error in errors:
+      print(error)
+    if errors:
+      print('{} of {} row(s) have errors.  No devices were created.'.format(
+            len(errors),len(rows)))
+      sys.exit(1)
+
+    if args.resume:
+      created = readReport(args.report)
+      devices = [(line,device) for line, device in devices
+                 if device['sn'] not in created]
+      print('Skipping {} device(s) already created.'.format(
+            len(rows) - len(devices)))
+    if args.check:
+      print('All {} row(s) are valid.  {} device(s) would be created.'.format(
+            len(rows),len(devices)))
+      return
+
+    # Record the outcome of each row as soon as it completes so that an
+    # interrupted import can be resumed
+    lines = {device['sn']:line for line, device in devices}
+    lock = threading.Lock()
+    newreport = not (args.resume and os.path.exists(args.report))
+    with open(args.report,'w' if newreport else 'a',newline='') as f:
+      report = csv.writer(f)
+      if newreport:
+        report.writerow(['line','sn','status','detail'])
+
+      def completed(device,result,error):
+        if error is None:
+          outcome = ['created',result.get('id','') if isinstance(result,dict)
+                               else '']
+        elif isinstance(error,requests.exceptions.HTTPError):
+          outcome = ['failed','HTTP {} {}'.format(error.response.status_code,
+                                                  error.response.text)]
+        else:
+          outcome = ['failed',str(error)]
+        with lock:
+          report.writerow([lines[device['sn']],device['sn']] + outcome)
+          f.flush()
+          print('Line {}: {} {} {}'.format(lines[device['sn']],
+                                           device['device-name'],*outcome))
+
+      # The createPnpDevice API path is /api/v2/pnp/devices
+      outcomes = cbdbulk.submitAll(client,'/api/v2/pnp/devices',
+                                   [device for line, device in devices],
+                                   workers=args.workers,callback=completed)
+
+  # A device whose outcome could not be recorded was still created, but will
+  # be created again if the import is resumed
+  unrecorded = [(lines[device['sn']],error)
+                for device, result, error in outcomes
+                if result is not None and error is not None]
+  for line, error in unrecorded:
+    print('Line {}: created, but the outcome could not be recorded: {}'
+          .format(line,error))
+  failures = sum(1 for device, result, error in outcomes if result is None)
+  print('Created {} device(s), {} failed, {} not recorded.  See {} for '
+        'details.'.format(len(outcomes) - failures,failures,len(unrecorded),
+                          args.report))
+  if failures or unrecorded:
+    sys.exit(1)
+
+if __name__== "__main__":
+  main()
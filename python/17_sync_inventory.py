@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Report changes to the Cisco Business Dashboard inventory since the last run.
+
+Maintain a local snapshot of the networks and devices known to Cisco Business
+Dashboard, and on each run report only what has changed since the previous
+snapshot was taken.  To keep each run small, only the fields being tracked
+are requested from the Dashboard, and the remaining pages of the device list
+are requested concurrently.  The change set is output as JSON Lines, one
+object per added, removed or changed record, with changed records listing
+only the fields that differ.  The details of the Dashboard to query are
+contained in the environment.py file.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -s SNAPSHOT, --snapshot SNAPSHOT
+                        The file holding the inventory snapshot. Defaults to
+                        inventory.snapshot.json.
+  -f FIELD, --field FIELD
+                        A device field to track, for example
+                        /system-state/firmware-version. May be specified
+                        multiple times. Defaults to hostname, type, IP
+                        address, serial number and reachability.
+  -w WORKERS, --workers WORKERS
+                        The number of pages of results to request
+                        concurrently. Defaults to 4.
+  --dry-run             Report changes without updating the snapshot.
+  --metrics FILE        Write the latency of each API endpoint to this file as
+                        JSON, every 10 seconds and on exit.
+  --metrics-port PORT   Serve the latency of each API endpoint in the
+                        OpenMetrics format on this local port while running.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import requests
+import json
+import os
+import sys
+import time
+import argparse
+
+import cbdclient
+import cbdjson
+import cbdmetrics
+import cbdquery
+
+# Fields tracked when none are given on the command line
+NODE_FIELDS = ['/system-state/hostname','/system-state/type','/system-state/ip',
+               '/system-state/sn','/system-state/reachability']
+NETWORK_FIELDS = ['name','description']
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Report the networks and '
+                                   'devices that have been added, removed or '
+                                   'changed since the last run.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-s','--snapshot',default='inventory.snapshot.json',
+                      help='The file holding the inventory snapshot.  Defaults'
+                      ' to inventory.snapshot.json.')
+  parser.add_argument('-f','--field',default=None,action='append',
+                      help='A device field to track, for example '
+                      '/system-state/firmware-version.  May be specified '
+                      'multiple times.  Defaults to hostname, type, IP '
+                      'address, serial number and reachability.')
+  parser.add_argument('-w','--workers',type=int,default=4,help='The number of '
+                      'pages of results to request concurrently.  Defaults to '
+                      '4.')
+  parser.add_argument('--dry-run',action='store_true',help='Report changes '
+                      'without updating the snapshot.')
+  parser.add_argument('--metrics',default=None,metavar='FILE',help='Write the '
+                      'latency of each API endpoint to this file as JSON, '
+                      'every 10 seconds and on exit.')
+  parser.add_argument('--metrics-port',type=int,default=None,metavar='PORT',
+                      help='Serve the latency of each API endpoint in the '
+                      'OpenMetrics format on this local port while running.')
+  return parser.parse_args()
+
+def fetch(client,query,workers):
+  """
+  Return a dictionary of flattened records from a list query, indexed by ID.
+  """
+  return {record['id']:cbdjson.flatten(record) for record in
+          query.iterate(client,workers=workers)}
+
+def diff(kind,old,new):
+  """
+  Compare two dictionaries of flattened records and yield a change record for
+  each one that has been added, removed or changed.
+  """
+  for id in new.keys() - old.keys():
+    yield {'kind':kind,'change':'added','id':id,'record':new[id]}
+  for id in old.keys() - new.keys():
+    yield {'kind':kind,'change':'removed','id':id,'record':old[id]}
+  for id in new.keys() & old.keys():
+    if new[id] != old[id]:
+      fields = {path:[old[id].get(path),new[id].get(path)]
+                for path in old[id].keys() | new[id].keys()
+                if old[id].get(path) != new[id].get(path)}
+      yield {'kind':kind,'change':'changed','id':id,'fields':fields}
+
+def main():
+  args = getArgs()
+
+  # Load the previous snapshot.  If the tracked fields have changed, the old
+  # snapshot cannot be compared and a new baseline is taken
+  nodefields = args.field or NODE_FIELDS
+  snapshot = {'fields':nodefields,'networks':{},'nodes':{},'taken':None}
+  if os.path.exists(args.snapshot):
+    with open(args.snapshot) as f:
+      previous = json.load(f)
+    if previous.get('fields') == nodefields:
+      snapshot = previous
+    else:
+      print('Tracked fields differ from the snapshot.  Taking a new '
+            'baseline.',file=sys.stderr)
+
+  # Only the tracked fields are requested
+  try:
+    networkquery = cbdquery.NetworkQuery().fields(*NETWORK_FIELDS)
+    nodequery = cbdquery.NodeQuery().fields(*nodefields).types('All')
+  except ValueError as e:
+    print(e)
+    sys.exit(1)
+
+  metrics = None
+  if args.metrics or args.metrics_port:
+    metrics = cbdmetrics.Metrics()
+
+  with cbdmetrics.Exporter(metrics,args.metrics,args.metrics_port), \
+       cbdclient.Client.fromEnvironment(poolsize=args.workers,
+                                        metrics=metrics) as client:
+    try:
+      networks = fetch(client,networkquery,args.workers)
+      nodes = fetch(client,nodequery,args.workers)
+    except requests.exceptions.HTTPError as e:
+      print('HTTPError:',e.response.status_code,e.response.headers)
+      sys.exit(1)
+    except requests.exceptions.RequestException as e:
+      print("Failed with exception:",e)
+      sys.exit(1)
+
+  changes = 0
+  for change in diff('network',snapshot['networks'],networks):
+    print(json.dumps(change))
+    changes += 1
+  for change in diff('node',snapshot['nodes'],nodes):
+    print(json.dumps(change))
+    changes += 1
+  print('{} change(s) since {}'.format(changes,snapshot['taken'] or
+                                       'no previous snapshot'),
+        file=sys.stderr)
+
+  if not args.dry_run:
+    # Write the new snapshot alongside the old one and then swap them, so an
+    # interrupted run never leaves a damaged snapshot
+    snapshot = {'fields':nodefields,'networks':networks,'nodes':nodes,
+                'taken':time.strftime('%Y-%m-%dT%H:%M:%SZ',time.gmtime())}
+    with open(args.snapshot + '.tmp','w') as f:
+      json.dump(snapshot,f)
+    os.replace(args.snapshot + '.tmp',args.snapshot)
+
+if __name__== "__main__":
+  main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Share one Cisco Business Dashboard event stream with many local consumers.
+
+Open a single connection to the Dashboard event stream and re-publish the
+events to local subscribers over HTTP, so that any number of consumers on
+this host share one stream and one network subscription.  Subscribers
+connect to http://localhost:8765/events and may filter the events they
+receive by type and by field, and each has its own bounded buffer so that
+one slow consumer cannot hold up the others.  Scripts 10 and 11 subscribe to
+a broker when given the --broker option.  The details of the Dashboard to
+receive events from are contained in the environment.py file.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -n NETID, --netid NETID
+                        Network ID to monitor. May be used multiple times.
+                        Default is all networks.
+  -t {action,config_change,event,state_change}, --type {action,config_change,event,state_change}
+                        Event type to receive from the Dashboard. Valid
+                        options are action, config_change, event and
+                        state_change. May be used multiple times. Default is
+                        all.
+  -a ADDRESS, --address ADDRESS
+                        The address to accept subscribers on. Defaults to
+                        127.0.0.1.
+  -p PORT, --port PORT  The port to accept subscribers on. Defaults to 8765.
+  -b BUFFER, --buffer BUFFER
+                        The maximum number of events buffered for each
+                        subscriber. Defaults to 1000.
+  --history HISTORY     The number of recent events kept for subscribers that
+                        reconnect. Defaults to 1000.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import sys
+import requests
+import argparse
+
+import cbdclient
+import cbdevents
+import cbdbroker
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Share one event stream from '
+                                   'Cisco Business Dashboard with many local '
+                                   'consumers.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-n','--netid',default=None,action='append',
+                      help='Network ID to monitor.  May be used multiple '
+                      'times.  Default is all networks.')
+  parser.add_argument('-t','--type',choices=cbdevents.EVENT_TYPES,
+                      default=None,action='append',
+                      help='Event type to receive from the Dashboard.  Valid '
+                      'options are action, config_change, event and '
+                      'state_change.  May be used multiple times.  Default is '
+                      'all.')
+  parser.add_argument('-a','--address',default='127.0.0.1',help='The address '
+                      'to accept subscribers on.  Defaults to 127.0.0.1.')
+  parser.add_argument('-p','--port',type=int,default=8765,help='The port to '
+                      'accept subscribers on.  Defaults to 8765.')
+  parser.add_argument('-b','--buffer',type=int,default=1000,help='The maximum '
+                      'number of events buffered for each subscriber.  '
+                      'Defaults to 1000.')
+  parser.add_argument('--history',type=int,default=1000,help='The number of '
+                      'recent events kept for subscribers that reconnect.  '
+                      'Defaults to 1000.')
+  return parser.parse_args()
+
+def disconnected(message,error):
+  # Report any interruption to the upstream stream.  The stream reconnects by
+  # itself, backing off if the Dashboard is unavailable
+  if error is None:
+    print(message)
+  elif isinstance(error,requests.exceptions.HTTPError):
+    print(message,'HTTPError: {}'.format(error.response.status_code))
+  else:
+    print(message,error)
+
+def main():
+  args = getArgs()
+
+  with cbdclient.Client.fromEnvironment() as client:
+    # Subscribe to the networks specified on the command line once, on behalf
+    # of every local consumer
+    if args.netid is not None:
+      try:
+        client.post('/api/v2/subscription',{'network-ids':args.netid})
+        print('Successfully subscribed to networks with ID(s) {}'.format(
+              ", ".join(args.netid)))
+      except requests.exceptions.HTTPError as e:
+        print('HTTPError:',e.response.status_code,e.response.headers)
+        sys.exit(1)
+      except requests.exceptions.RequestException as e:
+        print("Failed with exception:",e)
+        sys.exit(1)
+
+    stream = cbdevents.EventStream(client,types=args.type,
+                                   subscribed=args.netid is not None,
+                                   callback=disconnected)
+    try:
+      broker = cbdbroker.Broker(stream,host=args.address,port=args.port,
+                                buffersize=args.buffer,history=args.history)
+    except OSError as e:
+      print('Unable to listen on {}:{}: {}'.format(args.address,args.port,e))
+      sys.exit(1)
+
+    print('Publishing events on http://{}:{}/events'.format(*broker.address))
+    try:
+      broker.run()
+    except KeyboardInterrupt:
+      print("Exiting.  Goodbye!")
+    finally:
+      stream.close()
+      print("Published {} event(s) and reconnected {} time(s).".format(
+            broker.published,stream.metrics['reconnects']))
+
+if __name__== "__main__":
+  main()
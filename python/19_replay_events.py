@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Replay Cisco Business Dashboard events recorded in a journal.
+
+Read the events recorded by 11_get_event_stream_filtered.py with the
+--journal option, and display those received in a time range and of the
+selected types.  Only the parts of the journal that could hold matching
+events are read.  Events are displayed as human readable messages, or
+output as JSON Lines for processing by another program.  No connection to
+the Dashboard is needed.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -s START, --start START
+                        Replay events received at or after this time, for
+                        example 2020-06-01T09:00. Times without a UTC offset
+                        are local. Default is the start of the journal.
+  -e END, --end END     Replay events received at or before this time.
+                        Default is the end of the journal.
+  -t {action,config_change,event,state_change}, --type {action,config_change,event,state_change}
+                        Event type to replay. May be used multiple times.
+                        Default is all.
+  -j, --json            Output each event as a line of JSON.
+  journal               The journal directory.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+
+import cbdevents
+import cbdformat
+import cbdjournal
+
+def timestamp(value):
+  """Convert an ISO 8601 date and time to seconds since the epoch."""
+  try:
+    return datetime.datetime.fromisoformat(value).timestamp()
+  except ValueError:
+    raise argparse.ArgumentTypeError('invalid time {}'.format(value))
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Replay events recorded in a '
+                                   'journal.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-s','--start',type=timestamp,default=None,
+                      help='Replay events received at or after this time, for'
+                      ' example 2020-06-01T09:00.  Times without a UTC offset '
+                      'are local.  Default is the start of the journal.')
+  parser.add_argument('-e','--end',type=timestamp,default=None,
+                      help='Replay events received at or before this time.  '
+                      'Default is the end of the journal.')
+  parser.add_argument('-t','--type',choices=cbdevents.EVENT_TYPES,
+                      default=None,action='append',help='Event type to '
+                      'replay.  May be used multiple times.  Default is all.')
+  parser.add_argument('-j','--json',action='store_true',help='Output each '
+                      'event as a line of JSON.')
+  parser.add_argument('journal',help='The journal directory.')
+  return parser.parse_args()
+
+def main():
+  args = getArgs()
+  if not os.path.isdir(args.journal):
+    print('No journal found in {}'.format(args.journal))
+    sys.exit(1)
+
+  journal = cbdjournal.Journal(args.journal)
+  count = 0
+  for received, event in journal.replay(args.start,args.end,args.type):
+    if args.json:
+      print(json.dumps(event))
+    else:
+      # Use the event content to generate a human readable english string
+      print(datetime.datetime.fromtimestamp(received).isoformat(
+              timespec='seconds'),
+            cbdformat.render(event))
+    count += 1
+  print('Replayed {} event(s).'.format(count),file=sys.stderr)
+
+if __name__== "__main__":
+  main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Run a local stand-in for Cisco Business Dashboard.
+
+Serve a synthetic Dashboard over HTTPS so that the sample scripts can be
+run, measured and tested without a real Dashboard.  The inventory size, the
+latency and errors added to each request, and the rate of events on the
+event stream are set on the command line, and may be changed while the mock
+runs by posting a JSON object such as {"latency": 0.5} to /mock/config.  The
+number of requests served is available from /mock/stats.
+
+Give the --environment option to write an environment file that points the
+sample scripts at the mock, then run them with that file as their
+environment.py.  An existing file is only replaced if it was written by this
+script.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -a ADDRESS, --address ADDRESS
+                        The address to listen on. Defaults to 127.0.0.1.
+  -p PORT, --port PORT  The port to listen on. Defaults to 8443.
+  -n NODES, --nodes NODES
+                        The number of devices in the inventory. Defaults to
+                        200.
+  --networks NETWORKS   The number of networks in the inventory. Defaults to
+                        10.
+  --orgs ORGS           The number of organizations in the inventory.
+                        Defaults to 2.
+  --seed SEED           The seed used to generate the inventory and events.
+                        Defaults to 0.
+  -l LATENCY, --latency LATENCY
+                        The number of seconds added to every API request.
+                        Defaults to 0.
+  -j JITTER, --jitter JITTER
+                        Add a random number of seconds up to this value to
+                        the latency of each request. Defaults to 0.
+  --error-rate ERROR_RATE
+                        The fraction of API requests that fail. Defaults to
+                        0.
+  --error-status ERROR_STATUS
+                        The HTTP status of the failed requests. Defaults to
+                        503.
+  -r EVENT_RATE, --event-rate EVENT_RATE
+                        The number of events per second sent to each event
+                        stream. Defaults to 1.
+  --heartbeat HEARTBEAT
+                        The number of seconds between heartbeats on the
+                        event stream. Defaults to 10.
+  --job-time JOB_TIME   The number of seconds each job runs for. Defaults to
+                        5.
+  --keyid KEYID         The access key ID accepted. Defaults to mock-key.
+  --secret SECRET       The access key secret accepted. Defaults to
+                        mock-secret.
+  --cert CERT           The certificate to serve in PEM format. A self-signed
+                        certificate is created if not given.
+  --key KEY             The private key of the certificate.
+  -e ENVIRONMENT, --environment ENVIRONMENT
+                        Write an environment file for the mock to this path.
+  -v, --verbose         Log every request.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+import cbdmock
+
+# The first line of each environment file written by this script
+MARKER = '# Written by 20_mock_dashboard.py'
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Run a local stand-in for '
+                                   'Cisco Business Dashboard.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-a','--address',default='127.0.0.1',help='The address '
+                      'to listen on.  Defaults to 127.0.0.1.')
+  parser.add_argument('-p','--port',type=int,default=8443,help='The port to '
+                      'listen on.  Defaults to 8443.')
+  parser.add_argument('-n','--nodes',type=int,default=200,help='The number of '
+                      'devices in the inventory.  Defaults to 200.')
+  parser.add_argument('--networks',type=int,default=10,help='The number of '
+                      'networks in the inventory.  Defaults to 10.')
+  parser.add_argument('--orgs',type=int,default=2,help='The number of '
+                      'organizations in the inventory.  Defaults to 2.')
+  parser.add_argument('--seed',type=int,default=0,help='The seed used to '
+                      'generate the inventory and events.  Defaults to 0.')
+  parser.add_argument('-l','--latency',type=float,default=0,help='The number '
+                      'of seconds added to every API request.  Defaults to 0.')
+  parser.add_argument('-j','--jitter',type=float,default=0,help='Add a random '
+                      'number of seconds up to this value to the latency of '
+                      'each request.  Defaults to 0.')
+  parser.add_argument('--error-rate',type=float,default=0,help='The fraction '
+                      'of API requests that fail.  Defaults to 0.')
+  parser.add_argument('--error-status',type=int,default=503,help='The HTTP '
+                      'status of the failed requests.  Defaults to 503.')
+  parser.add_argument('-r','--event-rate',type=float,default=1,help='The '
+                      'number of events per second sent to each event stream.'
+                      '  Defaults to 1.')
+  parser.add_argument('--heartbeat',type=float,default=10,help='The number of '
+                      'seconds between heartbeats on the event stream.  '
+                      'Defaults to 10.')
+  parser.add_argument('--job-time',type=float,default=5,help='The number of '
+                      'seconds each job runs for.  Defaults to 5.')
+  parser.add_argument('--keyid',default=cbdmock.DEFAULT_KEYID,help='The access '
+                      'key ID accepted.  Defaults to mock-key.')
+  parser.add_argument('--secret',default=cbdmock.DEFAULT_SECRET,help='The '
+                      'access key secret accepted.  Defaults to mock-secret.')
+  parser.add_argument('--cert',default=None,help='The certificate to serve in '
+                      'PEM format.  A self-signed certificate is created if '
+                      'not given.')
+  parser.add_argument('--key',default=None,help='The private key of the '
+                      'certificate.')
+  parser.add_argument('-e','--environment',default=None,help='Write an '
+                      'environment file for the mock to this path.')
+  parser.add_argument('-v','--verbose',action='store_true',help='Log every '
+                      'request.')
+  return parser.parse_args()
+
+def writeEnvironment(path,env):
+  """
+  Write an environment file describing the mock, refusing to replace a file
+  not written by this script.
+  """
+  if os.path.exists(path):
+    with open(path) as file:
+      if file.readline().strip() != MARKER:
+        print('Not replacing {}, which was not written by this script.'
+              .format(path))
+        sys.exit(1)
+  with open(path,'w') as file:
+    file.write('{}\n'.format(MARKER))
+    for name in ('dashboard','port','verify_cbd_cert','keyid','secret',
+                 'appname','clientid'):
+      file.write('{} = {!r}\n'.format(name,getattr(env,name)))
+
+def main():
+  args = getArgs()
+  if (args.cert is None) != (args.key is None):
+    print('A certificate and its key must be given together.')
+    sys.exit(1)
+
+  try:
+    mock = cbdmock.MockDashboard(host=args.address,port=args.port,
+                                 keys={args.keyid:args.secret},
+                                 latency=args.latency,jitter=args.jitter,
+                                 errorrate=args.error_rate,
+                                 errorstatus=args.error_status,
+                                 eventrate=args.event_rate,
+                                 heartbeat=args.heartbeat,
+                                 jobtime=args.job_time,certfile=args.cert,
+                                 keyfile=args.key,verbose=args.verbose,
+                                 orgs=args.orgs,networks=args.networks,
+                                 nodes=args.nodes,seed=args.seed)
+  except (OSError,RuntimeError,subprocess.CalledProcessError) as e:
+    print('Unable to start the mock Dashboard: {}'.format(e))
+    sys.exit(1)
+
+  try:
+    if args.environment is not None:
+      writeEnvironment(args.environment,mock.environment())
+      print('Wrote the environment for the mock to {}'.format(
+            args.environment))
+
+    print('Serving a mock Dashboard with {} device(s) on {}'.format(
+          len(mock.inventory.nodes),mock.url))
+    mock.run()
+  except KeyboardInterrupt:
+    print("Exiting.  Goodbye!")
+  finally:
+    mock.close()
+    print('Served {} request(s).'.format(mock.stats().get('requests',0)))
+
+if __name__== "__main__":
+  main()
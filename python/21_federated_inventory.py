@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""List the inventory of many Cisco Business Dashboards at once.
+
+Query every Dashboard in an inventory file for its organizations, networks
+or devices concurrently, and output the records from all of them as a single
+list, with the name of the Dashboard each record came from in its source
+field.  Records are written out as they arrive from each Dashboard.  A
+Dashboard that fails or does not finish within the deadline is reported at
+the end without holding up the others, and the script then exits with an
+error.
+
+The Dashboards are listed in a JSON file, with the same settings for each
+as environment.py.  See dashboards.template.json for an example.  Copies of
+environment.py may also be given with the --environment option.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  --version             show program's version number and exit
+  -i INVENTORY, --inventory INVENTORY
+                        A JSON file listing the Dashboards to query.
+  -e ENVIRONMENT, --environment ENVIRONMENT
+                        A copy of environment.py describing a Dashboard to
+                        query. May be specified multiple times.
+  -k {orgs,networks,nodes}, --kind {orgs,networks,nodes}
+                        The kind of record to list. Defaults to nodes.
+  -s SEARCH, --search SEARCH
+                        List only networks or devices that contain the search
+                        string.
+  -t TYPE, --type TYPE  List only devices of the specified type(s). Defaults
+                        to Device. May be specified multiple times.
+  --field FIELD         A field to return, for example /system-state/hostname.
+                        May be specified multiple times. Defaults to every
+                        field.
+  -w WORKERS, --workers WORKERS
+                        The number of pages of results to request
+                        concurrently from each Dashboard. Defaults to 1.
+  -d DEADLINE, --deadline DEADLINE
+                        The maximum number of seconds to wait for the
+                        Dashboards. Unlimited by default.
+  -f {json,jsonl,csv}, --format {json,jsonl,csv}
+                        The output format. Defaults to json.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import sys
+import argparse
+
+import cbdfederation
+import cbdjson
+import cbdquery
+
+QUERIES = {'orgs':cbdquery.OrgQuery,'networks':cbdquery.NetworkQuery,
+           'nodes':cbdquery.NodeQuery}
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='List the organizations, '
+                                   'networks or devices of many Dashboards at '
+                                   'once.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('-i','--inventory',default=None,help='A JSON file '
+                      'listing the Dashboards to query.')
+  parser.add_argument('-e','--environment',default=[],action='append',
+                      help='A copy of environment.py describing a Dashboard '
+                      'to query.  May be specified multiple times.')
+  parser.add_argument('-k','--kind',choices=list(QUERIES),default='nodes',
+                      help='The kind of record to list.  Defaults to nodes.')
+  parser.add_argument('-s','--search',default=None,help='List only networks '
+                      'or devices that contain the search string.')
+  parser.add_argument('-t','--type',action='append',
+                      choices=cbdquery.NODE_TYPES,help='List only devices of '
+                      'the specified type(s).  Defaults to Device.  May be '
+                      'specified multiple times.')
+  parser.add_argument('--field',default=[],action='append',help='A field to '
+                      'return, for example /system-state/hostname.  May be '
+                      'specified multiple times.  Defaults to every field.')
+  parser.add_argument('-w','--workers',type=int,default=1,help='The number of '
+                      'pages of results to request concurrently from each '
+                      'Dashboard.  Defaults to 1.')
+  parser.add_argument('-d','--deadline',type=float,default=None,help='The '
+                      'maximum number of seconds to wait for the Dashboards.  '
+                      'Unlimited by default.')
+  parser.add_argument('-f','--format',choices=cbdjson.FORMATS,default='json',
+                      help='The output format.  Defaults to json.')
+  args = parser.parse_args()
+  if not (args.inventory or args.environment):
+    parser.error('An inventory or at least one environment must be given.')
+  return args
+
+def buildQuery(args):
+  """Return the query selected on the command line."""
+  query = QUERIES[args.kind]()
+  if args.field:
+    query = query.fields(*args.field)
+  if args.search:
+    query = query.search(args.search)
+  if args.kind == 'nodes':
+    query = query.types(*(args.type or ['Device']))
+  return query
+
+def main():
+  args = getArgs()
+
+  try:
+    dashboards = []
+    if args.inventory:
+      dashboards.extend(cbdfederation.loadInventory(args.inventory))
+    for path in args.environment:
+      dashboards.append(cbdfederation.loadEnvironment(path))
+    federation = cbdfederation.Federation(dashboards,poolsize=args.workers)
+    query = buildQuery(args)
+  except (OSError,ValueError) as e:
+    print(e)
+    sys.exit(1)
+
+  # Each record is output as it arrives, from whichever Dashboard sent it
+  writer = cbdjson.makeWriter(args.format,sys.stdout)
+  for record in federation.iterate(query,args.workers,args.deadline):
+    writer.write(record)
+  writer.close()
+
+  # Report how each Dashboard fared, away from the records on stdout
+  for outcome in federation.outcomes.values():
+    print(outcome,file=sys.stderr)
+  if not all(outcome.ok for outcome in federation.outcomes.values()):
+    sys.exit(1)
+
+if __name__== "__main__":
+  main()
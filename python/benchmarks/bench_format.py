@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Benchmark the rendering of event messages.
+
+Render the english-string of a set of synthetic Cisco Business Dashboard
+events with str.format, as the event stream samples previously did, and
+with the parsed templates cached by cbdformat.  The events use a small
+number of templates, as the events from a Dashboard do.  The throughput of
+each method is reported in events per second.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  -e EVENTS, --events EVENTS
+                        The number of events to render. Defaults to 200000.
+  -t TEMPLATES, --templates TEMPLATES
+                        The number of different templates. Defaults to 50.
+  -r REPEAT, --repeat REPEAT
+                        The number of times to repeat each measurement. The
+                        best result is reported. Defaults to 3.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# The modules being measured live in the parent directory
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..'))
+import cbdformat
+
+def makeEvents(count,templates):
+  strings = ['Template %d: port {port} on device {device} in network '
+             '{network} changed state to {state}' % i
+             for i in range(templates)]
+  return [{'type':'event',
+           'english-string':random.choice(strings),
+           'parameters':{'port':random.randrange(48),
+                         'device':'switch%d' % random.randrange(500),
+                         'network':'Branch %d' % random.randrange(20),
+                         'state':random.choice(['up','down'])}}
+          for i in range(count)]
+
+def runFormat(events):
+  for event in events:
+    event['english-string'].format(**event['parameters'])
+
+def runCache(events):
+  render = cbdformat.TemplateCache().render
+  for event in events:
+    render(event)
+
+def measure(name,func,events,repeat):
+  best = None
+  for i in range(repeat):
+    started = time.perf_counter()
+    func(events)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best,elapsed)
+  print('{:10} {:8d} events  {:8.3f}s  {:10.0f} events/s'.format(
+        name,len(events),best,len(events) / best))
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the rendering of '
+                                   'event messages.')
+  parser.add_argument('-e','--events',type=int,default=200000,help='The '
+                      'number of events to render.  Defaults to 200000.')
+  parser.add_argument('-t','--templates',type=int,default=50,help='The number'
+                      ' of different templates.  Defaults to 50.')
+  parser.add_argument('-r','--repeat',type=int,default=3,help='The number of '
+                      'times to repeat each measurement.  The best result is '
+                      'reported.  Defaults to 3.')
+  args = parser.parse_args()
+
+  random.seed(0)
+  events = makeEvents(args.events,args.templates)
+  measure('format',runFormat,events,args.repeat)
+  measure('cbdformat',runCache,events,args.repeat)
+
+if __name__== "__main__":
+  main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Benchmark the event routing engine.
+
+Route a set of synthetic Cisco Business Dashboard events through a cbdrouter
+Router holding thousands of generated rules, spread across the event types.
+Each rule tests a device name, severity and parameter value, as a rules file
+written by hand would.  The throughput is reported in events per second, both
+with the rules indexed by event type and device name and with every rule
+tested against every event.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  -e EVENTS, --events EVENTS
+                        The number of events to route. Defaults to 5000.
+  -n RULES, --rules RULES
+                        The number of rules. Defaults to 5000.
+  -r REPEAT, --repeat REPEAT
+                        The number of times to repeat each measurement. The
+                        best result is reported. Defaults to 3.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# The modules being measured live in the parent directory
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..'))
+import cbdevents
+import cbdrouter
+
+SEVERITIES = ['critical','major','minor','warning','info']
+
+def makeRules(count):
+  """
+  Return count rule definitions spread across the event types, with one in a
+  hundred applying to every type.
+  """
+  rules = []
+  for i in range(count):
+    rule = {
+      'name':'rule {}'.format(i),
+      'match':{
+        'parameters.device':'switch{}'.format(i % 500),
+        'severity':{'in':random.sample(SEVERITIES,2)},
+        'parameters.port':{'ge':i % 48},
+      },
+      'sinks':['count'],
+    }
+    if i % 100:
+      rule['types'] = [cbdevents.EVENT_TYPES[i % len(cbdevents.EVENT_TYPES)]]
+    rules.append(rule)
+  return rules
+
+def makeEvents(count):
+  return [{'type':random.choice(cbdevents.EVENT_TYPES),
+           'severity':random.choice(SEVERITIES),
+           'english-string':'Port {port} on {device} changed state',
+           'parameters':{'device':'switch{}'.format(random.randrange(500)),
+                         'port':random.randrange(48)}}
+          for i in range(count)]
+
+def measure(name,router,events,repeat):
+  best = None
+  for i in range(repeat):
+    matched = 0
+    started = time.perf_counter()
+    for event in events:
+      if router.route(event):
+        matched += 1
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best,elapsed)
+  print('{:10} {:8d} events  {:8d} matched  {:8.3f}s  {:10.0f} events/s'.format(
+        name,len(events),matched,best,len(events) / best))
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the event routing '
+                                   'engine.')
+  parser.add_argument('-e','--events',type=int,default=5000,help='The number '
+                      'of events to route.  Defaults to 5000.')
+  parser.add_argument('-n','--rules',type=int,default=5000,help='The number '
+                      'of rules.  Defaults to 5000.')
+  parser.add_argument('-r','--repeat',type=int,default=3,help='The number of '
+                      'times to repeat each measurement.  The best result is '
+                      'reported.  Defaults to 3.')
+  args = parser.parse_args()
+
+  random.seed(0)
+  rules = makeRules(args.rules)
+  events = makeEvents(args.events)
+  sinks = {'count':lambda event: None}
+
+  started = time.perf_counter()
+  router = cbdrouter.Router(rules,sinks)
+  print('Compiled {} rules in {:.3f}s'.format(len(rules),
+                                              time.perf_counter() - started))
+  measure('indexed',router,events,args.repeat)
+  measure('unindexed',cbdrouter.Router(rules,sinks,indexed=False),events,
+          args.repeat)
+
+if __name__== "__main__":
+  main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Benchmark the event stream parser.
+
+Parse a synthetic Cisco Business Dashboard event stream with the cbdsse
+parser and, if it is installed, with the sseclient library previously used by
+the event stream samples.  The stream is delivered in fixed size chunks as it
+would be by the network, and the throughput of each parser is reported in
+events and megabytes per second.  Before measuring, the stream is checked
+to parse to the same events with LF, CRLF and CR line endings, however it is
+split into chunks.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  -e EVENTS, --events EVENTS
+                        The number of events in the stream. Defaults to 20000.
+  -s SIZE, --size SIZE  The approximate size in bytes of each event payload.
+                        Defaults to 500.
+  -c CHUNK, --chunk CHUNK
+                        The size in bytes of the chunks delivered to the
+                        parser. Defaults to 16384.
+  -r REPEAT, --repeat REPEAT
+                        The number of times to repeat each measurement. The
+                        best result is reported. Defaults to 3.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+
+# The modules being measured live in the parent directory
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..'))
+import cbdsse
+
+def makeStream(count,size):
+  """
+  Return a synthetic event stream of count events, each with a payload of
+  roughly size bytes, interleaved with heartbeats.
+  """
+  events = []
+  for i in range(count):
+    if i % 50 == 0:
+      events.append(b'data: {"type":"/heart_beat"}\n\n')
+    payload = {
+      'type':'event',
+      'english-string':'Device {device} changed state to {state}',
+      'parameters':{'device':'switch%d' % i,'state':'up'},
+      'padding':'x' * max(size - 120,0),
+    }
+    events.append(b'id: %d\ndata: %s\n\n' % (i,json.dumps(payload).encode()))
+  return b''.join(events)
+
+def chunks(stream,size):
+  for i in range(0,len(stream),size):
+    yield stream[i:i+size]
+
+def runCbdsse(stream,chunksize):
+  count = 0
+  for id, event, data in cbdsse.parse(chunks(stream,chunksize)):
+    count += 1
+  return count
+
+def runSseclient(stream,chunksize):
+  import sseclient
+
+  # Feed the stream to sseclient through a stand-in for a requests session
+  class Response:
+    encoding = 'utf-8'
+    def __init__(self):
+      self.raw = io.BufferedReader(io.BytesIO(stream))
+    def raise_for_status(self):
+      pass
+
+  class Session:
+    def get(self,url,**kwargs):
+      return Response()
+
+  client = sseclient.SSEClient('http://benchmark',session=Session(),
+                               chunk_size=chunksize)
+  count = 0
+  remaining = stream.count(b'\n\n')
+  for ev in client:
+    count += 1
+    if count == remaining:
+      break
+  return count
+
+def checkEndings(stream):
+  """
+  Check that the stream parses to the same events with each of the line
+  endings allowed by the SSE specification, wherever the chunks are split.
+  Returns True if it does.
+  """
+  expected = list(cbdsse.parse([stream]))
+  for ending in (b'\r\n',b'\r'):
+    converted = stream.replace(b'\n',ending)
+    for chunksize in range(1,64):
+      if list(cbdsse.parse(chunks(converted,chunksize))) != expected:
+        print('Events differ with {!r} line endings in {} byte chunks'.format(
+              ending,chunksize))
+        return False
+  return True
+
+def measure(name,func,stream,chunksize,repeat):
+  best = None
+  for i in range(repeat):
+    started = time.perf_counter()
+    count = func(stream,chunksize)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best,elapsed)
+  print('{:10} {:8d} events  {:8.3f}s  {:10.0f} events/s  {:8.1f} MB/s'.format(
+        name,count,best,count / best,len(stream) / best / 1e6))
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the event stream '
+                                   'parser.')
+  parser.add_argument('-e','--events',type=int,default=20000,help='The number '
+                      'of events in the stream.  Defaults to 20000.')
+  parser.add_argument('-s','--size',type=int,default=500,help='The approximate'
+                      ' size in bytes of each event payload.  Defaults to 500.')
+  parser.add_argument('-c','--chunk',type=int,default=16384,help='The size in '
+                      'bytes of the chunks delivered to the parser.  Defaults '
+                      'to 16384.')
+  parser.add_argument('-r','--repeat',type=int,default=3,help='The number of '
+                      'times to repeat each measurement.  The best result is '
+                      'reported.  Defaults to 3.')
+  args = parser.parse_args()
+
+  stream = makeStream(args.events,args.size)
+  if not checkEndings(makeStream(60,50)):
+    sys.exit(1)
+  print('Stream of {} bytes in {} byte chunks'.format(len(stream),args.chunk))
+  measure('cbdsse',runCbdsse,stream,args.chunk,args.repeat)
+  if importlib.util.find_spec('sseclient') is None:
+    print('sseclient is not installed.  Skipping comparison.')
+  else:
+    measure('sseclient',runSseclient,stream,args.chunk,args.repeat)
+
+if __name__== "__main__":
+  main()
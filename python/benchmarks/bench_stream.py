@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Benchmark the decoding and output of a large list response.
+
+Decode a synthetic Cisco Business Dashboard device list and write it out as
+indented JSON, first by decoding the whole response with json.loads and
+formatting it with json.dumps, as the sample scripts previously did, and
+then by decoding and writing one record at a time with cbdjson, as the
+response would arrive from the network.  Both methods produce the same
+output.  The throughput of each method is reported in records per second,
+together with the peak memory used.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  -n RECORDS, --records RECORDS
+                        The number of records in the response. Defaults to
+                        50000.
+  -c CHUNKSIZE, --chunksize CHUNKSIZE
+                        The size of the chunks the response arrives in.
+                        Defaults to 65536.
+  -r REPEAT, --repeat REPEAT
+                        The number of times to repeat each measurement. The
+                        best result is reported. Defaults to 3.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+# The modules being measured live in the parent directory
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..'))
+import cbdjson
+
+class Sink:
+  """A file that discards what is written, counting the characters."""
+  def __init__(self):
+    self.size = 0
+
+  def write(self,text):
+    self.size += len(text)
+
+def makePayload(count):
+  records = [{'id':'%08x-0000-4000-8000-%012x' % (i,i),
+              'network':{'id':'net%d' % (i % 20),'name':'Branch %d' % (i % 20)},
+              'organization':{'id':'org1','name':'Default'},
+              'system-state':{'hostname':'switch%d' % i,
+                              'type':random.choice(['Switch','Router','WAP']),
+                              'ip':'10.%d.%d.%d' % (i >> 16,(i >> 8) & 255,
+                                                    i & 255),
+                              'sn':'PSZ%08d' % i,
+                              'reachability':random.choice(['Reachable',
+                                                            'Unreachable'])}}
+             for i in range(count)]
+  return json.dumps({'data':records,
+                     'paging':{'offset':0,'limit':count,
+                               'total':count}}).encode()
+
+def chunks(payload,chunksize):
+  for start in range(0,len(payload),chunksize):
+    yield payload[start:start + chunksize]
+
+def runLoads(payload,chunksize,sink):
+  # Gather the whole response, as response.json() does, then format it
+  response = json.loads(b''.join(chunks(payload,chunksize)))
+  sink.write(json.dumps({'data':response['data']},indent=2) + '\n')
+
+def runStream(payload,chunksize,sink):
+  writer = cbdjson.JsonWriter(sink)
+  for record in cbdjson.iterData(chunks(payload,chunksize)):
+    writer.write(record)
+  writer.close()
+
+def measure(name,func,payload,count,chunksize,repeat):
+  best = None
+  for i in range(repeat):
+    sink = Sink()
+    started = time.perf_counter()
+    func(payload,chunksize,sink)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best,elapsed)
+
+  # Measure the memory separately, as tracing slows the run
+  tracemalloc.start()
+  func(payload,chunksize,Sink())
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  print('{:10} {:8d} records  {:8.3f}s  {:10.0f} records/s  {:8.1f} MB peak'
+        .format(name,count,best,count / best,peak / 1048576))
+  return sink.size
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the decoding and '
+                                   'output of a large list response.')
+  parser.add_argument('-n','--records',type=int,default=50000,help='The number'
+                      ' of records in the response.  Defaults to 50000.')
+  parser.add_argument('-c','--chunksize',type=int,default=65536,help='The '
+                      'size of the chunks the response arrives in.  Defaults '
+                      'to 65536.')
+  parser.add_argument('-r','--repeat',type=int,default=3,help='The number of '
+                      'times to repeat each measurement.  The best result is '
+                      'reported.  Defaults to 3.')
+  args = parser.parse_args()
+
+  random.seed(0)
+  payload = makePayload(args.records)
+  print('Response of {:.1f} MB'.format(len(payload) / 1048576))
+  sizes = [measure('json.loads',runLoads,payload,args.records,args.chunksize,
+                   args.repeat),
+           measure('cbdjson',runStream,payload,args.records,args.chunksize,
+                   args.repeat)]
+  if sizes[0] != sizes[1]:
+    print('The outputs differ in size: {} and {}'.format(*sizes))
+
+if __name__== "__main__":
+  main()
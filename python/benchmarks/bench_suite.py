@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Benchmark the sample flows end to end against a local mock Dashboard.
+
+Measure, against cbdmock.MockDashboard running in the same process:
+
+  auth   - JWTs signed per second by cbdauth.getToken, and tokens served
+           per second from the cache of a TokenProvider
+  list   - records per second listed from orgs, networks and nodes of each
+           size, walked page by page, with concurrent pages, and with
+           streamed decoding
+  bulk   - requests per second submitted through cbdbulk.submitAll for
+           backup-config, reboot and PnP device creation
+  events - events per second received from the event stream at a set rate,
+           and percentiles of the time taken to parse and format each event
+           after its chunk arrives
+
+Each result is printed, and may be written as JSON with --output.  Give a
+previous results file with --compare to show the change in each result; the
+exit status is 1 if any result is worse by more than the threshold, so the
+suite can be used to compare commits.
+
+Command line arguments:
+  -h, --help            show this help message and exit
+  -g {auth,list,bulk,events}, --group {auth,list,bulk,events}
+                        A group of benchmarks to run. May be used multiple
+                        times. Defaults to all.
+  -s SIZES, --sizes SIZES
+                        The comma separated list sizes to measure. Defaults
+                        to 100,1000,10000.
+  -w WORKERS, --workers WORKERS
+                        The number of concurrent requests for the parallel
+                        and bulk benchmarks. Defaults to 4.
+  -b BULK, --bulk BULK  The number of requests submitted by each bulk
+                        benchmark. Defaults to 200.
+  -t TOKENS, --tokens TOKENS
+                        The number of tokens signed by the auth benchmark.
+                        Defaults to 5000.
+  -e EVENT_RATE, --event-rate EVENT_RATE
+                        The rate of events sent by the mock. Defaults to
+                        5000.
+  -d DURATION, --duration DURATION
+                        The number of seconds to receive events for.
+                        Defaults to 5.
+  -l LATENCY, --latency LATENCY
+                        The number of seconds of latency added by the mock to
+                        each request. Defaults to 0.
+  -r REPEAT, --repeat REPEAT
+                        The number of times to repeat each measurement. The
+                        best result is reported. Defaults to 3.
+  -o OUTPUT, --output OUTPUT
+                        Write the results as JSON to this file.
+  -c COMPARE, --compare COMPARE
+                        Compare the results with those in this file.
+  --threshold THRESHOLD
+                        The percentage by which a result may be worse than
+                        the compared result. Defaults to 10.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# The modules being measured live in the parent directory
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..'))
+import cbdauth
+import cbdbulk
+import cbdclient
+import cbdformat
+import cbdmock
+import cbdsse
+
+GROUPS = ['auth','list','bulk','events']
+
+# The list paths measured, and the inventory argument giving their size
+LISTS = [('orgs','/api/v2/orgs'),('networks','/api/v2/networks'),
+         ('nodes','/api/v2/nodes')]
+
+PAGESIZE = 100
+
+class Results:
+  """The results of a run, printed as they are added."""
+  def __init__(self):
+    self.results = []
+
+  def add(self,name,value,unit,higher=True):
+    # higher is True when larger values are better
+    self.results.append({'name':name,'value':value,'unit':unit,
+                         'higher':higher})
+    print('{:40} {:12.1f} {}'.format(name,value,unit))
+
+def best(func,repeat):
+  """
+  Run func repeat times and return the shortest time taken and the value
+  returned by func.
+  """
+  shortest = None
+  for i in range(repeat):
+    started = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - started
+    shortest = elapsed if shortest is None else min(shortest,elapsed)
+  return shortest, value
+
+def percentile(values,fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction),len(values) - 1)]
+
+def benchAuth(results,args):
+  elapsed, count = best(lambda: [cbdauth.getToken(cbdmock.DEFAULT_KEYID,
+                                                  cbdmock.DEFAULT_SECRET)
+                                 for i in range(args.tokens)],args.repeat)
+  results.add('auth/getToken',args.tokens / elapsed,'tokens/s')
+
+  provider = cbdauth.TokenProvider(cbdmock.DEFAULT_KEYID,
+                                   cbdmock.DEFAULT_SECRET,autorenew=False)
+  calls = args.tokens * 100
+  elapsed, count = best(lambda: [provider.getToken() for i in range(calls)],
+                        args.repeat)
+  results.add('auth/TokenProvider',calls / elapsed,'tokens/s')
+
+def benchList(results,args,certificate):
+  for size in args.sizes:
+    mock = cbdmock.MockDashboard(port=0,orgs=size,networks=size,nodes=size,
+                                 latency=args.latency,certfile=certificate[0],
+                                 keyfile=certificate[1])
+    with mock, cbdclient.Client.fromEnvironment(mock.environment(),
+                                                poolsize=args.workers) as client:
+      methods = [
+        ('iterate',lambda path: client.iterate(path,pagesize=PAGESIZE)),
+        ('parallel',lambda path: client.iterateParallel(path,
+                                                        pagesize=PAGESIZE,
+                                                        workers=args.workers)),
+        ('stream',lambda path: client.iterateStream(path,pagesize=PAGESIZE)),
+      ]
+      for kind, path in LISTS:
+        for method, walk in methods:
+          elapsed, count = best(lambda: sum(1 for record in walk(path)),
+                                args.repeat)
+          if count != size:
+            print('{} returned {} of {} records'.format(path,count,size))
+          results.add('list/{}/{}/{}'.format(kind,size,method),
+                      count / elapsed,'records/s')
+
+def benchBulk(results,args,certificate):
+  mock = cbdmock.MockDashboard(port=0,nodes=args.bulk,latency=args.latency,
+                               certfile=certificate[0],keyfile=certificate[1])
+  with mock, cbdclient.Client.fromEnvironment(mock.environment(),
+                                              poolsize=args.workers) as client:
+    nodeids = [node['id'] for node in mock.inventory.nodes]
+    serials = iter(range(10**9))
+    operations = [
+      ('backup-config','/api/v2/nodes/operations/backup-config',
+       lambda: [{'node-ids':[id]} for id in nodeids]),
+      ('reboot','/api/v2/nodes/operations/reboot',
+       lambda: [{'node-ids':[id]} for id in nodeids]),
+      ('pnp-devices','/api/v2/pnp/devices',
+       lambda: [{'device-name':'bench','node-type':'Switch',
+                 'pid':'SG350-10','sn':'BENCH%09d' % next(serials),
+                 'network-id':mock.inventory.networks[0]['id']}
+                for id in nodeids]),
+    ]
+    for name, path, payloads in operations:
+      def submit():
+        outcomes = cbdbulk.submitAll(client,path,payloads(),
+                                     workers=args.workers)
+        failed = [error for payload, result, error in outcomes if error]
+        if failed:
+          print('{} of {} {} requests failed: {}'.format(len(failed),
+                len(outcomes),name,failed[0]))
+        return len(outcomes)
+      elapsed, count = best(submit,args.repeat)
+      results.add('bulk/{}'.format(name),count / elapsed,'requests/s')
+
+def receive(client,duration):
+  """
+  Receive events for duration seconds, parsing and formatting each one, and
+  return the number of events and the latency of each in seconds.
+  """
+  latencies = []
+  parser = cbdsse.SSEParser()
+  response = client.request('GET','/api/v2/event-source',
+                            headers={'Accept':'text/event-stream'},
+                            stream=True)
+  try:
+    deadline = time.perf_counter() + duration
+    for chunk in response.iter_content(chunk_size=None):
+      arrived = time.perf_counter()
+      for id, event, data in parser.feed(chunk):
+        cbdformat.render(json.loads(data))
+        latencies.append(time.perf_counter() - arrived)
+      if arrived >= deadline:
+        break
+  finally:
+    response.close()
+  return latencies
+
+def benchEvents(results,args,certificate):
+  mock = cbdmock.MockDashboard(port=0,eventrate=args.event_rate,
+                               certfile=certificate[0],keyfile=certificate[1])
+  with mock, cbdclient.Client.fromEnvironment(mock.environment()) as client:
+    started = time.perf_counter()
+    latencies = receive(client,args.duration)
+    elapsed = time.perf_counter() - started
+    if not latencies:
+      print('No events were received')
+      return
+    results.add('events/rate',len(latencies) / elapsed,'events/s')
+    for fraction in (0.5,0.9,0.99):
+      results.add('events/latency/p{:g}'.format(fraction * 100),
+                  percentile(latencies,fraction) * 1e6,'us',higher=False)
+
+def revision():
+  """Return the git commit of the working tree, or None."""
+  try:
+    return subprocess.run(['git','rev-parse','HEAD'],capture_output=True,
+                          text=True,check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))
+                          ).stdout.strip()
+  except (OSError,subprocess.CalledProcessError):
+    return None
+
+def compare(results,path,threshold):
+  """
+  Print the change in each result from those in a previous results file and
+  return the number that are worse by more than the threshold percentage.
+  """
+  with open(path) as file:
+    previous = {result['name']:result for result in json.load(file)['results']}
+  print('\nCompared with {}:'.format(path))
+  worse = 0
+  for result in results:
+    old = previous.get(result['name'])
+    if old is None or not old['value']:
+      continue
+    change = (result['value'] - old['value']) / old['value'] * 100
+    regressed = (change < -threshold) if result['higher'] else \
+                (change > threshold)
+    worse += regressed
+    print('{:40} {:+8.1f}%{}'.format(result['name'],change,
+                                    '  worse' if regressed else ''))
+  return worse
+
+def sizes(value):
+  try:
+    return [int(size) for size in value.split(',')]
+  except ValueError:
+    raise argparse.ArgumentTypeError('invalid sizes {}'.format(value))
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the sample flows '
+                                   'end to end against a local mock '
+                                   'Dashboard.')
+  parser.add_argument('-g','--group',choices=GROUPS,default=None,
+                      action='append',help='A group of benchmarks to run.  May'
+                      ' be used multiple times.  Defaults to all.')
+  parser.add_argument('-s','--sizes',type=sizes,default=[100,1000,10000],
+                      help='The comma separated list sizes to measure.  '
+                      'Defaults to 100,1000,10000.')
+  parser.add_argument('-w','--workers',type=int,default=4,help='The number of '
+                      'concurrent requests for the parallel and bulk '
+                      'benchmarks.  Defaults to 4.')
+  parser.add_argument('-b','--bulk',type=int,default=200,help='The number of '
+                      'requests submitted by each bulk benchmark.  Defaults to '
+                      '200.')
+  parser.add_argument('-t','--tokens',type=int,default=5000,help='The number '
+                      'of tokens signed by the auth benchmark.  Defaults to '
+                      '5000.')
+  parser.add_argument('-e','--event-rate',type=float,default=5000,help='The '
+                      'rate of events sent by the mock.  Defaults to 5000.')
+  parser.add_argument('-d','--duration',type=float,default=5,help='The number '
+                      'of seconds to receive events for.  Defaults to 5.')
+  parser.add_argument('-l','--latency',type=float,default=0,help='The number '
+                      'of seconds of latency added by the mock to each '
+                      'request.  Defaults to 0.')
+  parser.add_argument('-r','--repeat',type=int,default=3,help='The number of '
+                      'times to repeat each measurement.  The best result is '
+                      'reported.  Defaults to 3.')
+  parser.add_argument('-o','--output',default=None,help='Write the results '
+                      'as JSON to this file.')
+  parser.add_argument('-c','--compare',default=None,help='Compare the results '
+                      'with those in this file.')
+  parser.add_argument('--threshold',type=float,default=10,help='The '
+                      'percentage by which a result may be worse than the '
+                      'compared result.  Defaults to 10.')
+  args = parser.parse_args()
+  groups = args.group or GROUPS
+
+  # One certificate is shared by every mock the suite starts
+  directory = tempfile.mkdtemp(prefix='cbdbench-')
+  results = Results()
+  try:
+    certificate = cbdmock.makeCertificate(directory)
+    if 'auth' in groups:
+      benchAuth(results,args)
+    if 'list' in groups:
+      benchList(results,args,certificate)
+    if 'bulk' in groups:
+      benchBulk(results,args,certificate)
+    if 'events' in groups:
+      benchEvents(results,args,certificate)
+  finally:
+    shutil.rmtree(directory,ignore_errors=True)
+
+  if args.output is not None:
+    with open(args.output,'w') as file:
+      json.dump({'revision':revision(),'time':time.time(),
+                 'python':platform.python_version(),
+                 'platform':platform.platform(),
+                 'arguments':{name:value for name, value in vars(args).items()
+                              if name not in ('output','compare')},
+                 'results':results.results},file,indent=2)
+  if args.compare is not None and compare(results.results,args.compare,
+                                          args.threshold):
+    sys.exit(1)
+
+if __name__== "__main__":
+  main()
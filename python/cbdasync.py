@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Asynchronous client for the Cisco Business Dashboard API
+
+Provides the AsyncClient class, an asyncio-native counterpart to
+cbdclient.Client built on aiohttp.  All requests share a single pool of
+keep-alive connections, and a semaphore bounds the number of requests in
+flight so that many tasks may share one client without overloading the
+Dashboard.  The operations demonstrated by the sample scripts are provided as
+coroutines.
+
+Typical usage:
+
+  import asyncio
+  import cbdasync
+
+  async def main():
+    async with cbdasync.AsyncClient.fromEnvironment() as client:
+      orgs, groups = await asyncio.gather(client.getOrganizations(),
+                                          client.getGroups())
+      async for node in client.iterate('/api/v2/nodes'):
+        print(node['id'])
+
+  asyncio.run(main())
+
+Errors returned by the Dashboard are raised as aiohttp.ClientResponseError.
+
+Requires the aiohttp library (https://docs.aiohttp.org).
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import asyncio
+import json
+import ssl
+
+import aiohttp
+
+import cbdauth
+import cbdclient
+import cbdsse
+
+class AsyncClient:
+  """
+  An asyncio client for version 2 of the Cisco Business Dashboard API.  The
+  client must be used from within a running event loop, and should be closed
+  when no longer required, either by calling close or by using it as an
+  asynchronous context manager.
+
+  Arguments:
+    dashboard   - The hostname or IP address of the Dashboard
+    port        - The TCP port the Dashboard API is available on
+    keyid       - The key ID from the Access Key defined on the Dashboard
+    secret      - The secret value for the Access Key defined on the Dashboard
+    clientid    - (Optional) A unique ID for the instance of the client
+                  application.  A random UUID is used if not specified.
+    appname     - (Optional) A name to identify the application in domain name
+                  format.
+    verify      - (Optional) Verify the certificate of the Dashboard.  Set to
+                  False for self-signed certs.  Defaults to True.
+    poolsize    - (Optional) The maximum number of connections kept open to
+                  the Dashboard.  Defaults to 10.
+    concurrency - (Optional) The maximum number of requests in flight at
+                  once.  Defaults to poolsize.
+    timeout     - (Optional) The total time in seconds allowed for each
+                  request.  Defaults to 60.
+  """
+  def __init__(self,dashboard,port,keyid,secret,clientid=None,
+               appname="cbdscript.example.com",verify=True,poolsize=10,
+               concurrency=None,timeout=60):
+    self.baseurl = 'https://%s:%s' % (dashboard, port)
+    self.verify = verify
+    self.timeout = aiohttp.ClientTimeout(total=timeout)
+    self.poolsize = poolsize
+    self.tokens = cbdauth.getTokenProvider(keyid=keyid,secret=secret,
+                                           clientid=clientid,appname=appname)
+    self.semaphore = asyncio.Semaphore(concurrency or poolsize)
+    self.session = None
+
+  @classmethod
+  def fromEnvironment(cls,env=None,**kwargs):
+    """
+    Create a client using the details contained in the environment.py file.
+
+    Arguments:
+      env    - (Optional) A module or object with the same attributes as
+               environment.py.  The environment module is used if not
+               specified.
+      kwargs - Any other AsyncClient arguments, such as concurrency.
+    """
+    if env is None:
+      import environment as env
+
+    return cls(env.dashboard,env.port,env.keyid,env.secret,
+               clientid=env.clientid,appname=env.appname,
+               verify=env.verify_cbd_cert,**kwargs)
+
+  def _session(self):
+    # The session is created on first use so that it is bound to the
+    # running event loop
+    if self.session is None:
+      if isinstance(self.verify,str):
+        # As with requests, verify may name a CA bundle to trust
+        sslcontext = ssl.create_default_context(cafile=self.verify)
+      else:
+        sslcontext = bool(self.verify)
+      connector = aiohttp.TCPConnector(limit=self.poolsize,
+                                       limit_per_host=self.poolsize,
+                                       ssl=sslcontext)
+      self.session = aiohttp.ClientSession(connector=connector,
+                                           timeout=self.timeout,
+                                           raise_for_status=False)
+    return self.session
+
+  async def _token(self):
+    # Signing a token is quick, but it is done in a thread so that a renewal
+    # never stalls the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+      None,self.tokens.getToken)
+
+  async def request(self,method,path,params=None,json=None,headers=None):
+    """
+    Send a request to the Dashboard and return the parsed JSON payload, or
+    None if the response has no payload.  If the Dashboard rejects the JWT, a
+    new one is generated and the request is retried once.
+
+    Arguments:
+      method  - The HTTP method to use
+      path    - The API path, for example /api/v2/orgs
+      params  - (Optional) A dictionary or list of tuples of query parameters
+      json    - (Optional) An object to send as the JSON request payload
+      headers - (Optional) A dictionary of additional request headers
+    """
+    async with self.semaphore:
+      for attempt in range(2):
+        reqheaders = {'Authorization':"Bearer %s" % await self._token()}
+        if headers:
+          reqheaders.update(headers)
+        async with self._session().request(method,self.baseurl + path,
+                                           params=params,json=json,
+                                           headers=reqheaders) as response:
+          if response.status == 401 and not attempt:
+            # Try once more with a fresh token
+            self.tokens.invalidate()
+            continue
+          response.raise_for_status()
+          if response.status == 204:
+            return None
+          if not await response.read():
+            return None
+          return await response.json(content_type=None)
+
+  async def get(self,path,params=None,headers=None):
+    """Perform a GET request and return the parsed JSON payload."""
+    return await self.request('GET',path,params=params,headers=headers)
+
+  async def post(self,path,json=None,params=None):
+    """Perform a POST request and return the parsed JSON payload."""
+    return await self.request('POST',path,params=params,json=json)
+
+  async def iterate(self,path,params=None,pagesize=cbdclient.DEFAULT_PAGESIZE,
+                    headers=None):
+    """
+    Walk every page of a list query, yielding each record in turn.  The next
+    page is requested while the records of the current page are consumed.
+
+    Arguments:
+      path     - The API path of the list, for example /api/v2/nodes
+      params   - (Optional) A dictionary or list of tuples of query parameters
+      pagesize - (Optional) The number of records to request per page
+      headers  - (Optional) A dictionary of additional request headers
+    """
+    params = cbdclient.paramList(params)
+    offset = 0
+    pending = None
+    page = await self.get(path,params + [('offset',offset),
+                                         ('limit',pagesize)],headers)
+    try:
+      while True:
+        records = page.get('data',[])
+        total = cbdclient.pageTotal(page)
+        offset += len(records)
+        more = len(records) >= pagesize and (total is None or offset < total)
+        if more:
+          pending = asyncio.ensure_future(self.get(path,params +
+                                                   [('offset',offset),
+                                                    ('limit',pagesize)],
+                                                   headers))
+        for record in records:
+          yield record
+        if not more:
+          break
+        page = await pending
+        pending = None
+
+    finally:
+      if pending is not None:
+        pending.cancel()
+
+  async def getAll(self,path,params=None,headers=None):
+    """Return a list of every record from a list query."""
+    return [record async for record in self.iterate(path,params,
+                                                    headers=headers)]
+
+  # The operations demonstrated by the sample scripts
+
+  async def getOrganizations(self):
+    """Return a list of all organizations (01_get_organizations.py)."""
+    return await self.getAll('/api/v2/orgs')
+
+  async def getNetworks(self,orgid=None,params=None):
+    """
+    Return a list of networks, optionally restricted to a single organization
+    (02_get_networks.py, 03_get_networks_by_org.py, 04_get_networks_filtered.py).
+    """
+    headers = {'x-ctx-org-id':orgid} if orgid is not None else None
+    return await self.getAll('/api/v2/networks',params,headers)
+
+  async def addNetwork(self,name,orgid,description=None):
+    """Create a network and return its ID (05_add_network.py)."""
+    network = {'name':name,'org-id':orgid}
+    if description is not None:
+      network['description'] = description
+    return (await self.post('/api/v2/networks',network))['id']
+
+  async def getNodes(self,params=None):
+    """Return a list of devices (06_get_devices_filtered.py)."""
+    return await self.getAll('/api/v2/nodes',params)
+
+  async def backupConfig(self,nodeids=None,networkids=None,comment=None):
+    """Back up device configurations and return the job IDs
+    (07_backup_device.py)."""
+    action = {}
+    if comment is not None:
+      action['comment'] = comment
+    if networkids is not None:
+      action['network-ids'] = networkids
+    if nodeids is not None:
+      action['node-ids'] = nodeids
+    return (await self.post('/api/v2/nodes/operations/backup-config',
+                            action))['job-ids']
+
+  async def reboot(self,nodeids):
+    """Reboot devices and return the job IDs (08_reboot_device.py)."""
+    return (await self.post('/api/v2/nodes/operations/reboot',
+                            {'node-ids':nodeids}))['job-ids']
+
+  async def getXLaunchURL(self,nodeid):
+    """Return the cross-launch URL for a device (09_get_xlaunch_url.py)."""
+    async with self.semaphore:
+      async with self._session().get(self.baseurl + '/controller/xl/%s' %
+                                     nodeid,
+                                     params={'token':await self._token()},
+                                     allow_redirects=False) as response:
+        if response.status != 302:
+          response.raise_for_status()
+          raise aiohttp.ClientResponseError(response.request_info,
+                                            response.history,
+                                            status=response.status,
+                                            message='Expected a redirect')
+        return response.headers['Location']
+
+  async def subscribe(self,networkids):
+    """Subscribe to events from the specified networks
+    (11_get_event_stream_filtered.py)."""
+    await self.post('/api/v2/subscription',{'network-ids':networkids})
+
+  async def events(self,types=None,subscribed=False):
+    """
+    Connect to the event stream and yield each event as a parsed JSON
+    object, including heartbeats (10_get_event_stream.py).  The stream is
+    not counted against the concurrency limit.
+
+    Arguments:
+      types      - (Optional) A list of event types to receive.  Defaults to
+                   all types.
+      subscribed - (Optional) Receive only events from subscribed networks.
+                   Defaults to False.
+    """
+    params = {'types':','.join(types or ['action','config_change','event',
+                                         'state_change']),
+              'monitored-networks':'subscribed' if subscribed else 'all'}
+    headers = {'Authorization':"Bearer %s" % await self._token(),
+               'Accept':'text/event-stream'}
+    async with self._session().get(self.baseurl + '/api/v2/event-source',
+                                   params=params,headers=headers,
+                                   timeout=aiohttp.ClientTimeout(
+                                     total=None,sock_read=None)) as response:
+      response.raise_for_status()
+      parser = cbdsse.SSEParser()
+      async for chunk in response.content.iter_any():
+        for id, event, data in parser.feed(chunk):
+          yield json.loads(data)
+
+  async def getPnpImages(self):
+    """Return a list of PnP image files (12_get_pnp_files.py)."""
+    return await self.getAll('/api/v2/pnp/images')
+
+  async def getPnpConfigs(self):
+    """Return a list of PnP configuration files (12_get_pnp_files.py)."""
+    return await self.getAll('/api/v2/pnp/configs')
+
+  async def getGroups(self):
+    """Return a list of device groups (13_get_device_groups.py)."""
+    return await self.getAll('/api/v2/groups')
+
+  async def addPnpDevice(self,device):
+    """
+    Create a PnP device and return its ID (14_add_pnp_device.py).
+
+    Arguments:
+      device - A dictionary of the device details, with the keys
+               device-name, node-type, pid, sn, group-id, network-id and
+               optionally image-id and config-id
+    """
+    return (await self.post('/api/v2/pnp/devices',device))['id']
+
+  async def close(self):
+    """Close all pooled connections."""
+    if self.session is not None:
+      await self.session.close()
+      self.session = None
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self,*exc):
+    await self.close()
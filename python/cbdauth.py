@@ -5,7 +5,10 @@ When executed standalone, this utility will output a JWT suitable for use
 with the Cisco Business Dashboard API based on data provided through command line
 arguments.
 
-When used as a module, provides the getToken function that returns a JWT.
+When used as a module, provides the getToken function that returns a JWT,
+and the TokenProvider class that caches a JWT and renews it shortly before
+it expires.  Use getTokenProvider to obtain a provider shared by every caller
+using the same access key, client ID and application name.
 
 Command line arguments:
   positional arguments:
@@ -50,6 +53,7 @@ import json
 import uuid
 import time
 import argparse
+import threading
 
 def getToken(keyid,secret,clientid=None,appname="cbdscript.example.com",appver="1.0",lifetime=3600):
   """
@@ -82,7 +86,147 @@ def getToken(keyid,secret,clientid=None,appname="cbdscript.example.com",appver="
     "exp":int(time.time()+lifetime)
   }
 
-  return jwt.encode(claimset,secret,algorithm='HS256',headers={'kid':keyid}).decode('UTF-8')
+  token = jwt.encode(claimset,secret,algorithm='HS256',headers={'kid':keyid})
+
+  # PyJWT 1.x returns bytes, while PyJWT 2.x returns a string
+  if isinstance(token,bytes):
+    token = token.decode('UTF-8')
+  return token
+
+class TokenProvider:
+  """
+  Supply a cached JWT for use with version 2 of the Cisco Business Dashboard
+  API, renewing it before it expires.
+
+  The token is generated on first use and the same value is returned until
+  the refresh margin before its expiry is reached.  If autorenew is set, a
+  background timer renews the token ahead of time so that callers never wait
+  for a new token to be signed.  A single provider may be safely shared by
+  many threads.
+
+  Arguments:
+    keyid     - The key ID from the Access Key defined on the Dashboard
+    secret    - The secret value for the Access Key defined on the Dashboard
+    clientid  - (Optional) A unique ID (UUID recommended) for the instance of
+                the client application.  If not specified, a random UUID is
+                generated once and used for every token from this provider.
+    appname   - (Optional) A name to identify the application in domain name
+                format.  Defaults to 'cbdscript.example.com'.
+    appver    - (Optional) The version of the application.  Defaults to '1.0'.
+    lifetime  - (Optional) The length of time in seconds each JWT should
+                remain valid.  Defaults to 3600 seconds (one hour).
+    margin    - (Optional) Renew the token when fewer than this many seconds
+                of its lifetime remain.  Defaults to 300 seconds.
+    autorenew - (Optional) Renew the token in a background thread before the
+                refresh margin is reached.  Defaults to True.
+  """
+  def __init__(self,keyid,secret,clientid=None,appname="cbdscript.example.com",
+               appver="1.0",lifetime=3600,margin=300,autorenew=True):
+    if margin >= lifetime:
+      raise ValueError("The refresh margin must be shorter than the token "
+                       "lifetime")
+    if clientid == None:
+      clientid = str(uuid.uuid4())
+
+    self.keyid = keyid
+    self.secret = secret
+    self.clientid = clientid
+    self.appname = appname
+    self.appver = appver
+    self.lifetime = lifetime
+    self.margin = margin
+    self.autorenew = autorenew
+
+    self._lock = threading.Lock()
+    self._token = None
+    self._expires = 0
+    self._timer = None
+
+  def getToken(self):
+    """
+    Return a valid JWT, generating a new one if there is no cached token or
+    the cached token is within the refresh margin of its expiry.
+    """
+    with self._lock:
+      if self._token is None or time.time() >= self._expires - self.margin:
+        self._renew()
+      return self._token
+
+  @property
+  def expires(self):
+    """The expiry time of the cached token in seconds since the epoch."""
+    return self._expires
+
+  def invalidate(self):
+    """
+    Discard the cached token so that the next call to getToken generates a
+    new one.  Use this if the Dashboard rejects the token with a 401 error.
+    """
+    with self._lock:
+      self._token = None
+      self._expires = 0
+
+  def close(self):
+    """Stop any pending background renewal."""
+    with self._lock:
+      self.autorenew = False
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+
+  def _renew(self):
+    # Must be called with the lock held
+    now = time.time()
+    self._token = getToken(self.keyid,self.secret,self.clientid,self.appname,
+                           self.appver,self.lifetime)
+    self._expires = int(now + self.lifetime)
+
+    if self.autorenew:
+      # Renew a little before the refresh margin is reached so that
+      # getToken never needs to block on signing a new token
+      if self._timer is not None:
+        self._timer.cancel()
+      delay = max(self._expires - self.margin - now - 1, 0)
+      self._timer = threading.Timer(delay,self._backgroundRenew)
+      self._timer.daemon = True
+      self._timer.start()
+
+  def _backgroundRenew(self):
+    with self._lock:
+      if self.autorenew:
+        self._renew()
+
+# Providers shared between callers, indexed by (keyid, secret, clientid,
+# appname).  The secret is included so that clients of different Dashboards
+# never share a token, even if their key IDs happen to be the same
+_providers = {}
+_providersLock = threading.Lock()
+
+def getTokenProvider(keyid,secret,clientid=None,appname="cbdscript.example.com",
+                     **kwargs):
+  """
+  Return the TokenProvider for the given access key, secret, client ID and
+  application name, creating it if necessary.  Every caller using the same
+  combination shares a single cached token.
+
+  Arguments:
+    keyid    - The key ID from the Access Key defined on the Dashboard
+    secret   - The secret value for the Access Key defined on the Dashboard
+    clientid - (Optional) A unique ID for the instance of the client
+               application.  If not specified, the provider generates a
+               random UUID once.
+    appname  - (Optional) A name to identify the application in domain name
+               format.
+    kwargs   - Any other TokenProvider arguments.  These are only applied
+               when the provider is first created.
+  """
+  with _providersLock:
+    key = (keyid,secret,clientid,appname)
+    provider = _providers.get(key)
+    if provider is None:
+      provider = TokenProvider(keyid,secret,clientid,appname,**kwargs)
+      _providers[key] = provider
+    return provider
 
 def getArgs():
   # Use argparse to collect user input
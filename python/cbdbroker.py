@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Local fan-out of the Cisco Business Dashboard event stream
+
+Provides the Broker class, which holds a single connection to the Dashboard
+event stream and re-publishes each event to any number of local subscribers
+over HTTP, using the same Server-Sent Events format as the Dashboard.  Each
+subscriber may ask for particular event types and give a match filter in the
+format used by cbdrouter, and has its own bounded buffer.  A subscriber that
+falls behind loses its oldest buffered events rather than holding up the
+broker or the other subscribers.
+
+Subscribers connect to /events, optionally with these query parameters:
+
+  types - A comma separated list of the event types to receive
+  match - A JSON object of field tests, as used in cbdrouter rules files
+
+Each event is given a sequence number by the broker and sent as the SSE
+event ID, so a subscriber that reconnects with the Last-Event-ID header
+receives any matching events it missed that are still in the broker's
+history.  Heartbeats from the Dashboard are passed to every subscriber.  The
+current subscribers and their buffer statistics are available as JSON from
+/stats.
+
+The BrokerStream class consumes the events published by a broker, and
+reconnects in the same way as cbdevents.EventStream:
+
+  import cbdbroker
+
+  for event in cbdbroker.BrokerStream('http://localhost:8765',
+                                      types=['event']):
+    print(event['english-string'].format(**event['parameters']))
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import json
+import threading
+import collections
+import urllib.parse
+import http.server
+
+import requests
+
+import cbdevents
+import cbdrouter
+
+class Subscriber:
+  """
+  A local subscriber to the broker, with its filter and bounded buffer.
+
+  Arguments:
+    types      - A list of the event types to receive, or None for all types
+    match      - A dictionary of field tests in the format used by cbdrouter,
+                 or None to receive every event of the chosen types
+    buffersize - The maximum number of events buffered for the subscriber
+  """
+  def __init__(self,types,match,buffersize):
+    self.types = frozenset(types) if types else None
+    self.test = cbdrouter.compileMatch(match or {})
+    self.buffer = collections.deque(maxlen=buffersize)
+    self.ready = threading.Condition()
+    self.closed = False
+    self.sent = 0
+    self.dropped = 0
+
+  def wants(self,event):
+    """Return True if the event passes the subscriber's filter."""
+    type = event.get('type')
+    if type == cbdevents.HEARTBEAT:
+      return True
+    if self.types is not None and type not in self.types:
+      return False
+    return self.test(event)
+
+  def put(self,item):
+    """
+    Add an item to the buffer without waiting.  If the buffer is full, the
+    oldest item is discarded.
+    """
+    with self.ready:
+      if len(self.buffer) == self.buffer.maxlen:
+        self.dropped += 1
+      self.buffer.append(item)
+      self.ready.notify()
+
+  def take(self,timeout):
+    """
+    Wait up to timeout seconds for items, and return a list of every item in
+    the buffer.  The list is empty if the timeout expired or the subscriber
+    was closed.
+    """
+    with self.ready:
+      self.ready.wait_for(lambda: self.buffer or self.closed,timeout)
+      items = list(self.buffer)
+      self.buffer.clear()
+    self.sent += len(items)
+    return items
+
+  def close(self):
+    with self.ready:
+      self.closed = True
+      self.ready.notify()
+
+  def stats(self):
+    return {'types':sorted(self.types) if self.types else None,
+            'buffered':len(self.buffer),
+            'sent':self.sent,
+            'dropped':self.dropped}
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+  # Serve the event stream and statistics to local subscribers.  The stream
+  # uses chunked encoding, as the Dashboard does, so that clients receive
+  # each write as soon as it is made
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self,format,*args):
+    # Requests are not logged, as each subscriber holds its connection open
+    pass
+
+  def _reply(self,status,payload):
+    body = json.dumps(payload,indent=2).encode('UTF-8')
+    self.send_response(status)
+    self.send_header('Content-Type','application/json')
+    self.send_header('Content-Length',str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def _chunk(self,data):
+    self.wfile.write(b'%x\r\n%s\r\n' % (len(data),data))
+    self.wfile.flush()
+
+  def do_GET(self):
+    broker = self.server.broker
+    url = urllib.parse.urlsplit(self.path)
+    if url.path == '/stats':
+      self._reply(200,broker.stats())
+      return
+    if url.path != '/events':
+      self._reply(404,{'error':'Unknown path {}'.format(url.path)})
+      return
+
+    query = urllib.parse.parse_qs(url.query)
+    types = None
+    if 'types' in query:
+      types = ','.join(query['types']).split(',')
+    try:
+      match = json.loads(query['match'][0]) if 'match' in query else None
+      lastid = self.headers.get('Last-Event-ID')
+      lastid = int(lastid) if lastid else None
+      subscriber = broker.subscribe(types,match,lastid)
+    except (ValueError,TypeError,AttributeError) as e:
+      self._reply(400,{'error':str(e)})
+      return
+
+    try:
+      self.send_response(200)
+      self.send_header('Content-Type','text/event-stream')
+      self.send_header('Cache-Control','no-cache')
+      self.send_header('Transfer-Encoding','chunked')
+      self.end_headers()
+      self.wfile.flush()
+      while not subscriber.closed:
+        items = subscriber.take(broker.keepalive)
+        if items:
+          self._chunk(b''.join(b'id: %d\ndata: %s\n\n' % item
+                               for item in items))
+        elif not subscriber.closed:
+          # A comment keeps the connection alive while the stream is quiet
+          self._chunk(b': keepalive\n\n')
+      self._chunk(b'')
+    except OSError:
+      # The subscriber has disconnected
+      pass
+    finally:
+      broker.unsubscribe(subscriber)
+      self.close_connection = True
+
+class Broker:
+  """
+  Re-publish events from a single upstream event stream to local
+  subscribers over HTTP.
+
+  Arguments:
+    events     - An iterable of events, normally a cbdevents.EventStream
+    host       - (Optional) The address to listen on.  Defaults to
+                 127.0.0.1, so only local processes can subscribe.
+    port       - (Optional) The port to listen on.  Defaults to 8765.
+    buffersize - (Optional) The maximum number of events buffered for each
+                 subscriber.  Defaults to 1000.
+    history    - (Optional) The number of recent events kept for
+                 subscribers that reconnect.  Defaults to 1000.
+    keepalive  - (Optional) The number of seconds without events after which
+                 a keepalive comment is sent.  Defaults to 15.
+  """
+  def __init__(self,events,host='127.0.0.1',port=8765,buffersize=1000,
+               history=1000,keepalive=15):
+    self.events = events
+    self.buffersize = buffersize
+    self.keepalive = keepalive
+    self.history = collections.deque(maxlen=history)
+    self.subscribers = []
+    self.sequence = 0
+    self.published = 0
+    self._lock = threading.Lock()
+    self.server = http.server.ThreadingHTTPServer((host,port),_Handler)
+    self.server.daemon_threads = True
+    self.server.broker = self
+    self.thread = None
+
+  @property
+  def address(self):
+    """The (host, port) the broker is listening on."""
+    return self.server.server_address[:2]
+
+  def subscribe(self,types=None,match=None,lastid=None):
+    """
+    Register a new subscriber and return it.  If lastid is given, any
+    matching events after that sequence number still in the history are
+    buffered for the subscriber straight away.
+    """
+    subscriber = Subscriber(types,match,self.buffersize)
+    with self._lock:
+      if lastid is not None:
+        for sequence, event, data in self.history:
+          if sequence > lastid and subscriber.wants(event):
+            subscriber.put((sequence,data))
+      self.subscribers.append(subscriber)
+    return subscriber
+
+  def unsubscribe(self,subscriber):
+    """Remove a subscriber."""
+    subscriber.close()
+    with self._lock:
+      if subscriber in self.subscribers:
+        self.subscribers.remove(subscriber)
+
+  def publish(self,event):
+    """
+    Pass an event to every subscriber that wants it.  The event is encoded
+    once and the same bytes are sent to every subscriber.
+    """
+    data = json.dumps(event).encode('UTF-8')
+    with self._lock:
+      self.sequence += 1
+      if event.get('type') != cbdevents.HEARTBEAT:
+        self.published += 1
+        self.history.append((self.sequence,event,data))
+      for subscriber in self.subscribers:
+        if subscriber.wants(event):
+          subscriber.put((self.sequence,data))
+
+  def start(self):
+    """Start accepting subscribers in a background thread."""
+    if self.thread is None:
+      self.thread = threading.Thread(target=self.server.serve_forever,
+                                     daemon=True)
+      self.thread.start()
+
+  def run(self):
+    """
+    Accept subscribers and publish every event from the upstream stream
+    until it ends, then close the broker.
+    """
+    self.start()
+    try:
+      for event in self.events:
+        self.publish(event)
+    finally:
+      self.close()
+
+  def close(self):
+    """Disconnect every subscriber and stop listening."""
+    with self._lock:
+      subscribers = list(self.subscribers)
+    for subscriber in subscribers:
+      subscriber.close()
+    if self.thread is not None:
+      self.server.shutdown()
+    self.server.server_close()
+
+  def stats(self):
+    """Return a dictionary of the broker and subscriber statistics."""
+    with self._lock:
+      return {'published':self.published,
+              'sequence':self.sequence,
+              'subscribers':[subscriber.stats()
+                             for subscriber in self.subscribers]}
+
+class BrokerStream(cbdevents.EventStream):
+  """
+  An iterable over the events published by a Broker, which reconnects and
+  resumes automatically whenever the connection is lost.  The other
+  arguments are as for cbdevents.EventStream.
+
+  Arguments:
+    url   - The URL of the broker, for example http://localhost:8765
+    types - (Optional) A list of the event types to receive.  Defaults to
+            all types.
+    match - (Optional) A dictionary of field tests in the format used by
+            cbdrouter
+  """
+  def __init__(self,url,types=None,match=None,**kwargs):
+    super().__init__(None,types=types,**kwargs)
+    self.url = url.rstrip('/') + '/events'
+    self.match = match
+    self.session = requests.Session()
+
+  def _connect(self):
+    params = {'types':','.join(self.types)}
+    if self.match is not None:
+      params['match'] = json.dumps(self.match)
+    headers = {'Accept':'text/event-stream'}
+    if self.lastid is not None:
+      headers['Last-Event-ID'] = self.lastid
+    response = self.session.get(self.url,params=params,headers=headers,
+                                stream=True,timeout=(10,self.readtimeout))
+    response.raise_for_status()
+    return response
+
+  def _expires(self):
+    # The broker does not use tokens, so the connection is never renewed
+    return float('inf')
+
+  def close(self):
+    super().close()
+    self.session.close()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Helpers for bulk operations using the Cisco Business Dashboard API
+
+Provides functions for splitting a large set of devices or networks into
+batches, submitting the batches to the Dashboard concurrently over a shared
+cbdclient.Client, and the JobTracker class for following the jobs created by
+operations such as backup-config to completion.  The planWaves and
+waitForNodes functions support rolling operations that must not disrupt
+too many devices at once.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import time
+import concurrent.futures
+
+import requests
+
+# Job states that indicate the job will make no further progress.  States are
+# compared after conversion to lower case with spaces and underscores
+# replaced by hyphens
+JOB_FINISHED = ('succeeded','success','completed','failed','failure',
+                'partially-succeeded','partial-success','cancelled',
+                'canceled','expired')
+JOB_SUCCEEDED = ('succeeded','success','completed')
+
+# The number of seconds JobTracker.wait waits for jobs to finish by default
+JOB_TIMEOUT = 3600
+
+# The node field used to decide whether a device is back online, and the
+# values it takes when the device is reachable
+NODE_STATE_FIELD = '/system-state/reachability'
+NODE_ONLINE = ('reachable','online','up')
+
+# The number of nodes requested by ID in each poll by waitForNodes, keeping
+# the query string to a reasonable length
+NODE_POLL_BATCH = 100
+
+def batches(items,size):
+  """
+  Split a list into consecutive lists of at most size items.
+
+  Arguments:
+    items - The list to split
+    size  - The maximum number of items in each batch
+  """
+  return [items[i:i+size] for i in range(0,len(items),size)]
+
+def submitAll(client,path,payloads,workers=4,callback=None):
+  """
+  POST each payload to the same API path concurrently and return a list of
+  (payload, result, error) tuples in the same order as the payloads.  Either
+  result holds the parsed response payload and error is None, or result is
+  None and error holds the exception raised for that request.  If the
+  callback raises an exception for a payload, the other payloads are still
+  submitted, and error holds that exception alongside the result.
+
+  Arguments:
+    client   - A cbdclient.Client connected to the Dashboard
+    path     - The API path, for example /api/v2/nodes/operations/reboot
+    payloads - A list of objects to send as JSON request payloads
+    workers  - (Optional) The maximum number of requests in flight at once.
+               Defaults to 4.
+    callback - (Optional) A function called with each (payload, result,
+               error) tuple as soon as the request completes
+  """
+  def submit(payload):
+    try:
+      outcome = (payload,client.post(path,payload),None)
+    except requests.exceptions.RequestException as e:
+      outcome = (payload,None,e)
+    if callback is not None:
+      try:
+        callback(*outcome)
+      except Exception as e:
+        outcome = (payload,outcome[1],e)
+    return outcome
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+    return list(executor.map(submit,payloads))
+
+def jobState(job):
+  """Return the normalised state of a job record."""
+  state = str(job.get('status') or job.get('state') or '')
+  return state.lower().replace(' ','-').replace('_','-')
+
+class JobTracker:
+  """
+  Follow a set of Dashboard jobs until every one has finished, reporting
+  aggregate progress and throughput along the way.  A job whose status
+  cannot be retrieved is left pending, and the error is kept in errors
+  until a later poll succeeds.
+
+  Arguments:
+    client   - A cbdclient.Client connected to the Dashboard
+    jobids   - The IDs of the jobs to track
+    interval - (Optional) The number of seconds between polls of the job
+               status.  Defaults to 10.
+    workers  - (Optional) The maximum number of job status requests in
+               flight at once.  Defaults to 4.
+  """
+  def __init__(self,client,jobids,interval=10,workers=4):
+    self.client = client
+    self.interval = interval
+    self.workers = workers
+    self.jobs = dict.fromkeys(jobids)
+    self.errors = {}
+    self.started = time.monotonic()
+
+  def pending(self):
+    """Return the IDs of the jobs that have not yet finished."""
+    return [jobid for jobid, job in self.jobs.items()
+            if job is None or jobState(job) not in JOB_FINISHED]
+
+  def poll(self):
+    """Refresh the status of every unfinished job."""
+    def fetch(jobid):
+      try:
+        return jobid, self.client.get('/api/v2/jobs/%s' % jobid), None
+      except requests.exceptions.HTTPError as e:
+        # A job that is not yet visible is treated as still queued
+        if e.response.status_code == 404:
+          return jobid, None, None
+        return jobid, None, e
+      except requests.exceptions.RequestException as e:
+        return jobid, None, e
+
+    with concurrent.futures.ThreadPoolExecutor(
+           max_workers=self.workers) as executor:
+      for jobid, job, error in executor.map(fetch,self.pending()):
+        if error is not None:
+          self.errors[jobid] = error
+          continue
+        self.errors.pop(jobid,None)
+        if job is not None:
+          # Single object requests may still be wrapped in a data member
+          self.jobs[jobid] = job.get('data',job)
+
+  def summary(self):
+    """
+    Return a dictionary of the number of jobs that are pending, succeeded and
+    failed, the number of pending jobs whose status could not be retrieved,
+    the elapsed time in seconds, and the throughput in finished jobs per
+    minute.
+    """
+    pending = len(self.pending())
+    succeeded = sum(1 for job in self.jobs.values()
+                    if job is not None and jobState(job) in JOB_SUCCEEDED)
+    finished = len(self.jobs) - pending
+    elapsed = time.monotonic() - self.started
+    return {'total':len(self.jobs),
+            'pending':pending,
+            'succeeded':succeeded,
+            'failed':finished - succeeded,
+            'unknown':len(self.errors),
+            'elapsed':elapsed,
+            'rate':finished * 60 / elapsed if elapsed else 0.0}
+
+  def wait(self,timeout=JOB_TIMEOUT,report=None):
+    """
+    Poll until every job has finished or the timeout expires.  Returns the
+    final summary, in which any jobs still running are counted as pending.
+
+    Arguments:
+      timeout - (Optional) The maximum number of seconds to wait.  Defaults
+                to JOB_TIMEOUT.  Pass None to wait indefinitely.
+      report  - (Optional) A function called with the summary after each
+                poll
+    """
+    while True:
+      self.poll()
+      summary = self.summary()
+      if report is not None:
+        report(summary)
+      if not summary['pending']:
+        return summary
+      if timeout is not None and summary['elapsed'] + self.interval > timeout:
+        return summary
+      time.sleep(self.interval)
+
+def formatSummary(summary):
+  """Return a one line progress report for a JobTracker summary."""
+  text = ('{succeeded} succeeded, {failed} failed, {pending} pending of '
+          '{total} jobs after {elapsed:.0f}s ({rate:.1f} jobs/min)'
+          .format(**summary))
+  if summary.get('unknown'):
+    text += ', {} could not be checked'.format(summary['unknown'])
+  return text
+
+def field(record,path):
+  """
+  Return the value of a field from an API record using the field path format
+  accepted by the fields query parameter, for example /system-state/hostname.
+  Returns None if the field is not present.
+  """
+  value = record
+  for part in path.strip('/').split('/'):
+    if not isinstance(value,dict):
+      return None
+    value = value.get(part)
+  return value
+
+def nodeNetwork(node):
+  """Return the ID of the network a node belongs to."""
+  network = node.get('network')
+  if isinstance(network,dict):
+    return network.get('id')
+  return node.get('network-id',network)
+
+def planWaves(nodes,key,pernetwork):
+  """
+  Split a list of node records into waves for a rolling operation.  Nodes are
+  first grouped by the value returned by key, then each group is divided so
+  that no wave contains more than pernetwork nodes from any one network.
+  Returns a list of (label, nodes) tuples in the order they should run.
+
+  Arguments:
+    nodes      - The node records to divide
+    key        - A function returning the grouping label for a node
+    pernetwork - The maximum number of nodes from a single network in a wave
+  """
+  groups = {}
+  for node in nodes:
+    groups.setdefault(str(key(node)),[]).append(node)
+
+  waves = []
+  for label in sorted(groups):
+    # Queue the nodes of each network separately, then take up to
+    # pernetwork nodes from every network for each wave
+    networks = {}
+    for node in groups[label]:
+      networks.setdefault(nodeNetwork(node),[]).append(node)
+    while networks:
+      wave = []
+      for network in list(networks):
+        wave.extend(networks[network][:pernetwork])
+        del networks[network][:pernetwork]
+        if not networks[network]:
+          del networks[network]
+      waves.append((label,wave))
+  return waves
+
+def waitForNodes(client,nodeids,timeout,interval=15,jobids=None):
+  """
+  Poll the Dashboard until every node has gone down and come back up again,
+  or the timeout expires.  Returns the list of node IDs that are not yet
+  back.
+
+  A node still reachable when it is first polled may not have started to
+  reboot, so it only counts as back once it has been seen unreachable, or
+  once every job in jobids has finished.  Only the nodes still being waited
+  for are requested from the Dashboard.
+
+  Arguments:
+    client   - A cbdclient.Client connected to the Dashboard
+    nodeids  - The IDs of the nodes to wait for
+    timeout  - The maximum number of seconds to wait
+    interval - (Optional) The number of seconds between polls.  Defaults
+               to 15.
+    jobids   - (Optional) The IDs of the jobs rebooting the nodes
+  """
+  waiting = set(nodeids)
+  down = set()
+  tracker = JobTracker(client,jobids) if jobids else None
+  deadline = time.monotonic() + timeout
+  while True:
+    if tracker is not None and waiting - down:
+      tracker.poll()
+      if not tracker.pending():
+        down.update(waiting)
+        tracker = None
+
+    for batch in batches(sorted(waiting),NODE_POLL_BATCH):
+      params = [('fields',NODE_STATE_FIELD),('type','All')] + \
+               [('id',nodeid) for nodeid in batch]
+      for node in client.iterate('/api/v2/nodes',params):
+        nodeid = node.get('id')
+        if nodeid not in waiting:
+          continue
+        if str(field(node,NODE_STATE_FIELD) or '').lower() not in NODE_ONLINE:
+          down.add(nodeid)
+        elif nodeid in down:
+          waiting.discard(nodeid)
+
+    if not waiting or time.monotonic() + interval > deadline:
+      return sorted(waiting)
+    time.sleep(interval)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Local cache of Cisco Business Dashboard object names and IDs
+
+Many API calls require the ID of an organization, network, device group or
+PnP file.  This module keeps a local SQLite copy of those lists so that a
+name can be turned into an ID without querying the Dashboard every time.
+Each list is refreshed from the Dashboard when it is older than the cache
+lifetime, when it has been invalidated, or when a lookup fails to find a
+match.
+
+When used as a module, provides the IdCache class.  For example:
+
+  import cbdcache
+
+  cache = cbdcache.IdCache()
+  orgid = cache.resolve('org','Default')
+
+When executed standalone, this utility looks up or lists cached records and
+may be used to refresh or invalidate the cache.
+
+Command line arguments:
+  positional arguments:
+    {org,network,group,image,config}
+                          The type of object to look up.
+    name                  The name or ID to look up. If omitted, all cached
+                          records of the type are listed.
+
+  optional arguments:
+    -h, --help            show this help message and exit
+    --version             show program's version number and exit
+    --refresh             Refresh the list from the Dashboard first.
+    --invalidate          Discard cached records of the type.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import re
+import json
+import sys
+import time
+import sqlite3
+import threading
+import argparse
+
+# The API path and name field for each type of object held in the cache
+KINDS = {
+  'org':('/api/v2/orgs','name'),
+  'network':('/api/v2/networks','name'),
+  'group':('/api/v2/groups','name'),
+  'image':('/api/v2/pnp/images','file-name'),
+  'config':('/api/v2/pnp/configs','file-name'),
+}
+
+# Values taken to be IDs rather than names, which are returned by resolve
+# without consulting the cache: numbers, UUIDs and 24 digit hexadecimal
+# object IDs
+ID_PATTERN = re.compile(r'^([0-9]+|[0-9a-fA-F]{24}|'
+                        r'[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12})$')
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'),'.cbdcache.sqlite')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+  dashboard TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  id TEXT NOT NULL,
+  name TEXT,
+  data TEXT,
+  PRIMARY KEY (dashboard, kind, id)
+);
+CREATE INDEX IF NOT EXISTS records_name ON records (dashboard, kind, name);
+CREATE TABLE IF NOT EXISTS lists (
+  dashboard TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  fetched REAL NOT NULL,
+  PRIMARY KEY (dashboard, kind)
+);
+'''
+
+class IdCache:
+  """
+  A persistent cache of organization, network, device group and PnP file
+  records, indexed by both ID and name.  Records are stored per Dashboard so
+  one cache file may serve several Dashboards.
+
+  Arguments:
+    client   - (Optional) A cbdclient.Client used to refresh the cache.  A
+               client is created from environment.py when first needed if
+               not specified.
+    path     - (Optional) The SQLite database file.  Defaults to
+               .cbdcache.sqlite in the user's home directory.
+    lifetime - (Optional) The number of seconds a cached list remains valid.
+               Defaults to 3600 (one hour).
+  """
+  def __init__(self,client=None,path=DEFAULT_PATH,lifetime=3600):
+    self.client = client
+    self.path = path
+    self.lifetime = lifetime
+    self._lock = threading.Lock()
+    self.db = sqlite3.connect(path,check_same_thread=False)
+    self.db.executescript(SCHEMA)
+
+  def _client(self):
+    if self.client is None:
+      import cbdclient
+      self.client = cbdclient.Client.fromEnvironment()
+    return self.client
+
+  @property
+  def dashboard(self):
+    """The base URL of the Dashboard the cached records belong to."""
+    if self.client is None:
+      import environment
+      return 'https://%s:%s' % (environment.dashboard, environment.port)
+    return self.client.baseurl
+
+  def fresh(self,kind):
+    """Return True if the cached list of the given type is still valid."""
+    dashboard = self.dashboard
+    with self._lock:
+      row = self.db.execute('SELECT fetched FROM lists WHERE dashboard=? AND '
+                            'kind=?',(dashboard,kind)).fetchone()
+    return row is not None and time.time() - row[0] < self.lifetime
+
+  def refresh(self,kind):
+    """Replace the cached list of the given type with a copy from the
+    Dashboard."""
+    path, namefield = KINDS[kind]
+    client = self._client()
+    if kind == 'network':
+      # Networks are listed one organization at a time, as the Dashboard
+      # only returns the networks of the organization selected with the
+      # x-ctx-org-id header
+      records = [network for org in self.records('org')
+                 for network in client.iterate(path,headers={'x-ctx-org-id':
+                                                             org['id']})]
+    else:
+      records = list(client.iterate(path))
+    dashboard = self.dashboard
+    with self._lock, self.db:
+      self.db.execute('DELETE FROM records WHERE dashboard=? AND kind=?',
+                      (dashboard,kind))
+      self.db.executemany('INSERT OR REPLACE INTO records VALUES '
+                          '(?,?,?,?,?)',
+                          [(dashboard,kind,record['id'],
+                            record.get(namefield),json.dumps(record))
+                           for record in records])
+      self.db.execute('INSERT OR REPLACE INTO lists VALUES (?,?,?)',
+                      (dashboard,kind,time.time()))
+
+  def invalidate(self,kind=None):
+    """
+    Discard the cached records of the given type, or of every type if kind
+    is not specified, so that the next lookup refreshes them.
+    """
+    kinds = [kind] if kind is not None else list(KINDS)
+    with self._lock, self.db:
+      for kind in kinds:
+        self.db.execute('DELETE FROM records WHERE dashboard=? AND kind=?',
+                        (self.dashboard,kind))
+        self.db.execute('DELETE FROM lists WHERE dashboard=? AND kind=?',
+                        (self.dashboard,kind))
+
+  def records(self,kind):
+    """Return every cached record of the given type, refreshing if stale."""
+    if not self.fresh(kind):
+      self.refresh(kind)
+    dashboard = self.dashboard
+    with self._lock:
+      rows = self.db.execute('SELECT data FROM records WHERE dashboard=? AND '
+                             'kind=? ORDER BY name',(dashboard,kind)).fetchall()
+    return [json.loads(data) for (data,) in rows]
+
+  def _lookup(self,kind,value):
+    # The connection is shared between threads, so reads are serialised
+    # with the writes
+    dashboard = self.dashboard
+    with self._lock:
+      return [id for (id,) in
+              self.db.execute('SELECT id FROM records WHERE dashboard=? AND '
+                              'kind=? AND (id=? OR name=?)',
+                              (dashboard,kind,value,value))]
+
+  def resolve(self,kind,value):
+    """
+    Return the ID of the object of the given type whose ID or name matches
+    value.  The cached list is refreshed first if it is stale, and once more
+    if no match is found, in case the object was created recently.  Raises
+    KeyError if there is no match and ValueError if the name matches more
+    than one object.  A value that is already an ID, according to
+    ID_PATTERN, is returned at once without checking it.
+
+    Arguments:
+      kind  - One of org, network, group, image or config
+      value - The name or ID of the object
+    """
+    if kind not in KINDS:
+      raise ValueError('Unknown object type {}'.format(kind))
+    if ID_PATTERN.match(value):
+      return value
+    refreshed = False
+    if not self.fresh(kind):
+      self.refresh(kind)
+      refreshed = True
+
+    ids = self._lookup(kind,value)
+    if not ids and not refreshed:
+      self.refresh(kind)
+      ids = self._lookup(kind,value)
+
+    if value in ids:
+      # An exact ID match takes precedence over a name
+      return value
+    if not ids:
+      raise KeyError('No {} named {}'.format(kind,value))
+    if len(ids) > 1:
+      raise ValueError('{} {} is ambiguous.  Use one of the IDs {}'.format(
+                       kind.capitalize(),value,', '.join(ids)))
+    return ids[0]
+
+  def close(self):
+    """Close the cache database."""
+    self.db.close()
+
+def getArgs():
+  # Use argparse to collect user input
+  parser = argparse.ArgumentParser(description='Look up the ID of a Cisco '
+                                   'Business Dashboard object by name using a '
+                                   'local cache.')
+  parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+  parser.add_argument('kind',choices=list(KINDS),help='The type of object to '
+                      'look up.')
+  parser.add_argument('name',nargs='?',default=None,help='The name or ID to '
+                      'look up.  If omitted, all cached records of the type '
+                      'are listed.')
+  parser.add_argument('--refresh',action='store_true',help='Refresh the list '
+                      'from the Dashboard first.')
+  parser.add_argument('--invalidate',action='store_true',help='Discard cached '
+                      'records of the type.')
+  return parser.parse_args()
+
+def main():
+  # If executed standalone, look up the requested name or list the cached
+  # records
+  args = getArgs()
+  cache = IdCache()
+  if args.invalidate:
+    cache.invalidate(args.kind)
+    return
+  if args.refresh:
+    cache.refresh(args.kind)
+  if args.name is None:
+    namefield = KINDS[args.kind][1]
+    for record in cache.records(args.kind):
+      print('{:25} {}'.format(record['id'],record.get(namefield)))
+  else:
+    try:
+      print(cache.resolve(args.kind,args.name))
+    except (KeyError,ValueError) as e:
+      print(e.args[0])
+      sys.exit(1)
+
+if __name__== "__main__":
+  main()
@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""Reusable client for the Cisco Business Dashboard API
+
+Provides the Client class, which wraps a pooled requests.Session so that
+connections to the Dashboard are kept alive and reused between API calls
+rather than performing a new TCP and TLS handshake for every request.  The
+Authorization header is populated automatically using a shared
+cbdauth.TokenProvider.
+
+Typical usage:
+
+  import cbdclient
+
+  with cbdclient.Client.fromEnvironment() as client:
+    print(client.get('/api/v2/orgs'))
+
+List endpoints such as /api/v2/nodes return their results a page at a time.
+Use Client.iterate to walk every page of a list and receive the records one
+at a time:
+
+  for node in client.iterate('/api/v2/nodes',pagesize=200):
+    print(node['id'])
+
+For very large lists, Client.iterateParallel requests the remaining pages
+concurrently once the first page has revealed the total number of records,
+and Client.iterateStream decodes each page as it arrives so that large pages
+can be requested without holding them in memory.
+
+Requests may be limited to a maximum rate, separately for reads and writes
+if needed, and the limit may be shared with other scripts running on the
+same host.  Requests the Dashboard is too busy to handle, with status 429 or
+503, are retried after the delay it asks for.
+
+Errors returned by the Dashboard are raised as requests.exceptions.HTTPError,
+with the response available as the response attribute of the exception.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import requests
+import requests.adapters
+import concurrent.futures
+import collections
+import email.utils
+import threading
+import random
+import struct
+import time
+import os
+
+try:
+  import fcntl
+except ImportError:
+  # Rate limiters can only be shared between processes where files can be
+  # locked, which excludes Windows
+  fcntl = None
+
+import cbdauth
+import cbdjson
+import cbdmetrics
+
+# The number of records requested per page when walking a list.  The
+# Dashboard returns 20 records per page if no limit is given
+DEFAULT_PAGESIZE = 100
+
+def pageTotal(page):
+  """
+  Return the total number of records available for a list query, as
+  reported in the paging information of a response page, or None if the
+  response does not include a total.
+  """
+  paging = page.get('paging')
+  if isinstance(paging,dict):
+    return paging.get('total')
+  return None
+
+def morePages(count,offset,pagesize,total):
+  """
+  Return True if more records follow a page of a list query.
+
+  Arguments:
+    count    - The number of records in the page
+    offset   - The index of the record after the last in the page
+    pagesize - The number of records requested for the page
+    total    - The total number of records reported by the Dashboard, or None
+  """
+  if total is not None:
+    return count > 0 and offset < total
+  return count >= pagesize
+
+def paramList(params):
+  """
+  Convert query parameters supplied as a dictionary or list of tuples to a
+  list of tuples so that paging parameters may be appended.
+  """
+  if params is None:
+    return []
+  if isinstance(params,dict):
+    return list(params.items())
+  return list(params)
+
+# The classes of endpoint that may be given their own rate limit.  Writes
+# include the device operations under /api/v2/nodes/operations
+ENDPOINT_CLASSES = ('read','write')
+
+# The status codes of responses that may be retried
+RETRY_STATUSES = (429,500,502,503,504)
+
+def endpointClass(method,path):
+  """
+  Return the class of an API request for rate limiting, which is 'read' for
+  requests that only retrieve information and 'write' for all others.
+  """
+  return 'read' if method.upper() in ('GET','HEAD','OPTIONS') else 'write'
+
+class RateLimiter:
+  """
+  Limit the rate at which requests are sent to the Dashboard using a token
+  bucket.  Up to burst requests may be started at once, after which callers
+  are spaced evenly so that no more than rate requests are started per
+  second, regardless of how many threads share the limiter.
+
+  Given a path, the limiter is also shared with every other process on the
+  host that uses the same path, so that scripts run in parallel together
+  stay within the limit.  The state of the bucket is kept in that file,
+  which is locked while it is updated.  All processes sharing a file should
+  use the same rate.
+
+  Arguments:
+    rate  - The maximum number of requests per second
+    burst - (Optional) The number of requests that may be started at once
+            after a quiet period.  Defaults to 1.
+    path  - (Optional) A file in which to share the limit with other
+            processes.  Not shared by default.
+  """
+  def __init__(self,rate,burst=1,path=None):
+    if rate <= 0 or burst < 1:
+      raise ValueError('The rate must be positive and the burst at least 1')
+    if path is not None and fcntl is None:
+      raise RuntimeError('Rate limiters cannot be shared between processes '
+                         'on this platform')
+    self.interval = 1.0 / rate
+    self.tolerance = (burst - 1) * self.interval
+    self.path = path
+    self._lock = threading.Lock()
+    self._next = 0
+    self._fd = None
+    if path is not None:
+      self._fd = os.open(path,os.O_RDWR | os.O_CREAT,0o666)
+
+  def _update(self,func):
+    # Call func with the time the next request is due and the current time,
+    # store the new due time it returns and return its result.  Processes
+    # have no common clock other than the time of day, so a shared limiter
+    # uses that rather than the monotonic clock
+    with self._lock:
+      if self._fd is None:
+        self._next,result = func(self._next,time.monotonic())
+        return result
+      fcntl.flock(self._fd,fcntl.LOCK_EX)
+      try:
+        data = os.pread(self._fd,8,0)
+        due = struct.unpack('d',data)[0] if len(data) == 8 else 0.0
+        due,result = func(due,time.time())
+        os.pwrite(self._fd,struct.pack('d',due),0)
+      finally:
+        fcntl.flock(self._fd,fcntl.LOCK_UN)
+      return result
+
+  def wait(self):
+    """Block until the caller may send its next request."""
+    def take(due,now):
+      start = max(now,due - self.tolerance)
+      return max(due,start) + self.interval,start - now
+    delay = self._update(take)
+    if delay > 0:
+      time.sleep(delay)
+
+  def pause(self,seconds):
+    """
+    Hold back every caller sharing the limiter, in this process and others,
+    for the given number of seconds.  Used when the Dashboard asks for
+    requests to slow down.
+    """
+    self._update(lambda due,now:(max(due,now + seconds + self.tolerance),
+                                 None))
+
+  def close(self):
+    """Close the file shared with other processes, if any."""
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+
+def retryAfter(response):
+  """
+  Return the number of seconds the Dashboard asked the client to wait before
+  retrying, from the Retry-After header of a response, or None if not given.
+  """
+  value = response.headers.get('Retry-After')
+  if value is None:
+    return None
+  try:
+    return max(float(value),0.0)
+  except ValueError:
+    pass
+  try:
+    when = email.utils.parsedate_to_datetime(value)
+  except (TypeError,ValueError):
+    return None
+  return max(when.timestamp() - time.time(),0.0)
+
+class RetryPolicy:
+  """
+  Decide whether, and after how long, to retry a request that the Dashboard
+  could not handle.  Responses with status 429 or 503 are retried whatever
+  the method, as the Dashboard did not act on the request.  Other server
+  errors are retried only for requests that are safe to repeat.  The delay
+  asked for in the Retry-After header is honoured.  Otherwise the delay
+  doubles with each attempt and is chosen at random up to that limit, so
+  that clients retrying at the same time spread out.
+
+  Arguments:
+    retries    - (Optional) The maximum number of times to retry a request.
+                 Defaults to 3.
+    backoff    - (Optional) The longest delay in seconds before the first
+                 retry.  Defaults to 1.
+    maxbackoff - (Optional) The longest delay between retries when the
+                 Dashboard does not give one.  Defaults to 30.
+    maxwait    - (Optional) The longest Retry-After delay honoured.  A
+                 request asked to wait longer is not retried.  Defaults to
+                 300.
+  """
+  def __init__(self,retries=3,backoff=1,maxbackoff=30,maxwait=300):
+    self.retries = retries
+    self.backoff = backoff
+    self.maxbackoff = maxbackoff
+    self.maxwait = maxwait
+
+  def delay(self,method,response,attempt):
+    """
+    Return the number of seconds to wait before retrying a request, or None
+    if it should not be retried.
+
+    Arguments:
+      method   - The HTTP method of the request
+      response - The response received
+      attempt  - The number of times the request has already been retried
+    """
+    status = response.status_code
+    if status not in RETRY_STATUSES or attempt >= self.retries:
+      return None
+    if status not in (429,503) and method.upper() not in ('GET','HEAD',
+                                                          'OPTIONS','PUT',
+                                                          'DELETE'):
+      return None
+    delay = retryAfter(response)
+    if delay is not None:
+      return delay if delay <= self.maxwait else None
+    return random.uniform(0,min(self.backoff * 2 ** attempt,self.maxbackoff))
+
+class Client:
+  """
+  A client for version 2 of the Cisco Business Dashboard API using a pool of
+  keep-alive connections.  A single client may be shared by many threads.
+
+  Arguments:
+    dashboard - The hostname or IP address of the Dashboard
+    port      - The TCP port the Dashboard API is available on
+    keyid     - The key ID from the Access Key defined on the Dashboard
+    secret    - The secret value for the Access Key defined on the Dashboard
+    clientid  - (Optional) A unique ID for the instance of the client
+                application.  A random UUID is used if not specified.
+    appname   - (Optional) A name to identify the application in domain name
+                format.
+    verify    - (Optional) Verify the certificate of the Dashboard.  Set to
+                False for self-signed certs, or to the path of a certificate
+                to trust.  Defaults to True.
+    poolsize  - (Optional) The maximum number of connections kept open to the
+                Dashboard.  Defaults to 10.
+    block     - (Optional) Wait for a free connection when all poolsize
+                connections are in use, rather than opening a temporary
+                extra connection.  Defaults to True.
+    timeout   - (Optional) A (connect, read) tuple of timeouts in seconds
+                applied to every request.  Defaults to (10, 60).
+    ratelimit - (Optional) The maximum number of requests per second sent by
+                this client across all threads, or a dictionary giving the
+                maximum for each class of endpoint, for example
+                {'read':20,'write':2}.  Unlimited by default.
+    limitfile - (Optional) A file used to share the rate limits with other
+                processes on this host.  With a dictionary of limits, the
+                name of each class is added to the file name.  Not shared
+                by default.
+    retry     - (Optional) The RetryPolicy deciding which failed requests are
+                retried.  Defaults to RetryPolicy().  Pass False to never
+                retry.
+    metrics   - (Optional) A cbdmetrics.Metrics object in which to record the
+                latency, status, size and retries of every request.  Not
+                recorded by default.
+  """
+  def __init__(self,dashboard,port,keyid,secret,clientid=None,
+               appname="cbdscript.example.com",verify=True,poolsize=10,
+               block=True,timeout=(10,60),ratelimit=None,limitfile=None,
+               retry=None,metrics=None):
+    self.baseurl = 'https://%s:%s' % (dashboard, port)
+    self.verify = verify
+    self.timeout = timeout
+    self.retry = RetryPolicy() if retry is None else retry
+    self.metrics = metrics
+
+    # Each class of endpoint may have a limiter of its own, or a single
+    # limiter may be shared by all of them
+    self.limiters = {}
+    if isinstance(ratelimit,dict):
+      for name,rate in ratelimit.items():
+        if name not in ENDPOINT_CLASSES:
+          raise ValueError('Unknown endpoint class {}'.format(name))
+        if rate:
+          path = None if limitfile is None else '%s.%s' % (limitfile,name)
+          self.limiters[name] = RateLimiter(rate,path=path)
+    elif ratelimit:
+      limiter = RateLimiter(ratelimit,path=limitfile)
+      self.limiters = dict.fromkeys(ENDPOINT_CLASSES,limiter)
+
+    self.tokens = cbdauth.getTokenProvider(keyid=keyid,secret=secret,
+                                           clientid=clientid,appname=appname)
+
+    # All requests go to the same host, so a single pool holding up to
+    # poolsize keep-alive connections is all that is needed.  When metrics
+    # are recorded, the connections also time how long they take to open
+    adapter = (requests.adapters.HTTPAdapter if metrics is None else
+               cbdmetrics.TimedAdapter)(pool_connections=1,
+                                        pool_maxsize=poolsize,
+                                        pool_block=block)
+    self.session = requests.Session()
+    self.session.mount('https://',adapter)
+    self.session.verify = verify
+
+  @classmethod
+  def fromEnvironment(cls,env=None,**kwargs):
+    """
+    Create a client using the details contained in the environment.py file.
+
+    Arguments:
+      env    - (Optional) A module or object with the same attributes as
+               environment.py.  The environment module is used if not
+               specified.
+      kwargs - Any other Client arguments, such as poolsize or timeout.
+    """
+    if env is None:
+      import environment as env
+
+    return cls(env.dashboard,env.port,env.keyid,env.secret,
+               clientid=env.clientid,appname=env.appname,
+               verify=env.verify_cbd_cert,**kwargs)
+
+  def url(self,path):
+    """Return the full URL for the given API path."""
+    return self.baseurl + path
+
+  def request(self,method,path,params=None,json=None,**kwargs):
+    """
+    Send a request to the Dashboard and return the requests.Response object.
+    If the Dashboard rejects the JWT, a new one is generated and the request
+    is retried once.  Requests the Dashboard was too busy to handle are
+    retried as the retry policy of the client allows.  Raises
+    requests.exceptions.HTTPError if the Dashboard returns an error.
+
+    Arguments:
+      method - The HTTP method to use
+      path   - The API path, for example /api/v2/orgs
+      params - (Optional) A dictionary or list of tuples of query parameters
+      json   - (Optional) An object to send as the JSON request payload
+      kwargs - Any other arguments accepted by requests.Session.request,
+               including headers to add to the Authorization header
+    """
+    kwargs.setdefault('timeout',self.timeout)
+    # Passed with each request, as REQUESTS_CA_BUNDLE would otherwise take
+    # precedence over the verify setting of the session
+    kwargs.setdefault('verify',self.verify)
+    extraheaders = kwargs.pop('headers',None) or {}
+    limiter = self.limiters.get(endpointClass(method,path))
+    renewed = False
+    retries = 0
+    while True:
+      if limiter is not None:
+        limiter.wait()
+      if self.metrics is not None:
+        response = self._timedRequest(method,path,params,json,extraheaders,
+                                      kwargs)
+      else:
+        headers = {'Authorization':"Bearer %s" % self.tokens.getToken()}
+        headers.update(extraheaders)
+        response = self.session.request(method,self.url(path),params=params,
+                                        json=json,headers=headers,**kwargs)
+      if response.status_code == 401 and not renewed:
+        # The token may have been revoked or the clocks may disagree.  Try
+        # once more with a fresh token
+        response.close()
+        self.tokens.invalidate()
+        renewed = True
+        if self.metrics is not None:
+          self.metrics.retry(cbdmetrics.endpoint(method,path),401)
+        continue
+
+      delay = self.retry.delay(method,response,retries) if self.retry else None
+      if delay is None:
+        break
+      response.close()
+      retries += 1
+      if self.metrics is not None:
+        self.metrics.retry(cbdmetrics.endpoint(method,path),
+                           response.status_code)
+      if response.status_code == 429 and limiter is not None:
+        # The Dashboard wants fewer requests, so hold back every request
+        # sharing the limiter, not just this one
+        limiter.pause(delay)
+      time.sleep(delay)
+
+    response.raise_for_status()
+    return response
+
+  def _timedRequest(self,method,path,params,json,extraheaders,kwargs):
+    # Send a request as request does, recording the time spent in each phase
+    # in the metrics
+    name = cbdmetrics.endpoint(method,path)
+    cbdmetrics.startRequest()
+    started = time.perf_counter()
+    headers = {'Authorization':"Bearer %s" % self.tokens.getToken()}
+    headers.update(extraheaders)
+    token = time.perf_counter() - started
+    try:
+      response = self.session.request(method,self.url(path),params=params,
+                                      json=json,headers=headers,**kwargs)
+    except requests.exceptions.RequestException as e:
+      self.metrics.error(name,e)
+      raise
+    self.metrics.response(name,response,time.perf_counter() - started,
+                          cbdmetrics.connectTime(),token,
+                          kwargs.get('stream',False))
+    return response
+
+  def _decode(self,method,path,response):
+    # Parse the JSON payload of a response, timing it if metrics are recorded
+    if self.metrics is None:
+      return response.json()
+    started = time.perf_counter()
+    payload = response.json()
+    self.metrics.observe(cbdmetrics.endpoint(method,path),'decode',
+                         time.perf_counter() - started)
+    return payload
+
+  def get(self,path,params=None,headers=None):
+    """
+    Perform a GET request and return the JSON object parsed from the
+    response payload.
+    """
+    return self._decode('GET',path,self.request('GET',path,params=params,
+                                                 headers=headers))
+
+  def post(self,path,json=None,params=None):
+    """
+    Perform a POST request and return the JSON object parsed from the
+    response payload, or None if the response has no payload.
+    """
+    response = self.request('POST',path,params=params,json=json)
+    if response.status_code == 204 or not response.content:
+      return None
+    return self._decode('POST',path,response)
+
+  def getPage(self,path,params=None,offset=0,pagesize=DEFAULT_PAGESIZE,
+              headers=None):
+    """
+    Retrieve a single page of a list query and return the JSON object parsed
+    from the response payload.
+
+    Arguments:
+      path     - The API path of the list, for example /api/v2/nodes
+      params   - (Optional) A dictionary or list of tuples of query parameters
+      offset   - (Optional) The index of the first record to return
+      pagesize - (Optional) The maximum number of records to return
+      headers  - (Optional) A dictionary of additional request headers
+    """
+    return self.get(path,paramList(params) + [('offset',offset),
+                                              ('limit',pagesize)],headers)
+
+  def iterate(self,path,params=None,pagesize=DEFAULT_PAGESIZE,prefetch=False,
+              offset=0,headers=None):
+    """
+    Walk every page of a list query, yielding each record in turn.  Pages are
+    requested only as the records are consumed, so memory use does not grow
+    with the size of the list.
+
+    Arguments:
+      path     - The API path of the list, for example /api/v2/nodes
+      params   - (Optional) A dictionary or list of tuples of query parameters
+      pagesize - (Optional) The number of records to request per page.  Larger
+                 pages mean fewer round trips to the Dashboard.
+      prefetch - (Optional) Request the next page in a background thread
+                 while the caller is processing the current one.  Defaults to
+                 False.
+      offset   - (Optional) The index of the first record to return.
+      headers  - (Optional) A dictionary of additional request headers, for
+                 example x-ctx-org-id to select an organization
+    """
+    executor = None
+    if prefetch:
+      executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    pending = None
+    try:
+      page = self.getPage(path,params,offset,pagesize,headers)
+      while True:
+        records = page.get('data',[])
+        total = pageTotal(page)
+        offset += len(records)
+
+        # The list ends at the total if the Dashboard reports one, as the
+        # Dashboard may return fewer records per page than were asked for.
+        # Otherwise a short page marks the end
+        more = morePages(len(records),offset,pagesize,total)
+        if more and executor is not None:
+          pending = executor.submit(self.getPage,path,params,offset,pagesize,
+                                    headers)
+
+        for record in records:
+          yield record
+
+        if not more:
+          break
+        if pending is not None:
+          page = pending.result()
+          pending = None
+        else:
+          page = self.getPage(path,params,offset,pagesize,headers)
+
+    finally:
+      if executor is not None:
+        if pending is not None:
+          pending.cancel()
+        executor.shutdown(wait=False)
+
+  def iterateStream(self,path,params=None,pagesize=DEFAULT_PAGESIZE,offset=0,
+                    headers=None):
+    """
+    Walk every page of a list query as iterate does, but decode each page as
+    it arrives rather than all at once, yielding each record as soon as it
+    has been received.  Only the record being decoded is held in memory, so
+    very large pages may be requested to reduce the number of round trips.
+
+    Arguments:
+      path     - The API path of the list, for example /api/v2/nodes
+      params   - (Optional) A dictionary or list of tuples of query parameters
+      pagesize - (Optional) The number of records to request per page
+      offset   - (Optional) The index of the first record to return.
+      headers  - (Optional) A dictionary of additional request headers
+    """
+    while True:
+      response = self.request('GET',path,params=paramList(params) +
+                              [('offset',offset),('limit',pagesize)],
+                              headers=headers,stream=True)
+      parser = cbdjson.DataParser()
+      chunks = response.iter_content(chunk_size=65536)
+      timing = None
+      if self.metrics is not None:
+        # Time reading the payload apart from decoding it, as both happen
+        # while the records are being consumed
+        timing = cbdmetrics.StreamTiming()
+        chunks = timing.read(chunks)
+      records = cbdjson.iterData(chunks,parser=parser)
+      if timing is not None:
+        records = timing.records(records)
+      count = 0
+      try:
+        for record in records:
+          count += 1
+          yield record
+      finally:
+        response.close()
+        if timing is not None:
+          self.metrics.streamed(cbdmetrics.endpoint('GET',path),response,
+                                timing)
+
+      # The paging details may follow the records, so are only known once
+      # the page is complete
+      offset += count
+      if not morePages(count,offset,pagesize,pageTotal(parser.meta)):
+        break
+
+  def iterateParallel(self,path,params=None,pagesize=DEFAULT_PAGESIZE,
+                      workers=4,headers=None):
+    """
+    Walk every page of a list query, requesting pages concurrently, and yield
+    each record in the order the Dashboard lists them.  The first page is
+    retrieved on its own to learn the total number of records, then the
+    remaining pages are shared between a pool of worker threads.  Only a few
+    pages beyond the one being consumed are held in memory at any time.
+
+    If the Dashboard does not report a total, the remaining pages are
+    retrieved one at a time as for iterate.  Combine with the ratelimit
+    argument of the client to avoid overloading the Dashboard.
+
+    Arguments:
+      path     - The API path of the list, for example /api/v2/nodes
+      params   - (Optional) A dictionary or list of tuples of query parameters
+      pagesize - (Optional) The number of records to request per page
+      workers  - (Optional) The maximum number of pages requested at once.
+                 Defaults to 4.
+      headers  - (Optional) A dictionary of additional request headers
+    """
+    page = self.getPage(path,params,0,pagesize,headers)
+    records = page.get('data',[])
+    total = pageTotal(page)
+    for record in records:
+      yield record
+
+    if not morePages(len(records),len(records),pagesize,total):
+      return
+    if total is None:
+      for record in self.iterate(path,params,pagesize,offset=len(records),
+                                 headers=headers):
+        yield record
+      return
+
+    # The Dashboard may return fewer records per page than were asked for,
+    # so the remaining pages are the size of the first one
+    pagesize = len(records)
+    offsets = iter(range(pagesize,total,pagesize))
+    window = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+      # Keep twice as many pages queued as there are workers so that the
+      # workers stay busy while the caller consumes the oldest page
+      for offset in offsets:
+        window.append(executor.submit(self.getPage,path,params,offset,
+                                      pagesize,headers))
+        if len(window) >= workers * 2:
+          break
+
+      while window:
+        page = window.popleft().result()
+        offset = next(offsets,None)
+        if offset is not None:
+          window.append(executor.submit(self.getPage,path,params,offset,
+                                        pagesize,headers))
+        for record in page.get('data',[]):
+          yield record
+
+    finally:
+      for future in window:
+        future.cancel()
+      executor.shutdown(wait=False)
+
+  def close(self):
+    """Close all pooled connections and any shared rate limit files."""
+    self.session.close()
+    for limiter in set(self.limiters.values()):
+      limiter.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Resilient consumer for the Cisco Business Dashboard event stream
+
+Provides the EventStream class, which connects to /api/v2/event-source and
+yields each event received as a parsed JSON object.  If the connection is
+lost, the stream reconnects automatically using exponential backoff with
+random jitter, and passes the ID of the last event received in the
+Last-Event-ID header so that the Dashboard can resume from where the stream
+left off.  The connection is also renewed shortly before the JWT expires so
+the Dashboard never needs to reject an expired token.
+
+Typical usage:
+
+  import cbdclient
+  import cbdevents
+
+  with cbdclient.Client.fromEnvironment() as client:
+    for event in cbdevents.EventStream(client,types=['event']):
+      print(event['english-string'].format(**event['parameters']))
+
+The metrics attribute of the stream records the number of connections and
+reconnections, the number of events received, and the duration of the gaps
+in the stream while reconnecting.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import json
+import time
+import random
+
+import requests
+
+import cbdsse
+
+# All of the event types supported by the event stream
+EVENT_TYPES = ['action','config_change','event','state_change']
+
+# The type reported for the heartbeats sent periodically by the Dashboard
+HEARTBEAT = '/heart_beat'
+
+class EventStream:
+  """
+  An iterable over the events from the Dashboard event stream, which
+  reconnects automatically whenever the connection is lost.
+
+  Arguments:
+    client      - A cbdclient.Client connected to the Dashboard
+    types       - (Optional) A list of the event types to receive.  Defaults
+                  to all types.
+    subscribed  - (Optional) Receive only events from networks subscribed to
+                  using /api/v2/subscription.  Defaults to False (all
+                  networks).
+    heartbeats  - (Optional) Yield heartbeat events as well as other events.
+                  Defaults to True.
+    backoff     - (Optional) The delay in seconds before the first attempt
+                  to reconnect.  Doubled after each failed attempt.
+                  Defaults to 1.
+    maxbackoff  - (Optional) The longest delay between attempts to
+                  reconnect.  Defaults to 60.
+    readtimeout - (Optional) Reconnect if nothing, not even a heartbeat, is
+                  received for this many seconds.  Defaults to 120.
+    callback    - (Optional) A function called with a message and the
+                  exception, if any, whenever the stream disconnects
+  """
+  def __init__(self,client,types=None,subscribed=False,heartbeats=True,
+               backoff=1,maxbackoff=60,readtimeout=120,callback=None):
+    self.client = client
+    self.types = types or EVENT_TYPES
+    self.subscribed = subscribed
+    self.heartbeats = heartbeats
+    self.backoff = backoff
+    self.maxbackoff = maxbackoff
+    self.readtimeout = readtimeout
+    self.callback = callback
+    self.lastid = None
+    self.response = None
+    self.closed = False
+    self.metrics = {
+      'connects':0,
+      'reconnects':0,
+      'renewals':0,
+      'errors':0,
+      'events':0,
+      'heartbeats':0,
+      'lastgap':0.0,
+      'maxgap':0.0,
+      'totalgap':0.0,
+    }
+
+  def _connect(self):
+    params = {'types':','.join(self.types),
+              'monitored-networks':'subscribed' if self.subscribed else 'all'}
+    headers = {'Accept':'text/event-stream'}
+    if self.lastid is not None:
+      headers['Last-Event-ID'] = self.lastid
+    connecttimeout = self.client.timeout
+    if isinstance(connecttimeout,tuple):
+      connecttimeout = connecttimeout[0]
+    return self.client.request('GET','/api/v2/event-source',params=params,
+                               headers=headers,stream=True,
+                               timeout=(connecttimeout,self.readtimeout))
+
+  def _expires(self):
+    # The time at which the connection should be renewed with a new token
+    return self.client.tokens.expires - self.client.tokens.margin
+
+  def _events(self,response):
+    # Parse the stream as it arrives and yield each event as a parsed JSON
+    # object
+    parser = cbdsse.SSEParser()
+    for chunk in response.iter_content(chunk_size=None):
+      for id, event, data in parser.feed(chunk):
+        if id is not None:
+          self.lastid = id
+        yield json.loads(data)
+      # Events may set an ID without carrying any data
+      if parser.lastid is not None:
+        self.lastid = parser.lastid
+
+  def _notify(self,message,error=None):
+    if self.callback is not None:
+      self.callback(message,error)
+
+  def __iter__(self):
+    delay = self.backoff
+    disconnected = None
+    while not self.closed:
+      renew = False
+      try:
+        # Note the expiry of the token used for this connection, so the
+        # connection can be renewed before the token expires
+        self.response = self._connect()
+        expires = self._expires()
+        self.metrics['connects'] += 1
+        if disconnected is not None:
+          gap = time.monotonic() - disconnected
+          self.metrics['reconnects'] += 1
+          self.metrics['lastgap'] = gap
+          self.metrics['maxgap'] = max(self.metrics['maxgap'],gap)
+          self.metrics['totalgap'] += gap
+          disconnected = None
+
+        for event in self._events(self.response):
+          # Once events are flowing, the next failure starts the backoff
+          # from the beginning again
+          delay = self.backoff
+          if event.get('type') == HEARTBEAT:
+            self.metrics['heartbeats'] += 1
+            if self.heartbeats:
+              yield event
+          else:
+            self.metrics['events'] += 1
+            yield event
+
+          if time.time() >= expires:
+            # Reconnect straight away with a new token, resuming from the
+            # last event received
+            self.metrics['renewals'] += 1
+            self._notify('Renewing connection before the JWT expires.')
+            renew = True
+            break
+        else:
+          self._notify('The Dashboard closed the event stream.')
+
+      except (requests.exceptions.RequestException,ValueError) as e:
+        # Connection errors, HTTP errors and damaged events all lead to a
+        # reconnect after a delay
+        self.metrics['errors'] += 1
+        self._notify('Event stream failed.',e)
+
+      finally:
+        if self.response is not None:
+          self.response.close()
+          self.response = None
+
+      if disconnected is None:
+        disconnected = time.monotonic()
+      if not renew and not self.closed:
+        # Full jitter spreads out the reconnections of many consumers
+        time.sleep(random.uniform(0,delay))
+        delay = min(delay * 2,self.maxbackoff)
+
+  def close(self):
+    """Stop the stream and close the connection to the Dashboard."""
+    self.closed = True
+    if self.response is not None:
+      self.response.close()
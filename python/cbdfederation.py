@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Query many Cisco Business Dashboards at once
+
+Provides the Federation class, which sends the same query to every Dashboard
+in an inventory concurrently and merges the records returned into a single
+stream, tagging each record with the name of the Dashboard it came from.
+Each Dashboard is queried from its own thread using its own client, access
+key and certificate verification setting.  Records are passed on as soon as
+they arrive, so a slow Dashboard does not hold up the records of the others,
+and a Dashboard that fails is reported without stopping the rest.  A
+deadline limits how long the slowest Dashboards are waited for.
+
+The inventory is a JSON file holding a list of Dashboards, each described
+with the same settings as environment.py together with a name:
+
+  [{"name": "customer-a", "dashboard": "cbd.customer-a.example.com",
+    "port": 443, "verify_cbd_cert": true,
+    "keyid": "<access key id>", "secret": "<access key secret>"}]
+
+See dashboards.template.json for an example.  Existing copies of
+environment.py may be used instead with loadEnvironment.
+
+Typical usage:
+
+  import cbdfederation
+  import cbdquery
+
+  dashboards = cbdfederation.loadInventory('dashboards.json')
+  federation = cbdfederation.Federation(dashboards)
+  for node in federation.iterate(cbdquery.NodeQuery(),deadline=300):
+    print(node['source'],node['id'])
+  for outcome in federation.outcomes.values():
+    print(outcome)
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import json
+import time
+import queue
+import runpy
+import threading
+import types
+
+import cbdclient
+
+# The field added to each record naming the Dashboard it came from
+SOURCE_FIELD = 'source'
+
+# The settings every Dashboard must have, and the defaults for the others
+REQUIRED = ('dashboard','port','keyid','secret')
+DEFAULTS = {'verify_cbd_cert':True,'appname':'examples.cbd.cisco.com',
+            'clientid':None}
+
+# The number of records held for the caller before the threads querying the
+# Dashboards wait for it to catch up
+QUEUE_SIZE = 1000
+
+def makeDashboard(settings,name=None):
+  """
+  Return the description of a Dashboard, with the same attributes as
+  environment.py and a name, from a dictionary of settings.  Raises
+  ValueError if a required setting is missing.
+
+  Arguments:
+    settings - A dictionary of settings named as in environment.py
+    name     - (Optional) The name of the Dashboard.  Defaults to the name
+               setting, or else the hostname of the Dashboard.
+  """
+  name = name or settings.get('name') or settings.get('dashboard')
+  missing = [key for key in REQUIRED if settings.get(key) in (None,'')]
+  if missing:
+    raise ValueError('Dashboard {} is missing {}'.format(name or '?',
+                                                         ', '.join(missing)))
+  dashboard = {key:settings.get(key,default)
+               for key, default in DEFAULTS.items()}
+  dashboard.update({key:settings[key] for key in REQUIRED})
+  return types.SimpleNamespace(name=str(name),**dashboard)
+
+def loadInventory(path):
+  """
+  Return the list of Dashboards described by a JSON inventory file.  Raises
+  ValueError if the file is not a valid inventory.
+  """
+  with open(path) as file:
+    entries = json.load(file)
+  if not isinstance(entries,list) or not all(isinstance(entry,dict)
+                                             for entry in entries):
+    raise ValueError('The inventory {} must hold a list of objects'
+                     .format(path))
+  return [makeDashboard(entry) for entry in entries]
+
+def loadEnvironment(path,name=None):
+  """
+  Return the Dashboard described by a copy of environment.py.
+
+  Arguments:
+    path - The path of the file
+    name - (Optional) The name of the Dashboard.  Defaults to the hostname of
+           the Dashboard.
+  """
+  return makeDashboard(runpy.run_path(path),name)
+
+class Outcome:
+  """
+  The outcome of querying one Dashboard.
+
+  Attributes:
+    name    - The name of the Dashboard
+    records - The number of records received from the Dashboard
+    seconds - The number of seconds the query took, or None if it did not
+              finish
+    error   - The exception that stopped the query, or None if it succeeded
+  """
+  def __init__(self,name):
+    self.name = name
+    self.records = 0
+    self.seconds = None
+    self.error = None
+
+  @property
+  def ok(self):
+    """True if every record was received from the Dashboard."""
+    return self.seconds is not None and self.error is None
+
+  def __repr__(self):
+    if self.error is not None:
+      return '{}: failed after {} record(s): {}'.format(self.name,
+                                                        self.records,
+                                                        self.error)
+    if self.seconds is None:
+      return '{}: stopped after {} record(s)'.format(self.name,self.records)
+    return '{}: {} record(s) in {:.1f}s'.format(self.name,self.records,
+                                                self.seconds)
+
+class _Finished:
+  # Sent by a thread once its Dashboard has returned every record or failed
+  def __init__(self,seconds,error):
+    self.seconds = seconds
+    self.error = error
+
+class Federation:
+  """
+  A set of Dashboards queried together.  A Federation may be used for any
+  number of queries, one at a time.
+
+  Arguments:
+    dashboards - A list of Dashboards, as returned by loadInventory
+    clientargs - Any other cbdclient.Client arguments, such as timeout or
+                 ratelimit, applied to the client of every Dashboard
+  """
+  def __init__(self,dashboards,**clientargs):
+    self.dashboards = list(dashboards)
+    names = [dashboard.name for dashboard in self.dashboards]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+      raise ValueError('Dashboard names must be unique: {}'.format(
+                       ', '.join(duplicates)))
+    self.clientargs = clientargs
+    self.outcomes = {}
+
+  def _query(self,dashboard,query,workers,results,stop):
+    # Send the query to one Dashboard, passing each record to the caller.
+    # Any failure is reported rather than raised, so that the caller always
+    # learns that the Dashboard has finished
+    started = time.monotonic()
+    error = None
+    try:
+      with cbdclient.Client.fromEnvironment(dashboard,
+                                            **self.clientargs) as client:
+        for record in query.iterate(client,workers=workers):
+          record[SOURCE_FIELD] = dashboard.name
+          if not _put(results,stop,(dashboard.name,record)):
+            return
+    except Exception as e:
+      error = e
+    _put(results,stop,(dashboard.name,_Finished(time.monotonic() - started,
+                                                error)))
+
+  def iterate(self,query,workers=1,deadline=None):
+    """
+    Send a query to every Dashboard at once and yield the records returned
+    in the order they arrive, with the name of the Dashboard each came from
+    in the source field.  When the records run out, outcomes holds an
+    Outcome for each Dashboard, showing which failed.
+
+    Arguments:
+      query    - A cbdquery query, such as NodeQuery
+      workers  - (Optional) The number of pages to request concurrently from
+                 each Dashboard.  Defaults to 1.
+      deadline - (Optional) The number of seconds to wait for every
+                 Dashboard to finish.  Dashboards still running are reported
+                 as timed out and their remaining records are discarded.
+                 Not limited by default.
+    """
+    self.outcomes = {dashboard.name:Outcome(dashboard.name)
+                     for dashboard in self.dashboards}
+    results = queue.Queue(QUEUE_SIZE)
+    stop = threading.Event()
+    for dashboard in self.dashboards:
+      # The threads are daemons so that a Dashboard that never responds
+      # cannot prevent the script from exiting
+      threading.Thread(target=self._query,daemon=True,
+                       args=(dashboard,query,workers,results,stop)).start()
+
+    running = len(self.dashboards)
+    end = None if deadline is None else time.monotonic() + deadline
+    try:
+      while running:
+        timeout = None if end is None else max(end - time.monotonic(),0)
+        try:
+          name, item = results.get(timeout=timeout)
+        except queue.Empty:
+          for outcome in self.outcomes.values():
+            if outcome.seconds is None:
+              outcome.error = TimeoutError('Did not finish within {} seconds'
+                                           .format(deadline))
+          break
+        outcome = self.outcomes[name]
+        if isinstance(item,_Finished):
+          outcome.seconds = item.seconds
+          outcome.error = item.error
+          running -= 1
+        else:
+          outcome.records += 1
+          yield item
+    finally:
+      stop.set()
+
+def _put(results,stop,item):
+  # Pass an item to the caller, giving up if the caller has stopped reading
+  while not stop.is_set():
+    try:
+      results.put(item,timeout=0.5)
+      return True
+    except queue.Full:
+      pass
+  return False
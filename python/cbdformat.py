@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Fast rendering of Cisco Business Dashboard event messages
+
+Each event from the event stream carries an english-string template and the
+parameters to fill it with.  A Dashboard only uses a few hundred different
+templates, so the TemplateCache class parses each template once, into a
+format string with positional fields and an operator.itemgetter that
+picks out the parameters it needs.  The parsed templates are kept in a
+least recently used cache of bounded size.  Rendering takes about as long
+as calling str.format directly; what the cache adds is that a missing or
+unsuitable parameter no longer loses the whole message.
+
+Unlike str.format, rendering never raises an exception.  A parameter missing
+from the event is shown as its placeholder, for example {device}, a value
+that does not suit the format given in the template is shown unformatted,
+and a template that cannot be parsed is shown as it is.
+
+Typical usage:
+
+  import cbdformat
+
+  for event in stream:
+    print(cbdformat.render(event))
+
+The record function returns a dictionary holding the event type, the
+rendered message and the parameters, ready for output as JSON Lines.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import string
+import operator
+import functools
+
+_FORMATTER = string.Formatter()
+
+_CONVERSIONS = {'r':repr,'s':str,'a':ascii}
+
+def _lookup(parameters,field,missing):
+  # Look up a field with attribute or index access, such as {device.name}
+  # or {ports[0]}
+  try:
+    return _FORMATTER.get_field(field,(),parameters)[0]
+  except (KeyError,IndexError,AttributeError,TypeError,ValueError):
+    return missing
+
+def _format(value,spec,conversion,missing):
+  # Apply the conversion and format of a field, showing the value as it is if
+  # they do not suit it
+  if value is missing:
+    return missing
+  try:
+    if conversion is not None:
+      value = _CONVERSIONS[conversion](value)
+    return format(value,spec)
+  except (KeyError,ValueError,TypeError):
+    return str(value)
+
+def _slowFormat(template,parameters):
+  try:
+    return template.format(**parameters)
+  except (KeyError,IndexError,AttributeError,TypeError,ValueError):
+    return template
+
+def _safeFormat(parts,parameters):
+  # Build the message field by field, for templates whose fields need more
+  # than a dictionary lookup or whose parameters do not suit them
+  pieces = []
+  for literal, field, spec, conversion, placeholder in parts:
+    pieces.append(literal)
+    if field is not None:
+      pieces.append(_format(_lookup(parameters,field,placeholder),spec,
+                            conversion,placeholder))
+  return ''.join(pieces)
+
+def compileTemplate(template):
+  """
+  Compile an english-string template into a function that takes a
+  dictionary of parameters and returns the message.
+  """
+  try:
+    parsed = list(_FORMATTER.parse(template))
+  except (ValueError,TypeError):
+    # An unbalanced brace.  Show the template as it is
+    return lambda parameters: template
+
+  # Each field is renumbered in order, so the message can be built with a
+  # single call to str.format once the parameters have been picked out
+  parts = []
+  fields = []
+  positional = ''
+  simple = True
+  for literal, field, spec, conversion in parsed:
+    positional += literal.replace('{','{{').replace('}','}}')
+    if field is None:
+      parts.append((literal,None,None,None,None))
+      continue
+    if field == '' or field.isdigit() or '{' in spec:
+      # Positional fields and nested formats are rare, and are left to
+      # str.format
+      return functools.partial(_slowFormat,template)
+    suffix = ('!' + conversion if conversion else '') + \
+             (':' + spec if spec else '')
+    parts.append((literal,field,spec,conversion,'{' + field + suffix + '}'))
+    positional += '{' + suffix + '}'
+    fields.append(field)
+    if '.' in field or '[' in field:
+      simple = False
+
+  if not fields:
+    text = ''.join(part[0] for part in parts)
+    return lambda parameters: text
+  if not simple:
+    return functools.partial(_safeFormat,parts)
+
+  build = positional.format
+  if len(fields) == 1:
+    field = fields[0]
+    pick = lambda parameters: (parameters[field],)
+  else:
+    pick = operator.itemgetter(*fields)
+
+  def render(parameters):
+    try:
+      return build(*pick(parameters))
+    except (KeyError,IndexError,AttributeError,TypeError,ValueError):
+      return _safeFormat(parts,parameters)
+  return render
+
+class TemplateCache:
+  """
+  A bounded cache of parsed english-string templates.
+
+  Arguments:
+    maxsize - (Optional) The number of templates to keep.  The least
+              recently used template is discarded when the cache is full.
+              Defaults to 1024.
+  """
+  def __init__(self,maxsize=1024):
+    self.compile = functools.lru_cache(maxsize=maxsize)(compileTemplate)
+
+  def format(self,template,parameters):
+    """Fill a template with a dictionary of parameters."""
+    if not isinstance(template,str):
+      return ''
+    if not isinstance(parameters,dict):
+      parameters = {}
+    return self.compile(template)(parameters)
+
+  def render(self,event):
+    """Return the human readable message for an event."""
+    return self.format(event.get('english-string'),event.get('parameters'))
+
+  def record(self,event):
+    """
+    Return a dictionary holding the type, message and parameters of an
+    event, ready for output as JSON.
+    """
+    return {'type':event.get('type'),
+            'message':self.render(event),
+            'parameters':event.get('parameters') or {}}
+
+  def info(self):
+    """Return the hits, misses and size of the cache."""
+    info = self.compile.cache_info()
+    return {'hits':info.hits,'misses':info.misses,
+            'size':info.currsize,'maxsize':info.maxsize}
+
+# A cache shared by everything in the process
+cache = TemplateCache()
+
+def render(event):
+  """Return the human readable message for an event, using the shared cache."""
+  return cache.render(event)
+
+def record(event):
+  """Return the type, message and parameters of an event, for output as JSON."""
+  return cache.record(event)
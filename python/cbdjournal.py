@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""Durable journal of Cisco Business Dashboard events
+
+Provides the Journal class, which appends the events received from the
+event stream to a directory of segment files so that they can be replayed
+later, for example after a consumer restarts.  Events are collected into
+blocks, and each block is compressed and written to the current segment
+with a small header recording its length, checksum, time range and the
+event types it contains.  The same details are kept for each block in an
+index file beside the segment, so replaying a time range or a set of event
+types reads and decompresses only the blocks that could hold matching
+events.  Segments are read through memory maps rather than by copying them
+into memory.
+
+A new segment is started when the current one reaches a size or age limit,
+and whole segments are deleted once they fall outside the retention period
+or the journal exceeds its size limit.  Segments are named after the number
+of the first event they hold, so they sort in the order they were written.
+If the journal was not closed cleanly, any incomplete block at the end of
+the last segment is discarded before the journal is next written.
+
+Typical usage:
+
+  import cbdevents
+  import cbdjournal
+
+  with cbdjournal.Journal('events') as journal:
+    for event in cbdevents.EventStream(client,heartbeats=False):
+      journal.append(event)
+
+  for received, event in cbdjournal.Journal('events').replay(types=['event']):
+    print(received,event['english-string'].format(**event['parameters']))
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import threading
+
+import cbdevents
+
+# The header written before each compressed block: the compressed length,
+# the number of events, the CRC32 of the compressed data, the times the first
+# and last events were received, and a bit mask of the event types present
+BLOCK = struct.Struct('<IIIddI')
+
+# Each index entry is the offset of a block in its segment followed by a
+# copy of the block header
+INDEX = struct.Struct('<Q' + BLOCK.format[1:])
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+# Bit set in the type mask of a block for events of an unlisted type
+OTHER_TYPES = 1 << 31
+
+def typeMask(types):
+  """Return the bit mask for a collection of event types."""
+  mask = 0
+  for type in types:
+    if type in cbdevents.EVENT_TYPES:
+      mask |= 1 << cbdevents.EVENT_TYPES.index(type)
+    else:
+      mask |= OTHER_TYPES
+  return mask
+
+class Segment:
+  """
+  A single segment file and its index.
+
+  Arguments:
+    path  - The path of the segment file
+    first - The number of the first event in the segment
+  """
+  def __init__(self,path,first):
+    self.path = path
+    self.indexpath = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+    self.first = first
+
+  def size(self):
+    return os.path.getsize(self.path)
+
+  def entries(self):
+    """
+    Return the index entries for the segment as (offset, length, count, crc,
+    firsttime, lasttime, mask) tuples.  If the index does not cover the whole
+    segment, the entries are found by scanning the segment instead.
+    """
+    try:
+      with open(self.indexpath,'rb') as f:
+        data = f.read()
+    except FileNotFoundError:
+      data = b''
+    entries = [INDEX.unpack_from(data,offset) for offset in
+               range(0,len(data) - INDEX.size + 1,INDEX.size)]
+    end = entries[-1][0] + BLOCK.size + entries[-1][1] if entries else 0
+    if end != self.size():
+      entries = self.scan()[0]
+    return entries
+
+  def scan(self):
+    """
+    Read the block headers from the segment itself, stopping at the first
+    incomplete or damaged block.  Returns the index entries and the length
+    of the valid part of the segment.
+    """
+    entries = []
+    offset = 0
+    with open(self.path,'rb') as f:
+      data = f.read()
+    while offset + BLOCK.size <= len(data):
+      header = BLOCK.unpack_from(data,offset)
+      start = offset + BLOCK.size
+      compressed = data[start:start + header[0]]
+      if len(compressed) != header[0] or zlib.crc32(compressed) != header[2]:
+        break
+      entries.append((offset,) + header)
+      offset = start + header[0]
+    return entries, offset
+
+  def rebuild(self):
+    """
+    Discard any incomplete or damaged block at the end of the segment and
+    rewrite the index.  Returns the index entries.  Must not be used while
+    the segment is being written.
+    """
+    entries, length = self.scan()
+    if length != self.size():
+      with open(self.path,'r+b') as f:
+        f.truncate(length)
+    with open(self.indexpath,'wb') as f:
+      f.write(b''.join(INDEX.pack(*entry) for entry in entries))
+    return entries
+
+  def read(self,start=None,end=None,types=None):
+    """
+    Yield (received, event) for each event in the segment received between
+    start and end and of one of the given types.  Blocks that cannot hold a
+    matching event are skipped without being read.
+    """
+    mask = typeMask(types) if types else None
+    entries = [entry for entry in self.entries()
+               if (start is None or entry[5] >= start) and
+                  (end is None or entry[4] <= end) and
+                  (mask is None or entry[6] & mask)]
+    if not entries:
+      return
+
+    with open(self.path,'rb') as f:
+      with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as view:
+        for offset, length, count, crc, first, last, blockmask in entries:
+          data = offset + BLOCK.size
+          block = zlib.decompress(view[data:data + length])
+          for line in block.splitlines():
+            received, event = json.loads(line)
+            if start is not None and received < start:
+              continue
+            if end is not None and received > end:
+              continue
+            if types and event.get('type') not in types:
+              continue
+            yield received, event
+
+  def delete(self):
+    for path in (self.path,self.indexpath):
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+
+class Journal:
+  """
+  An append-only journal of events held in a directory of compressed
+  segment files.  A journal is a callable taking an event, so it may be used
+  as a cbdpipeline handler.
+
+  Arguments:
+    directory     - The directory holding the segments.  Created if it does
+                    not exist.
+    blocksize     - (Optional) The number of events compressed together in a
+                    block.  Defaults to 500.
+    flushinterval - (Optional) The longest time in seconds an event is held
+                    in memory before its block is written.  Defaults to 1.
+    segmentsize   - (Optional) The size in bytes at which a new segment is
+                    started.  Defaults to 64MB.
+    segmentage    - (Optional) The age in seconds at which a new segment is
+                    started.  Defaults to one day.
+    retention     - (Optional) Delete segments whose newest event is older
+                    than this many seconds.  Defaults to None (keep all).
+    maxbytes      - (Optional) Delete the oldest segments while the journal
+                    is larger than this.  Defaults to None (no limit).
+    level         - (Optional) The zlib compression level.  Defaults to 6.
+  """
+  name = 'journal'
+
+  def __init__(self,directory,blocksize=500,flushinterval=1,
+               segmentsize=64*1024*1024,segmentage=86400,retention=None,
+               maxbytes=None,level=6):
+    self.directory = directory
+    self.blocksize = blocksize
+    self.flushinterval = flushinterval
+    self.segmentsize = segmentsize
+    self.segmentage = segmentage
+    self.retention = retention
+    self.maxbytes = maxbytes
+    self.level = level
+    self._lock = threading.Lock()
+    self.pending = []
+    self.timer = None
+    self.file = None
+    self.index = None
+    self.opened = None
+    self.next = None
+    os.makedirs(directory,exist_ok=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*args):
+    self.close()
+
+  def segments(self):
+    """Return the segments in the journal, oldest first."""
+    segments = []
+    for name in os.listdir(self.directory):
+      if name.endswith(SEGMENT_SUFFIX):
+        first = name[:-len(SEGMENT_SUFFIX)]
+        if first.isdigit():
+          segments.append(Segment(os.path.join(self.directory,name),
+                                  int(first)))
+    return sorted(segments,key=lambda segment: segment.first)
+
+  def append(self,event,received=None):
+    """
+    Add an event to the journal, with the time it was received.  Heartbeats
+    are not recorded.
+    """
+    if event.get('type') == cbdevents.HEARTBEAT:
+      return
+    if received is None:
+      received = time.time()
+    line = json.dumps([received,event],separators=(',',':'))
+    with self._lock:
+      if not self.pending:
+        # Make sure the block is written even if no more events arrive
+        self.timer = threading.Timer(self.flushinterval,self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+      self.pending.append((received,event.get('type'),line))
+      if len(self.pending) >= self.blocksize:
+        self._write()
+
+  __call__ = append
+
+  def flush(self):
+    """Write any events held in memory to the current segment."""
+    with self._lock:
+      self._write()
+
+  def _write(self):
+    if self.timer is not None:
+      self.timer.cancel()
+      self.timer = None
+    if not self.pending:
+      return
+    if self.next is None:
+      # Recover the last segment before writing for the first time, so that
+      # events are numbered on from it.  A journal that is only replayed
+      # never modifies the segments, so it may be read while another process
+      # is writing
+      segments = self.segments()
+      self.next = 0
+      if segments:
+        last = segments[-1]
+        self.next = last.first + sum(entry[2] for entry in last.rebuild())
+    if self.file is None or self._full():
+      self._rotate()
+
+    data = zlib.compress('\n'.join(line for received, type, line
+                                   in self.pending).encode('UTF-8'),
+                         self.level)
+    header = (len(data),len(self.pending),zlib.crc32(data),
+              self.pending[0][0],self.pending[-1][0],
+              typeMask({type for received, type, line in self.pending}))
+    offset = self.file.tell()
+    self.file.write(BLOCK.pack(*header) + data)
+    self.file.flush()
+    self.index.write(INDEX.pack(offset,*header))
+    self.index.flush()
+    self.next += len(self.pending)
+    self.pending = []
+
+  def _full(self):
+    return (self.file.tell() >= self.segmentsize or
+            time.time() - self.opened >= self.segmentage)
+
+  def _rotate(self):
+    # Close the current segment and start a new one, then apply the
+    # retention limits to the segments that are no longer being written
+    self._closeFiles()
+    path = os.path.join(self.directory,'{:016d}{}'.format(self.next,
+                                                          SEGMENT_SUFFIX))
+    segment = Segment(path,self.next)
+    self.file = open(segment.path,'ab')
+    self.index = open(segment.indexpath,'ab')
+    self.opened = time.time()
+    self._compact(segment)
+
+  def _compact(self,current=None):
+    segments = [segment for segment in self.segments()
+                if current is None or segment.path != current.path]
+    removed = 0
+    if self.retention is not None:
+      cutoff = time.time() - self.retention
+      for segment in list(segments):
+        entries = segment.entries()
+        if not entries or entries[-1][5] < cutoff:
+          segment.delete()
+          segments.remove(segment)
+          removed += 1
+    if self.maxbytes is not None:
+      total = sum(segment.size() for segment in segments)
+      if current is not None:
+        total += current.size()
+      while segments and total > self.maxbytes:
+        segment = segments.pop(0)
+        total -= segment.size()
+        segment.delete()
+        removed += 1
+    return removed
+
+  def compact(self):
+    """
+    Delete the segments that fall outside the retention limits, and return
+    the number deleted.  The segment being written is never deleted.
+    """
+    with self._lock:
+      current = None
+      if self.file is not None:
+        current = Segment(self.file.name,0)
+      return self._compact(current)
+
+  def replay(self,start=None,end=None,types=None):
+    """
+    Yield (received, event) for each event in the journal, oldest first.
+
+    Arguments:
+      start - (Optional) Only events received at or after this time, in
+              seconds since the epoch
+      end   - (Optional) Only events received at or before this time
+      types - (Optional) A list of the event types to replay
+    """
+    self.flush()
+    for segment in self.segments():
+      for item in segment.read(start,end,types):
+        yield item
+
+  def _closeFiles(self):
+    if self.file is not None:
+      self.file.close()
+      self.index.close()
+      self.file = self.index = None
+
+  def close(self):
+    """Write any events held in memory and close the current segment."""
+    with self._lock:
+      self._write()
+      self._closeFiles()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Streaming decoding and output of Cisco Business Dashboard list responses
+
+The list APIs return a JSON object holding a data array of records and
+details of the paging.  Decoding a large response with response.json() and
+then formatting it with json.dumps holds the raw payload, the decoded
+objects and the formatted output in memory at once.  This module instead
+decodes the records one at a time as the payload arrives, and writes each
+record out as soon as it is decoded, so the memory used does not depend on
+the size of the list.
+
+The DataParser class decodes the records of the data array from a payload
+delivered in chunks of any size, and keeps the other members of the object,
+such as paging, in its meta attribute.  Client.iterateStream in cbdclient
+uses it to walk a list without decoding whole pages.
+
+The writers output records as they are given them:
+
+  JsonWriter      - the same indented JSON object as json.dumps({'data':
+                    records},indent=2)
+  JsonLinesWriter - one line of JSON per record
+  CsvWriter       - one row per record, with a column per field path such
+                    as /system-state/hostname
+
+Typical usage:
+
+  import sys
+  import cbdclient
+  import cbdjson
+
+  with cbdclient.Client.fromEnvironment() as client:
+    writer = cbdjson.makeWriter('csv',sys.stdout)
+    for node in client.iterateStream('/api/v2/nodes'):
+      writer.write(node)
+    writer.close()
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import csv
+import json
+import codecs
+
+# The output formats supported by makeWriter
+FORMATS = ('json','jsonl','csv')
+
+_WHITESPACE = ' \t\r\n'
+_TERMINATORS = _WHITESPACE + ',]}'
+
+# Parser states
+_START = 'start'
+_KEY = 'key'
+_COLON = 'colon'
+_VALUE = 'value'
+_NEXT = 'next'
+_ITEM = 'item'
+_ITEMNEXT = 'itemnext'
+_END = 'end'
+
+class DataParser:
+  """
+  An incremental parser for a list response.  Pass each chunk of bytes
+  received to feed, which returns the records of the data array completed
+  by that chunk.  Call feed with final set once the payload is complete.
+
+  Arguments:
+    key - (Optional) The member holding the array of records.  Defaults to
+          data.
+  """
+  def __init__(self,key='data'):
+    self.key = key
+    self.meta = {}
+    self.buffer = ''
+    self.position = 0
+    self.state = _START
+    self.member = None
+    self.decoder = json.JSONDecoder()
+    self.utf8 = codecs.getincrementaldecoder('UTF-8')()
+
+  def _next(self):
+    # Skip whitespace and return the next character, or None if more data is
+    # needed
+    buffer = self.buffer
+    position = self.position
+    while position < len(buffer) and buffer[position] in _WHITESPACE:
+      position += 1
+    self.position = position
+    return buffer[position] if position < len(buffer) else None
+
+  def _decode(self,final):
+    # Decode the value at the current position.  Returns (True, value), or
+    # (False, None) if the value is not yet complete
+    try:
+      value, end = self.decoder.raw_decode(self.buffer,self.position)
+    except json.JSONDecodeError:
+      if final:
+        raise
+      return False, None
+    if not final and not isinstance(value,(dict,list,str)):
+      # A number is only complete once the character after it has arrived,
+      # as it may continue in the next chunk
+      if end == len(self.buffer) or self.buffer[end] not in _TERMINATORS:
+        return False, None
+    self.position = end
+    return True, value
+
+  def feed(self,chunk,final=False):
+    """
+    Add a chunk of bytes to the buffer and return a list of the records it
+    completed.
+    """
+    self.buffer += self.utf8.decode(chunk,final)
+    records = []
+    while True:
+      char = self._next()
+      if char is None:
+        break
+
+      if self.state == _START:
+        if char != '{':
+          raise ValueError('The response is not a JSON object')
+        self.position += 1
+        self.state = _KEY
+      elif self.state == _KEY:
+        if char == '}':
+          self.position += 1
+          self.state = _END
+          continue
+        complete, self.member = self._decode(final)
+        if not complete:
+          break
+        if not isinstance(self.member,str):
+          raise ValueError('Invalid member name in the response')
+        self.state = _COLON
+      elif self.state == _COLON:
+        if char != ':':
+          raise ValueError('Expected : after {}'.format(self.member))
+        self.position += 1
+        self.state = _VALUE
+      elif self.state == _VALUE:
+        if self.member == self.key and char == '[':
+          # Decode the records one at a time rather than the whole array
+          self.position += 1
+          self.state = _ITEM
+          self.first = True
+          continue
+        complete, value = self._decode(final)
+        if not complete:
+          break
+        self.meta[self.member] = value
+        self.state = _NEXT
+      elif self.state == _NEXT:
+        if char not in ',}':
+          raise ValueError('Expected , or }} after {}'.format(self.member))
+        self.position += 1
+        self.state = _KEY if char == ',' else _END
+      elif self.state == _ITEM:
+        if char == ']' and self.first:
+          self.position += 1
+          self.state = _NEXT
+          continue
+        complete, record = self._decode(final)
+        if not complete:
+          break
+        records.append(record)
+        self.first = False
+        self.state = _ITEMNEXT
+      elif self.state == _ITEMNEXT:
+        if char not in ',]':
+          raise ValueError('Expected , or ] in {}'.format(self.key))
+        self.position += 1
+        self.state = _ITEM if char == ',' else _NEXT
+      else:
+        raise ValueError('Unexpected data after the end of the response')
+
+    if final and self.state != _END:
+      raise ValueError('The response ended unexpectedly')
+
+    # Discard the part of the buffer already decoded
+    self.buffer = self.buffer[self.position:]
+    self.position = 0
+    return records
+
+def iterData(chunks,key='data',parser=None):
+  """
+  Parse an iterable of byte chunks, such as the result of
+  requests.Response.iter_content(), and yield each record of the data array.
+  Pass a DataParser to read the other members of the response afterwards.
+  """
+  if parser is None:
+    parser = DataParser(key)
+  for chunk in chunks:
+    for record in parser.feed(chunk):
+      yield record
+  for record in parser.feed(b'',final=True):
+    yield record
+
+def flatten(record,prefix=''):
+  """
+  Flatten a nested record into a dictionary keyed by field path, for example
+  {'/system-state/hostname': 'switch1'}.
+  """
+  flat = {}
+  for key, value in record.items():
+    path = prefix + '/' + key
+    if isinstance(value,dict):
+      flat.update(flatten(value,path))
+    else:
+      flat[path] = value
+  return flat
+
+class JsonWriter:
+  """
+  Write records as a JSON object with a data array, formatted exactly as
+  json.dumps({'data':records},indent=2) would format it.
+
+  Arguments:
+    file - The file to write to
+  """
+  def __init__(self,file):
+    self.file = file
+    self.count = 0
+
+  def write(self,record):
+    text = json.dumps(record,indent=2).replace('\n','\n    ')
+    self.file.write(('{\n  "data": [\n    ' if not self.count else ',\n    ')
+                    + text)
+    self.count += 1
+
+  def close(self):
+    self.file.write('{\n  "data": []\n}\n' if not self.count else
+                    '\n  ]\n}\n')
+
+class JsonLinesWriter:
+  """
+  Write each record as a line of JSON.
+
+  Arguments:
+    file - The file to write to
+  """
+  def __init__(self,file):
+    self.file = file
+    self.count = 0
+
+  def write(self,record):
+    self.file.write(json.dumps(record) + '\n')
+    self.count += 1
+
+  def close(self):
+    pass
+
+class CsvWriter:
+  """
+  Write each record as a row of CSV, with a column for each field path.
+
+  Arguments:
+    file    - The file to write to
+    columns - (Optional) A list of field paths to output, such as
+              /system-state/hostname.  Defaults to the fields of the first
+              record.  Fields missing from a record are left empty.
+  """
+  def __init__(self,file,columns=None):
+    self.file = file
+    self.columns = columns
+    self.writer = None
+    self.count = 0
+
+  def write(self,record):
+    flat = flatten(record)
+    if self.writer is None:
+      if self.columns is None:
+        self.columns = list(flat)
+      self.writer = csv.DictWriter(self.file,self.columns,
+                                   extrasaction='ignore')
+      self.writer.writeheader()
+    self.writer.writerow({path:json.dumps(value)
+                          if isinstance(value,list) else value
+                          for path, value in flat.items()})
+    self.count += 1
+
+  def close(self):
+    if self.writer is None and self.columns is not None:
+      csv.writer(self.file).writerow(self.columns)
+
+def makeWriter(format,file,columns=None):
+  """
+  Return a writer for one of the formats json, jsonl or csv.  The columns are
+  only used for CSV.
+  """
+  if format == 'json':
+    return JsonWriter(file)
+  if format == 'jsonl':
+    return JsonLinesWriter(file)
+  if format == 'csv':
+    return CsvWriter(file,columns)
+  raise ValueError('Unknown output format {}'.format(format))
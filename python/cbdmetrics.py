@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""Per-endpoint instrumentation of Cisco Business Dashboard API requests
+
+Provides the Metrics class, which records for each API endpoint how long
+requests spend in each phase, the status codes returned, the bytes sent and
+received and the number of retries.  Pass a Metrics object to
+cbdclient.Client to record every request the client sends:
+
+  import cbdclient
+  import cbdmetrics
+
+  metrics = cbdmetrics.Metrics()
+  with cbdclient.Client.fromEnvironment(metrics=metrics) as client:
+    nodes = list(client.iterate('/api/v2/nodes'))
+  print(metrics.openmetrics())
+
+Endpoints are named by method and path, with IDs in the path replaced by
+{id}, for example GET /api/v2/jobs/{id}.  The phases timed are:
+
+  connect  - opening the TCP connection and the TLS handshake, for requests
+             that needed a new connection
+  token    - obtaining the JWT, which is only slow when it is renewed
+  ttfb     - from sending the request to receiving the response headers,
+             less any connect time
+  download - reading the response payload
+  decode   - parsing the JSON payload
+  total    - the whole request, not including decode
+
+The payload of a streamed response is read and decoded by the caller, so
+only the phases up to the response headers are recorded when the response
+arrives.  Callers that read the whole payload, such as
+cbdclient.Client.iterateStream, time it with a StreamTiming and record the
+download and decode phases, the total and the bytes actually read with
+Metrics.streamed.  Event source streams never end and are timed only up to
+the response headers.  Clients created without a Metrics object perform none
+of this work.
+
+The metrics may be exported in the OpenMetrics text format used by
+Prometheus, from a local HTTP endpoint with MetricsServer, or written to a
+JSON file at regular intervals with MetricsDump.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import re
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+import collections
+import http.server
+
+import requests.adapters
+import urllib3.connection
+
+# The upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0,
+           30.0,float('inf'))
+
+# API paths take the form /api/v2/collection/id/collection/id..., except
+# that these segments are followed by the name of a collection or operation
+# rather than an ID, as in /api/v2/pnp/devices and
+# /api/v2/nodes/operations/reboot
+_API = re.compile(r'^api/v\d+$')
+_GROUPS = ('pnp','operations')
+
+# The time spent connecting by the request being sent on each thread
+_local = threading.local()
+
+@functools.lru_cache(maxsize=1024)
+def endpoint(method,path):
+  """
+  Return the name of the endpoint for a request, for example
+  GET /api/v2/jobs/{id}.  Every ID in the path is replaced, whatever its
+  form, so the number of endpoints is bounded by the API rather than by the
+  number of devices or jobs.  Outside the API, as in /controller/xl/{id},
+  everything after the first two segments is taken to be an ID.
+  """
+  parts = path.split('?')[0].strip('/').split('/')
+  names = parts[:2]
+  if _API.match('/'.join(names)):
+    isid = False
+    for part in parts[2:]:
+      if part in _GROUPS:
+        names.append(part)
+        isid = False
+      elif isid:
+        names.append('{id}')
+        isid = False
+      else:
+        names.append(part)
+        isid = True
+  else:
+    names.extend('{id}' for part in parts[2:])
+  return '{} /{}'.format(method.upper(),'/'.join(names))
+
+class Histogram:
+  """
+  A histogram of durations with fixed buckets.  Not thread safe on its own;
+  Metrics serialises access.
+
+  Arguments:
+    buckets - (Optional) The upper bounds of the buckets, ending with
+              infinity.  Defaults to BUCKETS.
+  """
+  def __init__(self,buckets=BUCKETS):
+    self.buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self,value):
+    self.counts[bisect.bisect_left(self.buckets,value)] += 1
+    self.count += 1
+    self.sum += value
+
+  def quantile(self,q):
+    """
+    Estimate a quantile, interpolating within the bucket that holds it.
+    Returns None if nothing has been observed.
+    """
+    if not self.count:
+      return None
+    rank = q * self.count
+    seen = 0
+    for index, count in enumerate(self.counts):
+      if count and seen + count >= rank:
+        lower = self.buckets[index - 1] if index else 0.0
+        upper = self.buckets[index]
+        if upper == float('inf'):
+          return lower
+        return lower + (upper - lower) * (rank - seen) / count
+      seen += count
+    return self.buckets[-2]
+
+  def snapshot(self):
+    return {'count':self.count,'sum':self.sum,
+            'mean':self.sum / self.count if self.count else None,
+            'p50':self.quantile(0.5),'p90':self.quantile(0.9),
+            'p99':self.quantile(0.99),
+            'buckets':{_le(bound):count for bound, count in
+                       zip(self.buckets,self.cumulative())}}
+
+  def cumulative(self):
+    total = 0
+    for count in self.counts:
+      total += count
+      yield total
+
+def _le(bound):
+  return '+Inf' if bound == float('inf') else repr(bound)
+
+def _label(value):
+  return str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+
+class Metrics:
+  """
+  The request metrics of one or more clients, by endpoint.  A single object
+  may be shared by many clients and threads.
+
+  Arguments:
+    buckets - (Optional) The upper bounds of the latency histogram buckets.
+              Defaults to BUCKETS.
+  """
+  def __init__(self,buckets=BUCKETS):
+    self.buckets = buckets
+    self.started = time.time()
+    self.histograms = {}
+    self.responses = collections.Counter()
+    self.bytes = collections.Counter()
+    self.retries = collections.Counter()
+    self.errors = collections.Counter()
+    self._lock = threading.Lock()
+
+  def observe(self,endpoint,phase,seconds):
+    """Record the time taken by a phase of a request to an endpoint."""
+    with self._lock:
+      histogram = self.histograms.get((endpoint,phase))
+      if histogram is None:
+        histogram = self.histograms[(endpoint,phase)] = Histogram(self.buckets)
+      histogram.observe(seconds)
+
+  def response(self,endpoint,response,total,connect=0.0,token=0.0,
+               streamed=False):
+    """
+    Record a response received from an endpoint.
+
+    Arguments:
+      endpoint - The name of the endpoint
+      response - The requests.Response
+      total    - The number of seconds the request took, including
+                 obtaining the JWT
+      connect  - (Optional) The number of seconds spent connecting
+      token    - (Optional) The number of seconds spent obtaining the JWT
+      streamed - (Optional) Whether the payload is still to be read.  Only
+                 the phases up to the response headers are recorded, and
+                 the payload is recorded by streamed once it has been read.
+    """
+    headers = response.elapsed.total_seconds()
+    request = response.request
+    sent = len(request.body) if request is not None and request.body else 0
+    received = 0 if streamed else len(response.content or b'')
+
+    with self._lock:
+      self.responses[(endpoint,str(response.status_code))] += 1
+      self.bytes[(endpoint,'sent')] += sent
+      self.bytes[(endpoint,'received')] += received
+    if connect:
+      self.observe(endpoint,'connect',connect)
+    self.observe(endpoint,'token',token)
+    self.observe(endpoint,'ttfb',max(headers - connect,0.0))
+    if not streamed:
+      self.observe(endpoint,'download',max(total - token - headers,0.0))
+      self.observe(endpoint,'total',total)
+
+  def streamed(self,endpoint,response,timing):
+    """
+    Record the payload of a streamed response once it has been read.
+
+    Arguments:
+      endpoint - The name of the endpoint
+      response - The requests.Response, as passed to response
+      timing   - The StreamTiming that timed reading the payload
+    """
+    with self._lock:
+      self.bytes[(endpoint,'received')] += timing.received
+    self.observe(endpoint,'download',timing.download)
+    self.observe(endpoint,'decode',timing.decode)
+    self.observe(endpoint,'total',response.elapsed.total_seconds() +
+                 timing.download)
+
+  def retry(self,endpoint,reason):
+    """Record that a request to an endpoint was retried, and why."""
+    with self._lock:
+      self.retries[(endpoint,str(reason))] += 1
+
+  def error(self,endpoint,error):
+    """Record a request that failed without a response."""
+    with self._lock:
+      self.errors[(endpoint,type(error).__name__)] += 1
+
+  def snapshot(self):
+    """Return the metrics as a dictionary, ready for output as JSON."""
+    endpoints = collections.defaultdict(lambda: {'responses':{},'bytes':{},
+                                                 'retries':{},'errors':{},
+                                                 'latency':{}})
+    with self._lock:
+      for (name, code), count in self.responses.items():
+        endpoints[name]['responses'][code] = count
+      for (name, direction), count in self.bytes.items():
+        endpoints[name]['bytes'][direction] = count
+      for (name, reason), count in self.retries.items():
+        endpoints[name]['retries'][reason] = count
+      for (name, kind), count in self.errors.items():
+        endpoints[name]['errors'][kind] = count
+      for (name, phase), histogram in self.histograms.items():
+        endpoints[name]['latency'][phase] = histogram.snapshot()
+    return {'started':self.started,'time':time.time(),
+            'endpoints':dict(sorted(endpoints.items()))}
+
+  def openmetrics(self):
+    """Return the metrics in the OpenMetrics text format."""
+    lines = []
+    with self._lock:
+      lines += ['# TYPE cbd_request_seconds histogram',
+                '# UNIT cbd_request_seconds seconds',
+                '# HELP cbd_request_seconds Time spent in each phase of '
+                'Dashboard API requests.']
+      for (name, phase), histogram in sorted(self.histograms.items()):
+        labels = 'endpoint="{}",phase="{}"'.format(_label(name),phase)
+        for bound, count in zip(histogram.buckets,histogram.cumulative()):
+          lines.append('cbd_request_seconds_bucket{{{},le="{}"}} {}'.format(
+                       labels,_le(bound),count))
+        lines.append('cbd_request_seconds_count{{{}}} {}'.format(
+                     labels,histogram.count))
+        lines.append('cbd_request_seconds_sum{{{}}} {!r}'.format(
+                     labels,histogram.sum))
+
+      for family, help, counter, label in [
+          ('cbd_responses','Responses received by status code.',
+           self.responses,'code'),
+          ('cbd_bytes','Bytes of payload sent and received.',self.bytes,
+           'direction'),
+          ('cbd_retries','Requests retried, by reason.',self.retries,
+           'reason'),
+          ('cbd_errors','Requests that failed without a response.',
+           self.errors,'error')]:
+        lines += ['# TYPE {} counter'.format(family),
+                  '# HELP {} {}'.format(family,help)]
+        for (name, value), count in sorted(counter.items()):
+          lines.append('{}_total{{endpoint="{}",{}="{}"}} {}'.format(
+                       family,_label(name),label,_label(value),count))
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+class StreamTiming:
+  """
+  Time reading a streamed response payload and decoding it as it arrives,
+  and count the bytes read.  Pass the chunks of the payload through read,
+  and the records decoded from them through records.  Time the caller spends
+  between records is not counted.
+
+  Attributes:
+    received - The number of bytes read
+    download - The number of seconds spent waiting for chunks
+    elapsed  - The number of seconds spent reading and decoding
+  """
+  def __init__(self):
+    self.received = 0
+    self.download = 0.0
+    self.elapsed = 0.0
+
+  @property
+  def decode(self):
+    """The number of seconds spent decoding."""
+    return max(self.elapsed - self.download,0.0)
+
+  def read(self,chunks):
+    """Yield each chunk of bytes, timing the wait for it."""
+    chunks = iter(chunks)
+    while True:
+      started = time.perf_counter()
+      chunk = next(chunks,None)
+      self.download += time.perf_counter() - started
+      if chunk is None:
+        return
+      self.received += len(chunk)
+      yield chunk
+
+  def records(self,records):
+    """Yield each decoded record, timing the reading and decoding of it."""
+    records = iter(records)
+    end = object()
+    while True:
+      started = time.perf_counter()
+      record = next(records,end)
+      self.elapsed += time.perf_counter() - started
+      if record is end:
+        return
+      yield record
+
+def startRequest():
+  """Reset the connect time of the request about to be sent on this thread."""
+  _local.connect = 0.0
+
+def connectTime():
+  """Return the time spent connecting by the last request on this thread."""
+  return getattr(_local,'connect',0.0)
+
+class _TimedConnection(urllib3.connection.HTTPSConnection):
+  # Note the time spent opening each connection, including the TLS
+  # handshake
+  def connect(self):
+    started = time.perf_counter()
+    try:
+      super().connect()
+    finally:
+      _local.connect = getattr(_local,'connect',0.0) + \
+                       time.perf_counter() - started
+
+class _TimedPool(urllib3.HTTPSConnectionPool):
+  ConnectionCls = _TimedConnection
+
+class TimedAdapter(requests.adapters.HTTPAdapter):
+  """
+  An HTTPAdapter whose HTTPS connections record the time taken to connect,
+  available from connectTime.  Used by cbdclient.Client when it is given a
+  Metrics object.
+  """
+  def init_poolmanager(self,*args,**kwargs):
+    super().init_poolmanager(*args,**kwargs)
+    self.poolmanager.pool_classes_by_scheme = dict(
+      self.poolmanager.pool_classes_by_scheme,https=_TimedPool)
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+  # Serve the metrics in the OpenMetrics format at /metrics, and as JSON at
+  # /metrics.json
+  def log_message(self,format,*args):
+    pass
+
+  def do_GET(self):
+    metrics = self.server.metrics
+    if self.path == '/metrics':
+      body = metrics.openmetrics().encode('UTF-8')
+      type = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+    elif self.path == '/metrics.json':
+      body = json.dumps(metrics.snapshot(),indent=2).encode('UTF-8')
+      type = 'application/json'
+    else:
+      self.send_error(404)
+      return
+    self.send_response(200)
+    self.send_header('Content-Type',type)
+    self.send_header('Content-Length',str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+class MetricsServer:
+  """
+  Serve metrics over HTTP for collection by Prometheus or similar, at
+  /metrics in the OpenMetrics text format and at /metrics.json as JSON.
+
+  Arguments:
+    metrics - The Metrics to serve
+    host    - (Optional) The address to listen on.  Defaults to 127.0.0.1.
+    port    - (Optional) The port to listen on.  Defaults to 9464.
+  """
+  def __init__(self,metrics,host='127.0.0.1',port=9464):
+    self.server = http.server.ThreadingHTTPServer((host,port),_Handler)
+    self.server.daemon_threads = True
+    self.server.metrics = metrics
+    self.thread = threading.Thread(target=self.server.serve_forever,
+                                   daemon=True)
+    self.thread.start()
+
+  @property
+  def address(self):
+    """The (host, port) the server is listening on."""
+    return self.server.server_address[:2]
+
+  def close(self):
+    """Stop serving metrics."""
+    self.server.shutdown()
+    self.server.server_close()
+
+class MetricsDump:
+  """
+  Write a JSON snapshot of the metrics to a file at regular intervals, and
+  once more when closed.  The file is replaced in one step, so a reader
+  never sees a partly written snapshot.
+
+  Arguments:
+    metrics  - The Metrics to write
+    path     - The file to write
+    interval - (Optional) The number of seconds between writes.  Defaults
+               to 10.
+  """
+  def __init__(self,metrics,path,interval=10):
+    self.metrics = metrics
+    self.path = path
+    self.interval = interval
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self._run,daemon=True)
+    self.thread.start()
+
+  def _run(self):
+    while not self.stopped.wait(self.interval):
+      self.write()
+
+  def write(self):
+    """Write the current snapshot."""
+    with open(self.path + '.tmp','w') as file:
+      json.dump(self.metrics.snapshot(),file,indent=2)
+    os.replace(self.path + '.tmp',self.path)
+
+  def close(self):
+    """Stop writing at intervals and write the final snapshot."""
+    self.stopped.set()
+    self.thread.join()
+    self.write()
+
+class Exporter:
+  """
+  Export metrics in the ways chosen on a script's command line, doing nothing
+  if neither is given.  May be used as a context manager, which closes the
+  exporter on exit.
+
+  Arguments:
+    metrics - The Metrics to export
+    path    - (Optional) A file to write JSON snapshots to
+    port    - (Optional) A local port to serve OpenMetrics on
+  """
+  def __init__(self,metrics,path=None,port=None):
+    self.dump = MetricsDump(metrics,path) if path else None
+    self.server = MetricsServer(metrics,port=port) if port else None
+
+  def close(self):
+    """Write the final snapshot and stop serving metrics."""
+    if self.dump is not None:
+      self.dump.close()
+    if self.server is not None:
+      self.server.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
@@ -0,0 +1,830 @@
+#!/usr/bin/env python3
+"""A local stand-in for Cisco Business Dashboard
+
+Provides the MockDashboard class, which serves the parts of version 2 of the
+Dashboard API used by the sample scripts and the Postman collection from a
+synthetic inventory, so that every sample can be run, measured and tested
+without a real Dashboard.  Requests must carry a JWT generated by cbdauth
+with one of the access keys given to the mock, exactly as for a real
+Dashboard.
+
+The following are implemented:
+
+  GET  /api/v2/orgs, /api/v2/networks, /api/v2/nodes, /api/v2/groups
+  GET  /api/v2/pnp/images, /api/v2/pnp/configs, /api/v2/pnp/devices
+  POST /api/v2/networks, /api/v2/pnp/devices
+  POST /api/v2/nodes/operations/{operation}, GET /api/v2/jobs/{id}
+  POST /api/v2/subscription, GET /api/v2/event-source
+  GET  /controller/xl/{id}?token=JWT
+
+Lists are paged with offset and limit, and honour the fields, search, type
+and id parameters and the x-ctx-org-id header.  Jobs started by operations
+run for a fixed time and then succeed, and rebooted devices are unreachable
+while their job runs.  The event source sends synthetic events at a steady
+rate with periodic heartbeats, and resumes from the Last-Event-ID header.
+
+Latency and errors may be added to every API request to see how clients
+behave against a slow or failing Dashboard.  These settings and the event
+rate may be changed while the mock is running by posting a JSON object to
+/mock/config, and the number of requests served is available from
+/mock/stats.  Neither needs a JWT.
+
+The mock serves HTTPS, as the sample scripts expect.  Unless a certificate
+is given, a self-signed certificate for localhost is created with the
+openssl command.  Typical usage:
+
+  import cbdclient
+  import cbdmock
+
+  with cbdmock.MockDashboard(port=0,nodes=5000) as mock:
+    with cbdclient.Client.fromEnvironment(mock.environment()) as client:
+      print(len(list(client.iterate('/api/v2/nodes'))))
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import re
+import ssl
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import tempfile
+import threading
+import subprocess
+import collections
+import urllib.parse
+import http.server
+
+import jwt
+
+import cbdevents
+import cbdquery
+
+# The access key accepted when none are given
+DEFAULT_KEYID = 'mock-key'
+DEFAULT_SECRET = 'mock-secret'
+
+# The audience claim every JWT must carry
+AUDIENCE = 'business-dashboard.cisco.com'
+
+# The number of records returned when a list request gives no limit
+DEFAULT_LIMIT = 20
+
+# The device types generated, and those included in the Device type filter
+NODE_KINDS = ['Switch','Router','WAP','IpPhone','IpCamera','NAS']
+DEVICE_KINDS = ('Router','Switch','WAP')
+
+# The events generated by the event source, as (type, severity,
+# english-string) tuples
+EVENT_TEMPLATES = [
+  ('event','major','Port {port} on {device} went down'),
+  ('event','info','Port {port} on {device} came up'),
+  ('event','critical','Device {device} is using {cpu}% of its CPU'),
+  ('state_change','info','Device {device} in network {network} is now '
+   '{state}'),
+  ('config_change','info','The configuration of {device} was changed by '
+   '{user}'),
+  ('action','info','Job {job} on {device} completed'),
+]
+
+# The requests served, as (method, path pattern, handler name) tuples.  The
+# /mock paths control the mock itself and do not need a JWT
+_ROUTES = [(method,re.compile('^' + pattern + '$'),name) for method, pattern,
+           name in [
+  ('GET','/api/v2/orgs','orgs'),
+  ('GET','/api/v2/networks','networks'),
+  ('POST','/api/v2/networks','addNetwork'),
+  ('GET','/api/v2/nodes','nodes'),
+  ('POST','/api/v2/nodes/operations/([a-z-]+)','operation'),
+  ('GET','/api/v2/jobs/([^/]+)','job'),
+  ('GET','/api/v2/groups','groups'),
+  ('GET','/api/v2/pnp/(images|configs|devices)','pnpList'),
+  ('POST','/api/v2/pnp/devices','addPnpDevice'),
+  ('POST','/api/v2/subscription','subscribe'),
+  ('GET','/api/v2/event-source','eventSource'),
+  ('GET','/controller/xl/([^/]+)','xlaunch'),
+  ('GET','/mock/stats','mockStats'),
+  ('POST','/mock/config','mockConfig'),
+]]
+
+# The settings that may be changed through /mock/config
+_SETTINGS = ('latency','jitter','errorrate','errorstatus','eventrate',
+             'heartbeat','jobtime')
+
+_MISSING = object()
+
+class MockError(Exception):
+  """An error returned to the client with an HTTP status."""
+  def __init__(self,status,message):
+    super().__init__(message)
+    self.status = status
+
+def makeCertificate(directory,host='localhost'):
+  """
+  Create a self-signed certificate and private key for the host in a
+  directory using the openssl command, and return their paths.
+
+  Arguments:
+    directory - The directory to write cert.pem and key.pem to
+    host      - (Optional) The host name the certificate is issued to.
+                Defaults to localhost.  The certificate is also valid for
+                127.0.0.1.
+  """
+  certfile = os.path.join(directory,'cert.pem')
+  keyfile = os.path.join(directory,'key.pem')
+  if shutil.which('openssl') is None:
+    raise RuntimeError('The openssl command is needed to create a '
+                       'certificate.  Provide a certificate and key instead.')
+  subprocess.run(['openssl','req','-x509','-newkey','rsa:2048','-nodes',
+                  '-days','30','-subj','/CN=%s' % host,
+                  '-addext','subjectAltName=DNS:%s,DNS:localhost,'
+                  'IP:127.0.0.1' % host,
+                  '-keyout',keyfile,'-out',certfile],
+                 check=True,stdout=subprocess.DEVNULL,
+                 stderr=subprocess.DEVNULL)
+  return certfile, keyfile
+
+def project(record,fields,always=('id',)):
+  """
+  Return a copy of a record holding only the given fields, which are paths
+  such as /system-state/hostname or names such as description, together
+  with the top level members in always.  Fields the record lacks are left
+  out.
+  """
+  if not fields:
+    return record
+  result = {key:record[key] for key in always if key in record}
+  for field in fields:
+    parts = field.strip('/').split('/')
+    value = record
+    for part in parts:
+      value = value.get(part,_MISSING) if isinstance(value,dict) else _MISSING
+    if value is _MISSING:
+      continue
+    target = result
+    for part in parts[:-1]:
+      target = target.setdefault(part,{})
+    target[parts[-1]] = value
+  return result
+
+class Inventory:
+  """
+  A synthetic set of organizations, networks, devices, device groups and
+  PnP files.  The same arguments always produce the same inventory.
+
+  Arguments:
+    orgs     - (Optional) The number of organizations.  Defaults to 2.
+    networks - (Optional) The number of networks, shared between the
+               organizations.  Defaults to 10.
+    nodes    - (Optional) The number of devices, shared between the
+               networks.  Defaults to 200.
+    groups   - (Optional) The number of device groups.  Defaults to 5.
+    seed     - (Optional) The seed for the random choices.  Defaults to 0.
+  """
+  def __init__(self,orgs=2,networks=10,nodes=200,groups=5,seed=0):
+    rng = random.Random(seed)
+    self.orgs = [{'id':'org-%04d' % i,'name':'Organization %d' % i}
+                 for i in range(max(orgs,1))]
+    self.orgindex = {org['id']:org for org in self.orgs}
+    self.networks = []
+    for i in range(max(networks,1)):
+      org = self.orgs[i % len(self.orgs)]
+      self.networks.append({'id':'net-%04d' % i,'name':'Network %d' % i,
+                            'description':'Branch office %d' % i,
+                            'org-id':org['id']})
+    self.groups = [{'id':'group-%04d' % i,'name':'Group %d' % i}
+                   for i in range(groups)]
+    self.nodes = []
+    for i in range(nodes):
+      network = self.networks[i % len(self.networks)]
+      org = self.org(network['org-id'])
+      kind = rng.choice(NODE_KINDS)
+      node = {'id':'node-%06d' % i,
+              'network':{'id':network['id'],'name':network['name']},
+              'organization':{'id':org['id'],'name':org['name']},
+              'system-state':{'hostname':'%s-%d' % (kind.lower(),i),
+                              'type':kind,
+                              'ip':'10.%d.%d.%d' % (i >> 16,(i >> 8) & 255,
+                                                    i & 255),
+                              'sn':'MOCK%08d' % i,
+                              'mac':'02:00:%02x:%02x:%02x:%02x' % (
+                                      i >> 24,(i >> 16) & 255,
+                                      (i >> 8) & 255,i & 255),
+                              'firmware-version':'1.0.%d' % rng.randrange(10),
+                              'reachability':'Reachable'}}
+      if self.groups:
+        node['group-id'] = rng.choice(self.groups)['id']
+      self.nodes.append(node)
+    self.images = [{'id':'image-%04d' % i,'file-name':'firmware-%d.bin' % i,
+                    'file-size':rng.randrange(10**6,10**8)} for i in range(3)]
+    self.configs = [{'id':'config-%04d' % i,'file-name':'config-%d.txt' % i,
+                     'file-size':rng.randrange(10**3,10**5)} for i in range(3)]
+    self.pnpdevices = []
+    self.index = {record['id']:record for record in
+                  self.orgs + self.networks + self.nodes}
+
+  def org(self,id):
+    """Return the organization with an ID, or None."""
+    return self.orgindex.get(id)
+
+def _first(query,name,default=None):
+  values = query.get(name)
+  return values[0] if values else default
+
+def _integer(query,name,default,minimum):
+  value = _first(query,name)
+  if value is None or value == '':
+    return default
+  try:
+    value = int(value)
+  except ValueError:
+    value = None
+  if value is None or value < minimum:
+    raise MockError(400,'Invalid value for {}'.format(name))
+  return value
+
+def _page(records,query):
+  offset = _integer(query,'offset',0,0)
+  limit = _integer(query,'limit',DEFAULT_LIMIT,1)
+  return records[offset:offset + limit], {'offset':offset,'limit':limit,
+                                          'total':len(records)}
+
+def _ids(payload,name):
+  ids = payload.get(name) if isinstance(payload,dict) else None
+  if ids is None:
+    return []
+  if not isinstance(ids,list) or not all(isinstance(id,str) for id in ids):
+    raise MockError(400,'{} must be a list of IDs'.format(name))
+  return ids
+
+class _Server(http.server.ThreadingHTTPServer):
+  daemon_threads = True
+
+  def handle_error(self,request,address):
+    # Clients that disconnect or fail the TLS handshake are not reported
+    if not isinstance(sys.exc_info()[1],OSError):
+      super().handle_error(request,address)
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+  # Serve each request through MockDashboard.handle.  The event source uses
+  # chunked encoding so that clients receive each event as it is written.
+  # The headers and payload are written separately, so Nagle's algorithm is
+  # disabled to avoid a delayed acknowledgement after each response
+  protocol_version = 'HTTP/1.1'
+  disable_nagle_algorithm = True
+
+  def setup(self):
+    # The TLS handshake is made here rather than when the connection is
+    # accepted, so that a slow client does not hold up the others
+    if isinstance(self.request,ssl.SSLSocket):
+      self.request.settimeout(30)
+      self.request.do_handshake()
+      self.request.settimeout(None)
+    super().setup()
+
+  def log_message(self,format,*args):
+    if self.server.dashboard.verbose:
+      super().log_message(format,*args)
+
+  def _dispatch(self,method):
+    url = urllib.parse.urlsplit(self.path)
+    length = int(self.headers.get('Content-Length') or 0)
+    body = self.rfile.read(length) if length else None
+    status, payload, headers = self.server.dashboard.handle(
+      method,url.path,urllib.parse.parse_qs(url.query,keep_blank_values=True),
+      self.headers,body)
+
+    self.send_response(status)
+    for name, value in headers.items():
+      self.send_header(name,value)
+    if isinstance(payload,types.GeneratorType):
+      self._stream(payload)
+      return
+    data = b'' if payload is None else json.dumps(payload).encode('UTF-8')
+    if data:
+      self.send_header('Content-Type','application/json')
+    self.send_header('Content-Length',str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _stream(self,chunks):
+    self.send_header('Content-Type','text/event-stream')
+    self.send_header('Cache-Control','no-cache')
+    self.send_header('Transfer-Encoding','chunked')
+    self.end_headers()
+    self.wfile.flush()
+    try:
+      for data in chunks:
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data),data))
+        self.wfile.flush()
+      self.wfile.write(b'0\r\n\r\n')
+    except OSError:
+      # The client has disconnected
+      pass
+    finally:
+      chunks.close()
+      self.close_connection = True
+
+  def do_GET(self):
+    self._dispatch('GET')
+
+  def do_POST(self):
+    self._dispatch('POST')
+
+class MockDashboard:
+  """
+  Serve a synthetic Dashboard over HTTPS.
+
+  Arguments:
+    host        - (Optional) The address to listen on.  Defaults to
+                  127.0.0.1.
+    port        - (Optional) The port to listen on, or 0 for any free port.
+                  Defaults to 8443.
+    inventory   - (Optional) The Inventory to serve.  If not given, one is
+                  created with the orgs, networks, nodes and seed arguments.
+    keys        - (Optional) A dictionary of the access key secrets accepted,
+                  indexed by key ID.  Defaults to DEFAULT_KEYID with
+                  DEFAULT_SECRET.
+    latency     - (Optional) The number of seconds added to every API
+                  request.  Defaults to 0.
+    jitter      - (Optional) A random number of seconds up to this value is
+                  added to the latency of each request.  Defaults to 0.
+    errorrate   - (Optional) The fraction of API requests that fail with
+                  errorstatus.  Defaults to 0.
+    errorstatus - (Optional) The HTTP status of the injected errors.  429
+                  and 503 errors carry a Retry-After header.  Defaults to
+                  503.
+    eventrate   - (Optional) The number of events per second sent to each
+                  event stream.  Defaults to 1.
+    heartbeat   - (Optional) The number of seconds between heartbeats on
+                  each event stream.  Defaults to 10.
+    jobtime     - (Optional) The number of seconds each job runs for.
+                  Defaults to 5.
+    certfile    - (Optional) The certificate to serve, in PEM format.  A
+                  self-signed certificate is created if not given.
+    keyfile     - (Optional) The private key of the certificate.
+    verbose     - (Optional) Log every request to stderr.  Defaults to False.
+    orgs, networks, nodes, seed
+                - (Optional) The size and seed of the inventory created if
+                  none is given.  See Inventory.
+  """
+  def __init__(self,host='127.0.0.1',port=8443,inventory=None,keys=None,
+               latency=0,jitter=0,errorrate=0,errorstatus=503,eventrate=1,
+               heartbeat=10,jobtime=5,certfile=None,keyfile=None,
+               verbose=False,orgs=2,networks=10,nodes=200,seed=0):
+    self.inventory = inventory or Inventory(orgs,networks,nodes,seed=seed)
+    self.keys = keys or {DEFAULT_KEYID:DEFAULT_SECRET}
+    self.latency = latency
+    self.jitter = jitter
+    self.errorrate = errorrate
+    self.errorstatus = errorstatus
+    self.eventrate = eventrate
+    self.heartbeat = heartbeat
+    self.jobtime = jobtime
+    self.verbose = verbose
+    self.seed = seed
+    self.jobs = {}
+    self.rebooting = {}
+    self.subscribed = set()
+    self.lastevent = 0
+    self.closed = False
+    self.counts = collections.Counter()
+    self._lock = threading.Lock()
+    self._random = random.Random(seed)
+
+    self.tempdir = None
+    if certfile is None:
+      self.tempdir = tempfile.mkdtemp(prefix='cbdmock-')
+      certfile, keyfile = makeCertificate(self.tempdir)
+    self.certfile = certfile
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile,keyfile)
+
+    self.server = _Server((host,port),_Handler,bind_and_activate=False)
+    try:
+      self.server.server_bind()
+      self.server.server_activate()
+    except OSError:
+      self.server.server_close()
+      self._removeCertificate()
+      raise
+    self.server.socket = context.wrap_socket(self.server.socket,
+                                             server_side=True,
+                                             do_handshake_on_connect=False)
+    self.server.dashboard = self
+    self.thread = None
+
+  @property
+  def address(self):
+    """The (host, port) the mock is listening on."""
+    return self.server.server_address[:2]
+
+  @property
+  def url(self):
+    """The base URL of the mock, for example https://127.0.0.1:8443."""
+    return 'https://%s:%s' % self.address
+
+  def environment(self,keyid=None,appname='mock.cbd.example.com'):
+    """
+    Return an object with the same attributes as environment.py describing
+    the mock, for use with cbdclient.Client.fromEnvironment.  The
+    certificate of the mock is trusted rather than verification disabled.
+
+    Arguments:
+      keyid   - (Optional) The access key to use.  Defaults to the first.
+      appname - (Optional) The application name to use.
+    """
+    keyid = keyid or next(iter(self.keys))
+    host, port = self.address
+    return types.SimpleNamespace(dashboard=host,port=str(port),
+                                 verify_cbd_cert=self.certfile,keyid=keyid,
+                                 secret=self.keys[keyid],appname=appname,
+                                 clientid=None)
+
+  def start(self):
+    """Start serving requests in a background thread."""
+    if self.thread is None:
+      self.thread = threading.Thread(target=self.server.serve_forever,
+                                     daemon=True)
+      self.thread.start()
+    return self
+
+  def run(self):
+    """Serve requests until interrupted, then close the mock."""
+    try:
+      self.server.serve_forever()
+    finally:
+      self.close()
+
+  def close(self):
+    """Stop serving requests and end every event stream."""
+    self.closed = True
+    if self.thread is not None:
+      self.server.shutdown()
+      self.thread = None
+    self.server.server_close()
+    self._removeCertificate()
+
+  def _removeCertificate(self):
+    if self.tempdir is not None:
+      shutil.rmtree(self.tempdir,ignore_errors=True)
+      self.tempdir = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self,*exc):
+    self.close()
+
+  def stats(self):
+    """Return the number of requests served by route, and the totals."""
+    with self._lock:
+      return dict(self.counts)
+
+  def configure(self,**settings):
+    """
+    Change the latency, jitter, errorrate, errorstatus, eventrate, heartbeat
+    or jobtime of the running mock.
+    """
+    for name, value in settings.items():
+      if name not in _SETTINGS:
+        raise ValueError('Unknown setting {}'.format(name))
+      if not isinstance(value,(int,float)) or value < 0:
+        raise ValueError('Invalid value for {}'.format(name))
+    for name, value in settings.items():
+      setattr(self,name,value)
+
+  def authorize(self,token):
+    """
+    Return the claims of a JWT if it was signed with one of the access keys
+    of the mock and is valid for the Dashboard API, otherwise None.
+    """
+    try:
+      secret = self.keys[jwt.get_unverified_header(token).get('kid')]
+      claims = jwt.decode(token,secret,algorithms=['HS256'],audience=AUDIENCE)
+    except (KeyError,TypeError,jwt.InvalidTokenError):
+      return None
+    if not claims.get('iss') or not claims.get('cid'):
+      return None
+    return claims
+
+  def handle(self,method,path,query,headers,body):
+    """
+    Serve a request and return a (status, payload, headers) tuple.  The
+    payload is a generator of chunks of data for the event source.
+    """
+    known = False
+    for routemethod, pattern, name in _ROUTES:
+      match = pattern.match(path)
+      if match and routemethod == method:
+        break
+      known = known or match is not None
+    else:
+      if known:
+        return 405, {'message':'{} is not allowed for {}'.format(method,
+                                                                  path)}, {}
+      return 404, {'message':'Unknown path {}'.format(path)}, {}
+
+    with self._lock:
+      self.counts['requests'] += 1
+      self.counts[name] += 1
+    extra = {}
+    try:
+      if not name.startswith('mock'):
+        self._degrade()
+        if name == 'xlaunch':
+          token = _first(query,'token')
+        else:
+          token = headers.get('Authorization','')
+          token = token[7:] if token.startswith('Bearer ') else None
+        if not token or self.authorize(token) is None:
+          raise MockError(401,'A valid JWT is required')
+      try:
+        payload = json.loads(body) if body else None
+      except ValueError:
+        raise MockError(400,'The request payload is not valid JSON')
+      status, payload = getattr(self,'_' + name)(match.groups(),query,headers,
+                                                 payload)
+      if status == 302:
+        extra['Location'], payload = payload, None
+    except MockError as e:
+      status, payload = e.status, {'message':str(e)}
+      with self._lock:
+        self.counts['errors'] += 1
+        self.counts[str(status)] += 1
+      if status in (429,503):
+        extra['Retry-After'] = '1'
+    return status, payload, extra
+
+  def _degrade(self):
+    # Add the configured latency and errors to an API request
+    delay = self.latency
+    if self.jitter:
+      delay += self._random.uniform(0,self.jitter)
+    if delay:
+      time.sleep(delay)
+    if self.errorrate and self._random.random() < self.errorrate:
+      raise MockError(int(self.errorstatus),'Injected error')
+
+  def _list(self,records,query,fields=None,always=('id',)):
+    records, paging = _page(records,query)
+    if fields:
+      records = [project(record,fields,always) for record in records]
+    return 200, {'data':records,'paging':paging}
+
+  def _fields(self,query):
+    fields = _first(query,'fields')
+    return [field for field in fields.split(',') if field] if fields else None
+
+  def _orgs(self,groups,query,headers,payload):
+    return self._list(self.inventory.orgs,query,self._fields(query))
+
+  def _inOrg(self,records,headers,orgid):
+    # Restrict records to the organization selected with x-ctx-org-id
+    org = headers.get('x-ctx-org-id')
+    if not org:
+      return records
+    if self.inventory.org(org) is None:
+      raise MockError(404,'Unknown organization {}'.format(org))
+    return [record for record in records if orgid(record) == org]
+
+  def _networks(self,groups,query,headers,payload):
+    records = self._inOrg(self.inventory.networks,headers,
+                          lambda network: network['org-id'])
+    search = _first(query,'search')
+    if search:
+      search = search.lower()
+      records = [network for network in records
+                 if search in network['name'].lower()
+                 or search in network['description'].lower()]
+    return self._list(records,query,self._fields(query))
+
+  def _addNetwork(self,groups,query,headers,payload):
+    if not isinstance(payload,dict) or not payload.get('name'):
+      raise MockError(400,'A network name is required')
+    org = headers.get('x-ctx-org-id') or self.inventory.orgs[0]['id']
+    if self.inventory.org(org) is None:
+      raise MockError(404,'Unknown organization {}'.format(org))
+    with self._lock:
+      network = {'id':'net-%04d' % len(self.inventory.networks),
+                 'name':str(payload['name']),
+                 'description':str(payload.get('description','')),
+                 'org-id':org}
+      self.inventory.networks.append(network)
+      self.inventory.index[network['id']] = network
+    return 200, {'id':network['id']}
+
+  def _nodes(self,groups,query,headers,payload):
+    records = self._inOrg(self.inventory.nodes,headers,
+                          lambda node: node['organization']['id'])
+
+    kinds = set()
+    for type in ','.join(query.get('type',[])).split(','):
+      if not type or type == 'All':
+        continue
+      if type not in cbdquery.NODE_TYPES:
+        raise MockError(400,'Invalid device type {}'.format(type))
+      if type == 'Device':
+        kinds.update(DEVICE_KINDS)
+      elif type == 'Others':
+        kinds.update(set(NODE_KINDS) - set(DEVICE_KINDS))
+      else:
+        kinds.add(type)
+    if kinds and 'All' not in query.get('type',[]):
+      records = [node for node in records
+                 if node['system-state']['type'] in kinds]
+
+    ids = {id for id in ','.join(query.get('id',[])).split(',') if id}
+    if ids:
+      records = [node for node in records if node['id'] in ids]
+
+    search = _first(query,'search-str')
+    if search:
+      search = search.lower()
+      records = [node for node in records
+                 if any(search in node['system-state'][field].lower()
+                        for field in ('hostname','ip','sn','mac'))]
+
+    status, page = self._list(records,query,self._fields(query),
+                              ('id','network','organization'))
+    if self.rebooting:
+      # Devices being rebooted are unreachable until their job finishes
+      now = time.monotonic()
+      page['data'] = [self._rebooted(node,now) for node in page['data']]
+    return status, page
+
+  def _rebooted(self,node,now):
+    until = self.rebooting.get(node['id'])
+    if until is None or until <= now or \
+       'reachability' not in node.get('system-state',{}):
+      return node
+    node = dict(node,**{'system-state':dict(node['system-state'])})
+    node['system-state']['reachability'] = 'Unreachable'
+    return node
+
+  def _operation(self,groups,query,headers,payload):
+    nodeids = _ids(payload,'node-ids')
+    networkids = _ids(payload,'network-ids')
+    if not nodeids and not networkids:
+      raise MockError(400,'Either node-ids or network-ids is required')
+    for id in nodeids + networkids:
+      if id not in self.inventory.index:
+        raise MockError(404,'Unknown ID {}'.format(id))
+
+    now = time.monotonic()
+    jobids = []
+    with self._lock:
+      for target in nodeids + networkids:
+        job = {'id':'job-%06d' % (len(self.jobs) + 1),'operation':groups[0],
+               'target':target,'started':now,'finishes':now + self.jobtime}
+        self.jobs[job['id']] = job
+        jobids.append(job['id'])
+        if groups[0] == 'reboot' and target in nodeids:
+          self.rebooting[target] = job['finishes']
+    return 200, {'job-ids':jobids}
+
+  def _job(self,groups,query,headers,payload):
+    job = self.jobs.get(groups[0])
+    if job is None:
+      raise MockError(404,'Unknown job {}'.format(groups[0]))
+    finished = time.monotonic() >= job['finishes']
+    return 200, {'data':{'id':job['id'],'operation':job['operation'],
+                         'target':job['target'],
+                         'status':'succeeded' if finished else 'running'}}
+
+  def _groups(self,groups,query,headers,payload):
+    return self._list(self.inventory.groups,query,self._fields(query))
+
+  def _pnpList(self,groups,query,headers,payload):
+    records = {'images':self.inventory.images,
+               'configs':self.inventory.configs,
+               'devices':self.inventory.pnpdevices}[groups[0]]
+    return self._list(records,query,self._fields(query))
+
+  def _addPnpDevice(self,groups,query,headers,payload):
+    if not isinstance(payload,dict) or not payload.get('sn'):
+      raise MockError(400,'A serial number is required')
+    with self._lock:
+      if any(device['sn'] == payload['sn']
+             for device in self.inventory.pnpdevices):
+        raise MockError(409,'A device with serial number {} already '
+                        'exists'.format(payload['sn']))
+      device = dict(payload,id='pnp-%06d' % len(self.inventory.pnpdevices))
+      self.inventory.pnpdevices.append(device)
+    return 200, {'id':device['id']}
+
+  def _subscribe(self,groups,query,headers,payload):
+    networkids = _ids(payload,'network-ids')
+    for id in networkids:
+      if id not in self.inventory.index:
+        raise MockError(404,'Unknown network {}'.format(id))
+    with self._lock:
+      self.subscribed = set(networkids)
+    return 204, None
+
+  def _xlaunch(self,groups,query,headers,payload):
+    if groups[0] not in self.inventory.index:
+      raise MockError(404,'Unknown device {}'.format(groups[0]))
+    return 302, '{}/xlaunch/{}'.format(self.url,groups[0])
+
+  def _mockStats(self,groups,query,headers,payload):
+    return 200, self.stats()
+
+  def _mockConfig(self,groups,query,headers,payload):
+    if not isinstance(payload,dict):
+      raise MockError(400,'The settings must be a JSON object')
+    try:
+      self.configure(**payload)
+    except ValueError as e:
+      raise MockError(400,str(e))
+    return 200, {name:getattr(self,name) for name in _SETTINGS}
+
+  def event(self,sequence):
+    """
+    Return the synthetic event with a sequence number.  The same number
+    always gives the same event.
+    """
+    rng = random.Random(self.seed * 1000003 + sequence)
+    type, severity, template = rng.choice(EVENT_TEMPLATES)
+    node = rng.choice(self.inventory.nodes) if self.inventory.nodes else None
+    if node is None:
+      node = {'id':None,'network':self.inventory.networks[0],
+              'system-state':{'hostname':'dashboard'}}
+    return {'type':type,'severity':severity,'network-id':node['network']['id'],
+            'node-id':node['id'],'english-string':template,
+            'parameters':{'device':node['system-state']['hostname'],
+                          'network':node['network']['name'],
+                          'port':rng.randrange(1,49),
+                          'cpu':rng.randrange(80,100),
+                          'state':rng.choice(['reachable','unreachable']),
+                          'user':'admin','job':rng.randrange(10**6)}}
+
+  def _eventSource(self,groups,query,headers,payload):
+    wanted = ','.join(query.get('types',[])).split(',')
+    wanted = set(wanted if any(wanted) else cbdevents.EVENT_TYPES)
+    subscribed = _first(query,'monitored-networks') == 'subscribed'
+    lastid = headers.get('Last-Event-ID')
+    try:
+      sequence = int(lastid) + 1 if lastid else None
+    except ValueError:
+      raise MockError(400,'Invalid Last-Event-ID')
+    return 200, self._events(wanted,subscribed,sequence)
+
+  def _events(self,wanted,subscribed,sequence):
+    # Generate the event stream, sending the events that are due and any
+    # heartbeat in one chunk, then waiting for the next to fall due
+    with self._lock:
+      if sequence is None:
+        sequence = self.lastevent + 1
+    due = None
+    beat = time.monotonic() + self.heartbeat
+    while not self.closed:
+      now = time.monotonic()
+      chunk = []
+      events = 0
+      if self.eventrate > 0:
+        due = now if due is None else due
+        while due <= now and len(chunk) < 1000:
+          event = self.event(sequence)
+          if event['type'] in wanted and (not subscribed or
+                                          event['network-id'] in
+                                          self.subscribed):
+            chunk.append(b'id: %d\ndata: %s\n\n' % (
+                         sequence,json.dumps(event).encode('UTF-8')))
+            events += 1
+          sequence += 1
+          due += 1.0 / self.eventrate
+      else:
+        due = None
+      if now >= beat:
+        chunk.append(b'data: {"type":"%s"}\n\n' %
+                     cbdevents.HEARTBEAT.encode('UTF-8'))
+        beat = now + self.heartbeat
+
+      if chunk:
+        with self._lock:
+          self.lastevent = max(self.lastevent,sequence - 1)
+          self.counts['events'] += events
+        yield b''.join(chunk)
+
+      # Wake at least twice a second to notice changes to the event rate
+      wake = beat if due is None else min(due,beat)
+      time.sleep(min(max(wake - time.monotonic(),0),0.5))
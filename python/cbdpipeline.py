@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Event processing pipeline for the Cisco Business Dashboard event stream
+
+Provides the Pipeline class, which separates reading the event stream from
+handling the events.  The thread reading the stream only places each event on
+a bounded queue, and a pool of worker threads takes events from the queue and
+passes them to each handler in turn.  A slow handler therefore never holds up
+the connection to the Dashboard.  If the handlers fall behind and the queue
+fills, the pipeline either waits for space or drops events according to the
+configured policy.
+
+Handlers are callables that accept a single event.  The PrintHandler,
+FileHandler and WebhookHandler classes provided here display events, append
+them to a JSON Lines file, and post them to a web service respectively.
+
+Typical usage:
+
+  import cbdclient
+  import cbdevents
+  import cbdpipeline
+
+  with cbdclient.Client.fromEnvironment() as client:
+    pipeline = cbdpipeline.Pipeline([cbdpipeline.PrintHandler()],workers=4)
+    pipeline.run(cbdevents.EventStream(client))
+
+The stats method reports the current and peak queue depth, the number of
+events processed and dropped, and the average and maximum time events spent
+waiting in the queue and in each handler.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import json
+import time
+import queue
+import threading
+
+import requests
+
+import cbdformat
+
+# Policies for a full queue
+BLOCK = 'block'
+DROP_NEWEST = 'drop-newest'
+DROP_OLDEST = 'drop-oldest'
+POLICIES = (BLOCK,DROP_NEWEST,DROP_OLDEST)
+
+# Placed on the queue to stop a worker
+_STOP = object()
+
+class Stage:
+  """
+  Latency statistics for one stage of the pipeline.
+  """
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self,elapsed):
+    self.count += 1
+    self.total += elapsed
+    if elapsed > self.max:
+      self.max = elapsed
+
+  def summary(self):
+    return {'count':self.count,
+            'errors':self.errors,
+            'avg':self.total / self.count if self.count else 0.0,
+            'max':self.max}
+
+class Pipeline:
+  """
+  Pass events from a reader to a pool of workers through a bounded queue.
+
+  Arguments:
+    handlers  - A list of callables, each called with every event
+    workers   - (Optional) The number of worker threads.  Defaults to 4.
+                With more than one worker, events may be handled out of
+                order.
+    queuesize - (Optional) The maximum number of events waiting to be
+                handled.  Defaults to 1000.
+    policy    - (Optional) What to do when the queue is full: 'block' waits
+                for space, 'drop-newest' discards the new event and
+                'drop-oldest' discards the event that has waited longest.
+                Defaults to 'block'.
+  """
+  def __init__(self,handlers,workers=4,queuesize=1000,policy=BLOCK):
+    if policy not in POLICIES:
+      raise ValueError('Unknown queue policy {}'.format(policy))
+    self.handlers = handlers
+    self.policy = policy
+    self.queue = queue.Queue(maxsize=queuesize)
+    self._lock = threading.Lock()
+    self.received = 0
+    self.dropped = 0
+    self.maxdepth = 0
+    self.waiting = Stage()
+    self.stages = {self._name(handler):Stage() for handler in handlers}
+    self.threads = [threading.Thread(target=self._work,daemon=True)
+                    for i in range(workers)]
+    for thread in self.threads:
+      thread.start()
+
+  @staticmethod
+  def _name(handler):
+    return getattr(handler,'name',None) or type(handler).__name__
+
+  def submit(self,event):
+    """
+    Queue an event for the workers.  Returns False if the event was dropped
+    because the queue was full.
+    """
+    item = (time.monotonic(),event)
+    with self._lock:
+      self.received += 1
+    if self.policy == BLOCK:
+      self.queue.put(item)
+    else:
+      while True:
+        try:
+          self.queue.put_nowait(item)
+          break
+        except queue.Full:
+          with self._lock:
+            self.dropped += 1
+          if self.policy == DROP_NEWEST:
+            return False
+          try:
+            self.queue.get_nowait()
+            self.queue.task_done()
+          except queue.Empty:
+            pass
+
+    depth = self.queue.qsize()
+    with self._lock:
+      if depth > self.maxdepth:
+        self.maxdepth = depth
+    return True
+
+  def _work(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is _STOP:
+          return
+        queued, event = item
+        started = time.monotonic()
+        with self._lock:
+          self.waiting.record(started - queued)
+        for handler in self.handlers:
+          stage = self.stages[self._name(handler)]
+          try:
+            handler(event)
+          except Exception:
+            # A failing handler must not stop the worker or the other
+            # handlers
+            with self._lock:
+              stage.errors += 1
+          finished = time.monotonic()
+          with self._lock:
+            stage.record(finished - started)
+          started = finished
+      finally:
+        self.queue.task_done()
+
+  def run(self,events):
+    """
+    Submit every event from an iterable, such as a cbdevents.EventStream,
+    then wait for the workers to finish.  Heartbeat events are skipped.
+    """
+    try:
+      for event in events:
+        if event.get('type') != '/heart_beat':
+          self.submit(event)
+    finally:
+      self.close()
+
+  def close(self,wait=True):
+    """
+    Stop the workers once the events already queued have been handled.
+    """
+    for thread in self.threads:
+      self.queue.put(_STOP)
+    if wait:
+      for thread in self.threads:
+        thread.join()
+
+  def stats(self):
+    """Return a dictionary of queue and per-stage statistics."""
+    with self._lock:
+      return {'received':self.received,
+              'dropped':self.dropped,
+              'depth':self.queue.qsize(),
+              'maxdepth':self.maxdepth,
+              'queue':self.waiting.summary(),
+              'handlers':{name:stage.summary()
+                          for name, stage in self.stages.items()}}
+
+class PrintHandler:
+  """
+  Display a human readable message for each event.
+
+  Arguments:
+    json - (Optional) Output each event as a line of JSON holding its type,
+           message and parameters instead.  Defaults to False.
+  """
+  name = 'print'
+
+  def __init__(self,json=False):
+    self.json = json
+    self._lock = threading.Lock()
+
+  def __call__(self,event):
+    # Use the event content to generate a human readable english string.
+    # The template is only parsed the first time it is seen
+    if self.json:
+      line = json.dumps(cbdformat.record(event))
+    else:
+      line = "Received event:  " + cbdformat.render(event)
+    with self._lock:
+      print(line)
+
+class FileHandler:
+  """
+  Append each event to a file as a line of JSON.
+
+  Arguments:
+    filename - The file to append to
+  """
+  name = 'file'
+
+  def __init__(self,filename):
+    self._lock = threading.Lock()
+    self.file = open(filename,'a')
+
+  def __call__(self,event):
+    line = json.dumps(event) + '\n'
+    with self._lock:
+      self.file.write(line)
+      self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+class WebhookHandler:
+  """
+  POST each event as a JSON payload to a web service.  A single session is
+  shared by all workers so that connections are reused.
+
+  Arguments:
+    url     - The URL to post events to
+    timeout - (Optional) The timeout in seconds for each post.  Defaults
+              to 10.
+  """
+  name = 'webhook'
+
+  def __init__(self,url,timeout=10):
+    self.url = url
+    self.timeout = timeout
+    self.session = requests.Session()
+
+  def __call__(self,event):
+    self.session.post(self.url,json=event,
+                      timeout=self.timeout).raise_for_status()
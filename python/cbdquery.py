@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Query builder for the Cisco Business Dashboard node and network lists
+
+Provides the NodeQuery and NetworkQuery classes, which build the query
+parameters for /api/v2/nodes and /api/v2/networks, and the OrgQuery class
+for /api/v2/orgs.  Requesting only the fields that are needed is the most
+effective way to reduce the size of the responses from a large Dashboard,
+so the fields to return, the filters and the paging are composed with
+methods that check each value as it is added, rather than by joining strings
+by hand.  Each method returns a new query, so a query can be shared and
+extended safely.
+
+The ResponseCache class keeps the records returned for each distinct query
+for a short time, so that repeating an identical query within that time
+does not contact the Dashboard again.  Each caller is given its own copy of
+the cached records.
+
+Typical usage:
+
+  import cbdclient
+  import cbdquery
+
+  query = (cbdquery.NodeQuery()
+           .fields('/system-state/hostname','/system-state/ip')
+           .types('Switch','Router')
+           .search('core'))
+  with cbdclient.Client.fromEnvironment() as client:
+    for node in query.fetch(client,workers=4,cache=cbdquery.cache):
+      print(node['system-state']['hostname'])
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import re
+import copy
+import time
+import threading
+import collections
+
+import cbdclient
+
+# The device types accepted by the type filter of /api/v2/nodes
+NODE_TYPES = ['All','Device','Others','Router','Switch','WAP','IpPhone',
+              'IpCamera','NAS','VirtualDevice','WLC']
+
+# Node fields are absolute paths such as /system-state/hostname, while
+# network fields are names such as network-id, optionally with a path
+NODE_FIELD = re.compile(r'^(/[A-Za-z0-9_-]+)+$')
+NETWORK_FIELD = re.compile(r'^/?[A-Za-z0-9_-]+(/[A-Za-z0-9_-]+)*$')
+
+class Query:
+  """
+  A query of one of the Dashboard list APIs.  Use NodeQuery, NetworkQuery or
+  OrgQuery rather than creating a Query directly.
+  """
+  path = None
+  fieldpattern = None
+  searchparam = None
+
+  def __init__(self):
+    self.projection = ()
+    self.filters = ()
+    self.offset = None
+    self.limit = None
+
+  def _copy(self,**changes):
+    query = object.__new__(type(self))
+    query.__dict__.update(self.__dict__,**changes)
+    return query
+
+  def fields(self,*paths):
+    """
+    Return a new query that also returns the given fields.  Fields already
+    requested are not repeated.
+    """
+    projection = list(self.projection)
+    for path in paths:
+      if not isinstance(path,str) or not self.fieldpattern.match(path):
+        raise ValueError('Invalid field {!r} for {}'.format(path,self.path))
+      if path not in projection:
+        projection.append(path)
+    return self._copy(projection=tuple(projection))
+
+  def where(self,name,value):
+    """
+    Return a new query with an additional filter parameter.  Prefer the
+    specific methods such as search, which check their values.
+    """
+    if not isinstance(name,str) or not name:
+      raise ValueError('Invalid filter name {!r}'.format(name))
+    if (name,str(value)) in self.filters:
+      return self
+    return self._copy(filters=self.filters + ((name,str(value)),))
+
+  def search(self,text):
+    """Return a new query that only returns records matching the text."""
+    if self.searchparam is None:
+      raise ValueError('{} cannot be searched'.format(self.path))
+    if not isinstance(text,str) or not text:
+      raise ValueError('The search string must not be empty')
+    return self.where(self.searchparam,text)
+
+  def page(self,offset=0,limit=cbdclient.DEFAULT_PAGESIZE):
+    """
+    Return a new query that returns a single page of records rather than
+    every record.
+    """
+    if offset < 0 or limit < 1:
+      raise ValueError('Invalid page offset {} or limit {}'.format(offset,
+                                                                    limit))
+    return self._copy(offset=offset,limit=limit)
+
+  def params(self):
+    """Return the query parameters as a list of tuples."""
+    params = []
+    if self.projection:
+      params.append(('fields',','.join(self.projection)))
+    params.extend(self.filters)
+    if self.limit is not None:
+      params.extend([('offset',self.offset),('limit',self.limit)])
+    return params
+
+  def key(self,client,headers=None):
+    """
+    Return a value identifying the query sent to a Dashboard, for use as a
+    cache key.  The key includes the organization selected with the
+    x-ctx-org-id header, and the parameters are sorted so that the same
+    filters added in a different order give the same key.
+    """
+    headers = {name.lower():value for name, value in (headers or {}).items()}
+    return (client.baseurl,headers.get('x-ctx-org-id'),self.path,
+            tuple(sorted(self.params(),key=lambda param:(param[0],
+                                                         str(param[1])))))
+
+  def iterate(self,client,workers=1,headers=None,cache=None):
+    """
+    Send the query and yield each record as it is received.  With a single
+    worker each page is decoded as it arrives, so the records can be
+    processed or written out without holding the whole list in memory.
+
+    Arguments:
+      client  - A cbdclient.Client connected to the Dashboard
+      workers - (Optional) The number of pages to request concurrently.
+                Defaults to 1.
+      headers - (Optional) A dictionary of additional request headers, such
+                as x-ctx-org-id
+      cache   - (Optional) A ResponseCache to use.  The records are only
+                cached once every record has been received.
+    """
+    key = None
+    if cache is not None:
+      key = self.key(client,headers)
+      records = cache.get(key)
+      if records is not None:
+        yield from records
+        return
+
+    if self.limit is not None:
+      # Request the single page, stopping before the next would be requested
+      records = client.iterateStream(self.path,
+                                     self._copy(limit=None).params(),
+                                     self.limit,self.offset,headers)
+      records = (record for i, record in zip(range(self.limit),records))
+    elif workers > 1:
+      records = client.iterateParallel(self.path,self.params(),
+                                       workers=workers,headers=headers)
+    else:
+      records = client.iterateStream(self.path,self.params(),headers=headers)
+    if cache is None:
+      yield from records
+      return
+
+    # Keep a copy of each record, as the caller is free to change the one
+    # it is given
+    received = []
+    for record in records:
+      received.append(copy.deepcopy(record))
+      yield record
+    cache.put(key,received)
+
+  def fetch(self,client,workers=1,headers=None,cache=None):
+    """
+    Send the query and return a list of the records returned.
+
+    Arguments:
+      client  - A cbdclient.Client connected to the Dashboard
+      workers - (Optional) The number of pages to request concurrently.
+                Defaults to 1.
+      headers - (Optional) A dictionary of additional request headers, such
+                as x-ctx-org-id
+      cache   - (Optional) A ResponseCache to use
+    """
+    return list(self.iterate(client,workers,headers,cache))
+
+  def __repr__(self):
+    return '{}({!r})'.format(type(self).__name__,self.params())
+
+class NodeQuery(Query):
+  """
+  A query of the device list at /api/v2/nodes.
+  """
+  path = '/api/v2/nodes'
+  fieldpattern = NODE_FIELD
+  searchparam = 'search-str'
+
+  def types(self,*types):
+    """
+    Return a new query that only returns devices of the given types, which
+    must be from NODE_TYPES.
+    """
+    query = self
+    for type in types:
+      if type not in NODE_TYPES:
+        raise ValueError('Invalid device type {!r}.  Should be one of {}'
+                         .format(type,', '.join(NODE_TYPES)))
+      query = query.where('type',type)
+    return query
+
+class NetworkQuery(Query):
+  """
+  A query of the network list at /api/v2/networks.
+  """
+  path = '/api/v2/networks'
+  fieldpattern = NETWORK_FIELD
+  searchparam = 'search'
+
+class OrgQuery(Query):
+  """
+  A query of the organization list at /api/v2/orgs, which cannot be searched.
+  """
+  path = '/api/v2/orgs'
+  fieldpattern = NETWORK_FIELD
+
+class ResponseCache:
+  """
+  Keep the records returned by recent queries for a short time.  Records
+  are copied as they are cached and again each time they are returned, so
+  a caller that changes its records does not change those of later callers.
+
+  Arguments:
+    ttl     - (Optional) The number of seconds to keep each response.
+              Defaults to 30.
+    maxsize - (Optional) The number of responses to keep.  The oldest
+              response is discarded when the cache is full.  Defaults to 64.
+  """
+  def __init__(self,ttl=30,maxsize=64):
+    self.ttl = ttl
+    self.maxsize = maxsize
+    self.entries = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def get(self,key):
+    """Return a copy of the records cached for a key, or None."""
+    with self._lock:
+      entry = self.entries.get(key)
+      if entry is None or entry[0] <= time.monotonic():
+        self.entries.pop(key,None)
+        self.misses += 1
+        return None
+      self.hits += 1
+      records = entry[1]
+    return copy.deepcopy(records)
+
+  def put(self,key,records):
+    """Cache a copy of the records for a key."""
+    records = copy.deepcopy(list(records))
+    with self._lock:
+      self.entries.pop(key,None)
+      self.entries[key] = (time.monotonic() + self.ttl,records)
+      while len(self.entries) > self.maxsize:
+        self.entries.popitem(last=False)
+
+  def clear(self):
+    """Discard every cached response."""
+    with self._lock:
+      self.entries.clear()
+
+# A cache shared by everything in the process
+cache = ResponseCache()
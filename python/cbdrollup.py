@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Windowed aggregation of Cisco Business Dashboard events
+
+Provides the Aggregator class, which collapses a high volume of events into
+periodic rollups.  Events are grouped by type, network and device (or any
+other fields) over tumbling windows, which follow one another without
+overlapping, or sliding windows, which overlap and start at a fixed
+interval.  Within each group, events that produce the same message are
+counted rather than repeated.  When a window ends, one rollup is emitted per
+group, giving the number of events, the number of distinct messages, the
+most frequent messages and when the group was first and last seen.
+
+Rollups are passed to a list of sinks, which may be any of the cbdpipeline
+handlers or a cbdrouter Router.  So that they can be displayed and routed
+like events, rollups have the type 'rollup' and carry an english-string and
+parameters describing them.
+
+Typical usage:
+
+  import cbdevents
+  import cbdpipeline
+  import cbdrollup
+
+  aggregator = cbdrollup.Aggregator([cbdpipeline.PrintHandler()],window=60)
+  for event in cbdevents.EventStream(client,heartbeats=False):
+    aggregator(event)
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import json
+import math
+import time
+import datetime
+import threading
+
+import cbdevents
+import cbdformat
+import cbdrouter
+
+# The fields events are grouped by when none are given
+DEFAULT_KEYS = ['type','network-id','node-id']
+
+# The type given to rollups
+ROLLUP = 'rollup'
+
+class Group:
+  """
+  The events in one window that share the same key.
+  """
+  def __init__(self,key):
+    self.key = key
+    self.count = 0
+    self.first = None
+    self.last = None
+    self.messages = {}
+
+  def add(self,received,message):
+    self.count += 1
+    if self.first is None:
+      self.first = received
+    self.last = received
+    seen = self.messages.get(message)
+    if seen is None:
+      self.messages[message] = [1,received,received]
+    else:
+      seen[0] += 1
+      seen[2] = received
+
+def keyValue(value):
+  """
+  Return a field value in a form that can be used in a group key.  Missing
+  fields become None, and lists and objects are converted to JSON.
+  """
+  if value is cbdrouter._MISSING:
+    return None
+  if isinstance(value,(list,dict)):
+    return json.dumps(value,sort_keys=True)
+  return value
+
+def isoTime(seconds):
+  return datetime.datetime.fromtimestamp(seconds).isoformat(timespec='seconds')
+
+class Aggregator:
+  """
+  Group events over time windows and pass a rollup of each group to the
+  sinks when its window ends.  An aggregator is a callable taking an event,
+  so it may be used as a cbdpipeline handler.
+
+  Arguments:
+    sinks    - A list of callables, each called with every rollup
+    window   - (Optional) The length of each window in seconds.  Defaults
+               to 60.
+    slide    - (Optional) The interval in seconds between the starts of
+               overlapping sliding windows.  Defaults to None, giving
+               tumbling windows.
+    keys     - (Optional) A list of the fields to group events by, as
+               dotted paths.  Defaults to type, network-id and node-id.
+    samples  - (Optional) The number of most frequent messages included in
+               each rollup.  Defaults to 5.
+    grace    - (Optional) The number of seconds to wait after a window ends
+               for late events, such as those delayed in a pipeline queue.
+               Defaults to 1.
+    interval - (Optional) How often in seconds to check for windows that
+               have ended, so rollups are emitted even when no events
+               arrive.  Defaults to 1.  Set to None to only check as events
+               are added.
+  """
+  name = ROLLUP
+
+  def __init__(self,sinks,window=60,slide=None,keys=None,samples=5,grace=1,
+               interval=1):
+    if slide is not None and not 0 < slide <= window:
+      raise ValueError('The slide must be between 0 and the window length')
+    self.sinks = sinks
+    self.window = window
+    self.slide = slide or window
+    self.keys = keys or DEFAULT_KEYS
+    self.getters = [cbdrouter.getter(path) for path in self.keys]
+    self.samples = samples
+    self.grace = grace
+    self.windows = {}
+    self.closedto = None
+    self.received = 0
+    self.emitted = 0
+    self.late = 0
+    self._lock = threading.Lock()
+    self._stop = threading.Event()
+    self.thread = None
+    if interval is not None:
+      self.thread = threading.Thread(target=self._tick,args=(interval,),
+                                     daemon=True)
+      self.thread.start()
+
+  def _tick(self,interval):
+    while not self._stop.wait(interval):
+      self.flush()
+
+  def _starts(self,received):
+    # The start times of every window containing the given time
+    last = math.floor(received / self.slide) * self.slide
+    count = math.ceil(self.window / self.slide)
+    return [last - i * self.slide for i in range(count)
+            if last - i * self.slide + self.window > received]
+
+  def add(self,event,received=None):
+    """
+    Add an event to the windows covering the time it was received.
+    Heartbeats are ignored.
+    """
+    if event.get('type') == cbdevents.HEARTBEAT:
+      return
+    if received is None:
+      received = time.time()
+    key = tuple(keyValue(get(event)) for get in self.getters)
+    message = cbdformat.render(event)
+
+    with self._lock:
+      self.received += 1
+      for start in self._starts(received):
+        if self.closedto is not None and start < self.closedto:
+          # The window has already been emitted
+          self.late += 1
+          continue
+        groups = self.windows.setdefault(start,{})
+        group = groups.get(key)
+        if group is None:
+          group = groups[key] = Group(key)
+        group.add(received,message)
+    self.flush(received - self.grace)
+
+  __call__ = add
+
+  def flush(self,now=None):
+    """
+    Emit the rollups for every window that ended before now, which defaults
+    to the current time less the grace period.
+    """
+    if now is None:
+      now = time.time() - self.grace
+    rollups = []
+    with self._lock:
+      for start in sorted(self.windows):
+        if start + self.window > now:
+          break
+        rollups.extend(self._rollups(start,self.windows.pop(start)))
+        self.closedto = start + self.slide
+      self.emitted += len(rollups)
+    self._emit(rollups)
+    return len(rollups)
+
+  def _rollups(self,start,groups):
+    end = start + self.window
+    # Dots in field paths cannot be used in format strings
+    names = [path.replace('.','_') for path in self.keys]
+    string = ('{count} event(s), {distinct} distinct, from {start} to {end} '
+              'for ' + ', '.join('{}={{{}}}'.format(path,name)
+                                 for path, name in zip(self.keys,names)) +
+              ': {top}')
+    for group in sorted(groups.values(),key=lambda group: -group.count):
+      messages = sorted(group.messages.items(),key=lambda item: -item[1][0])
+      parameters = dict(zip(names,group.key))
+      parameters.update({'count':group.count,'distinct':len(messages),
+                         'start':isoTime(start),'end':isoTime(end),
+                         'top':messages[0][0]})
+      yield {
+        'type':ROLLUP,
+        'english-string':string,
+        'parameters':parameters,
+        'window-start':start,
+        'window-end':end,
+        'key':dict(zip(self.keys,group.key)),
+        'count':group.count,
+        'distinct':len(messages),
+        'first-seen':group.first,
+        'last-seen':group.last,
+        'messages':[{'message':message,'count':count,'first-seen':first,
+                     'last-seen':last}
+                    for message, (count,first,last) in
+                    messages[:self.samples]],
+      }
+
+  def _emit(self,rollups):
+    for rollup in rollups:
+      for sink in self.sinks:
+        sink(rollup)
+
+  def close(self):
+    """Stop the timer and emit the rollups for every open window."""
+    self._stop.set()
+    if self.thread is not None:
+      self.thread.join()
+    self.flush(float('inf'))
+    for sink in self.sinks:
+      if hasattr(sink,'close'):
+        sink.close()
+
+  def stats(self):
+    """Return the number of events received and rollups emitted."""
+    with self._lock:
+      return {'received':self.received,'emitted':self.emitted,
+              'late':self.late,'open':len(self.windows)}
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""Rule based filtering and routing of Cisco Business Dashboard events
+
+Provides the Router class, which matches each event from the event stream
+against a list of rules and passes it to the named sinks of every rule that
+matches.  Rules are read from a JSON file and compiled once into Python
+functions, and are indexed by event type and by the values of the fields they
+require, so that each event is only tested against the rules that could
+apply to it.
+
+A rules file looks like this:
+
+  {
+    "sinks": {
+      "alerts": {"type": "file", "path": "alerts.jsonl"},
+      "screen": {"type": "print"}
+    },
+    "rules": [
+      {
+        "name": "Core switch alerts",
+        "types": ["event"],
+        "match": {
+          "severity": {"in": ["critical", "major"]},
+          "parameters.device": {"regex": "^core-"}
+        },
+        "sinks": ["alerts", "screen"],
+        "stop": true
+      }
+    ]
+  }
+
+Each entry of match tests a field of the event, given as a dotted path.  A
+plain value must be equal to the field, otherwise the test is an object with
+one or more of the operators eq, ne, in, not-in, regex, contains, gt, ge, lt,
+le and exists.  A rule without types applies to events of every type.  Rules
+are tested in the order they appear, and a matching rule with stop set
+prevents any later rule from being tested.
+
+Sinks may be of type print, file (with a path) or webhook (with a url), and
+are provided by the handlers in cbdpipeline.  Any callable may also be
+registered as a sink when the Router is created.
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import re
+import json
+import operator
+
+import cbdpipeline
+
+# Comparison operators taking a single value
+COMPARISONS = {
+  'eq':operator.eq,
+  'ne':operator.ne,
+  'gt':operator.gt,
+  'ge':operator.ge,
+  'lt':operator.lt,
+  'le':operator.le,
+}
+
+_MISSING = object()
+
+def getter(path):
+  """
+  Return a function that extracts the field at a dotted path from an event,
+  returning a placeholder if any part of the path is missing.
+  """
+  parts = path.split('.')
+  if len(parts) == 1:
+    key = parts[0]
+    return lambda event: event.get(key,_MISSING)
+
+  def get(event):
+    value = event
+    for part in parts:
+      if not isinstance(value,dict):
+        return _MISSING
+      value = value.get(part,_MISSING)
+      if value is _MISSING:
+        return _MISSING
+    return value
+  return get
+
+def compareCheck(compare,value):
+  """
+  Return a check that compares a field with a value.  Missing fields and
+  fields of a type that cannot be compared with the value fail the check.
+  """
+  def check(field):
+    if field is _MISSING:
+      return False
+    try:
+      return compare(field,value)
+    except TypeError:
+      return False
+  return check
+
+def memberCheck(values,member):
+  """
+  Return a check that a field is, or is not, one of a set of values.
+  """
+  def check(field):
+    try:
+      return (field in values) == member
+    except TypeError:
+      # Lists and objects are never in the set
+      return not member
+  return check
+
+def compileTest(path,test):
+  """
+  Compile the test for a single field into a function taking an event and
+  returning True if the field passes the test.
+  """
+  get = getter(path)
+  if not isinstance(test,dict):
+    # A plain value is an equality test
+    return lambda event: get(event) == test
+
+  checks = []
+  for op, value in test.items():
+    if op in COMPARISONS:
+      checks.append(compareCheck(COMPARISONS[op],value))
+    elif op == 'in':
+      checks.append(memberCheck(frozenset(value),True))
+    elif op == 'not-in':
+      checks.append(memberCheck(frozenset(value),False))
+    elif op == 'regex':
+      search = re.compile(value).search
+      checks.append(lambda field, search=search:
+                    isinstance(field,str) and search(field) is not None)
+    elif op == 'contains':
+      checks.append(lambda field, value=value:
+                    isinstance(field,(str,list)) and value in field)
+    elif op == 'exists':
+      checks.append(lambda field, value=value:
+                    (field is not _MISSING) == bool(value))
+    else:
+      raise ValueError('Unknown operator {} for field {}'.format(op,path))
+
+  if len(checks) == 1:
+    check = checks[0]
+    return lambda event: check(get(event))
+
+  def multi(event):
+    field = get(event)
+    for check in checks:
+      if not check(field):
+        return False
+    return True
+  return multi
+
+def compileMatch(match):
+  """
+  Compile the match section of a rule into a single function.
+  """
+  tests = [compileTest(path,test) for path, test in match.items()]
+  if not tests:
+    return lambda event: True
+  if len(tests) == 1:
+    return tests[0]
+
+  def every(event):
+    for test in tests:
+      if not test(event):
+        return False
+    return True
+  return every
+
+class Rule:
+  """
+  A compiled routing rule.
+  """
+  def __init__(self,index,spec):
+    self.index = index
+    self.name = spec.get('name','rule {}'.format(index + 1))
+    self.types = spec.get('types')
+    self.sinks = tuple(spec['sinks'])
+    self.stop = bool(spec.get('stop',False))
+    self.test = compileMatch(spec.get('match',{}))
+    self.key = indexKey(spec.get('match',{}))
+
+def indexKey(match):
+  """
+  Return the path and the set of values of the first field in a match that
+  must equal one of a fixed set of values, or None if there is no such field.
+  """
+  for path, test in match.items():
+    try:
+      if not isinstance(test,dict):
+        return path, frozenset([test])
+      if len(test) == 1 and 'eq' in test:
+        return path, frozenset([test['eq']])
+      if len(test) == 1 and 'in' in test:
+        return path, frozenset(test['in'])
+    except TypeError:
+      # Lists and objects cannot be indexed
+      continue
+  return None
+
+class RuleIndex:
+  """
+  The rules that apply to one event type, indexed by the value of a field
+  that each rule requires, so that a rule matching a single device is only
+  tested against events from that device.
+  """
+  def __init__(self,rules):
+    self.unkeyed = []
+    self.keyed = {}
+    for rule in rules:
+      if rule.key is None:
+        self.unkeyed.append(rule)
+      else:
+        path, values = rule.key
+        if path not in self.keyed:
+          self.keyed[path] = (getter(path),{})
+        table = self.keyed[path][1]
+        for value in values:
+          table.setdefault(value,[]).append(rule)
+
+  def candidates(self,event):
+    """Return the rules that could match an event, in order."""
+    found = [self.unkeyed] if self.unkeyed else []
+    for get, table in self.keyed.values():
+      try:
+        rules = table.get(get(event))
+      except TypeError:
+        # The field holds a list or object
+        continue
+      if rules:
+        found.append(rules)
+    if len(found) == 1:
+      return found[0]
+    if not found:
+      return ()
+    # Restore the order of the rules file
+    return sorted({rule.index:rule for rules in found
+                   for rule in rules}.values(),key=lambda rule: rule.index)
+
+def makeSink(spec):
+  """Create a sink handler from its definition in a rules file."""
+  type = spec.get('type')
+  if type == 'print':
+    return cbdpipeline.PrintHandler()
+  if type == 'file':
+    return cbdpipeline.FileHandler(spec['path'])
+  if type == 'webhook':
+    return cbdpipeline.WebhookHandler(spec['url'])
+  raise ValueError('Unknown sink type {}'.format(type))
+
+class Router:
+  """
+  Route events to named sinks according to a list of rules.  A router is a
+  callable taking an event, so it may be used as a cbdpipeline handler.
+  Closing the router closes its sinks, and a router may be used as a context
+  manager to do so on exit.
+
+  Arguments:
+    rules   - A list of rule definitions, as found in a rules file
+    sinks   - (Optional) A dictionary mapping sink names to callables
+    indexed - (Optional) Index the rules by event type and required field
+              values.  Defaults to True.  Disabling the index is only useful
+              for comparison.
+  """
+  name = 'router'
+
+  def __init__(self,rules,sinks=None,indexed=True):
+    self.rules = [Rule(index,spec) for index, spec in enumerate(rules)]
+    self.sinks = dict(sinks or {})
+    for rule in self.rules:
+      for sink in rule.sinks:
+        if sink not in self.sinks:
+          raise ValueError('Rule {} uses undefined sink {}'.format(rule.name,
+                                                                   sink))
+
+    # Index the rules by event type, and within each type by a field the
+    # rule requires.  Rules without types apply to every type, and are merged
+    # in so that the order of the rules file is kept
+    self.indexed = indexed
+    self.bytype = {}
+    self.anytype = None
+    if indexed:
+      anytype = [rule for rule in self.rules if not rule.types]
+      bytype = {}
+      for rule in self.rules:
+        for type in rule.types or ():
+          bytype.setdefault(type,[]).append(rule)
+      self.bytype = {type:RuleIndex(sorted(rules + anytype,
+                                           key=lambda rule: rule.index))
+                     for type, rules in bytype.items()}
+      self.anytype = RuleIndex(anytype)
+
+  @classmethod
+  def fromFile(cls,filename,sinks=None,**kwargs):
+    """
+    Create a router from a JSON rules file.  Sinks defined in the file are
+    created as cbdpipeline handlers, and may be supplemented or overridden by
+    the sinks argument.
+    """
+    with open(filename) as f:
+      config = json.load(f)
+    allsinks = {name:makeSink(spec)
+                for name, spec in config.get('sinks',{}).items()}
+    allsinks.update(sinks or {})
+    return cls(config.get('rules',[]),allsinks,**kwargs)
+
+  def candidates(self,event):
+    """Return the rules that could match an event, in order."""
+    if not self.indexed:
+      return self.rules
+    return self.bytype.get(event.get('type'),self.anytype).candidates(event)
+
+  def route(self,event):
+    """
+    Return the names of the sinks an event should be passed to, in the order
+    they were first matched.
+    """
+    matched = []
+    indexed = self.indexed
+    type = event.get('type')
+    for rule in self.candidates(event):
+      if not indexed and rule.types and type not in rule.types:
+        continue
+      if rule.test(event):
+        for sink in rule.sinks:
+          if sink not in matched:
+            matched.append(sink)
+        if rule.stop:
+          break
+    return matched
+
+  def __call__(self,event):
+    for sink in self.route(event):
+      self.sinks[sink](event)
+
+  def close(self):
+    """Close every sink that holds a file or other resource open."""
+    closed = set()
+    for sink in self.sinks.values():
+      if id(sink) not in closed and hasattr(sink,'close'):
+        closed.add(id(sink))
+        sink.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Server-Sent Events parser for the Cisco Business Dashboard event stream
+
+Provides the SSEParser class, which turns the raw bytes of an event stream
+into events.  The stream is read in whatever size chunks the connection
+delivers and appended to a single buffer, which is scanned for the blank
+lines that separate events using bytes searches rather than examining one
+character at a time.  Only newly received data is scanned, so an event of any
+size is assembled in time proportional to its length.
+
+Typical usage:
+
+  import cbdsse
+
+  for id, event, data in cbdsse.parse(response.iter_content(chunk_size=None)):
+    print(json.loads(data))
+
+
+Copyright (c) 2020 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+class SSEParser:
+  """
+  An incremental parser for a Server-Sent Events stream.  Pass each chunk of
+  bytes received to feed, which returns the events completed by that chunk
+  as (id, event, data) tuples.  id and event are strings, or None if the
+  event did not set them, and data holds the bytes of the data field with
+  multiple data lines joined by newlines.
+
+  As the SSE specification requires, the ID of the last event that set one
+  is remembered in lastid, and the reconnection time requested by a retry
+  field is kept in retry.
+  """
+  def __init__(self):
+    self.buffer = bytearray()
+    self.scanned = 0
+    self.lastid = None
+    self.retry = None
+    self.pendingcr = False
+
+  def feed(self,chunk):
+    """
+    Add a chunk of bytes to the buffer and return a list of the events it
+    completed.
+    """
+    if self.pendingcr:
+      # The carriage return that ended the previous chunk was taken as the
+      # end of a line at once, so that an event it completed is not held
+      # back.  If it was the first half of a CRLF pair, drop the LF
+      self.pendingcr = False
+      if chunk.startswith(b'\n'):
+        chunk = chunk[1:]
+    if b'\r' in chunk:
+      self.pendingcr = chunk.endswith(b'\r')
+      chunk = chunk.replace(b'\r\n',b'\n').replace(b'\r',b'\n')
+
+    buffer = self.buffer
+    buffer += chunk
+    events = []
+    start = 0
+    # Resume scanning one byte back in case the previous chunk ended with
+    # the first newline of a pair
+    position = max(self.scanned - 1,0)
+    while True:
+      end = buffer.find(b'\n\n',position)
+      if end < 0:
+        break
+      event = self._parse(memoryview(buffer)[start:end])
+      if event is not None:
+        events.append(event)
+      start = position = end + 2
+
+    if start:
+      # Deleting from the front of a bytearray does not copy the remainder
+      del buffer[:start]
+    self.scanned = len(buffer)
+    return events
+
+  def _parse(self,block):
+    # Parse the lines of a single event
+    id = None
+    event = None
+    data = []
+    for line in bytes(block).split(b'\n'):
+      if not line or line.startswith(b':'):
+        # Lines starting with a colon are comments
+        continue
+      name, _, value = line.partition(b':')
+      if value.startswith(b' '):
+        value = value[1:]
+
+      if name == b'data':
+        data.append(value)
+      elif name == b'id':
+        id = self.lastid = value.decode('UTF-8')
+      elif name == b'event':
+        event = value.decode('UTF-8')
+      elif name == b'retry' and value.isdigit():
+        self.retry = int(value)
+
+    if not data:
+      return None
+    return id, event, data[0] if len(data) == 1 else b'\n'.join(data)
+
+def parse(chunks):
+  """
+  Parse an iterable of byte chunks, such as the result of
+  requests.Response.iter_content(chunk_size=None), and yield an (id, event,
+  data) tuple for each event.
+  """
+  parser = SSEParser()
+  for chunk in chunks:
+    for event in parser.feed(chunk):
+      yield event